@@ -0,0 +1,419 @@
+#!/usr/bin/env python3
+"""Buffers that move audio between PortAudio callback threads and asyncio."""
+import asyncio
+import threading
+import time
+from audio_lazy import lazy_import
+
+np = lazy_import("numpy")
+
+# Overflow policies for PcmRingBuffer
+DROP_OLDEST = "drop_oldest"
+DROP_NEWEST = "drop_newest"
+
+
+class _LoopWaker:
+    """Wake a coroutine on an event loop from another thread, coalescing wakeups."""
+
+    def __init__(self):
+        self._loop = None
+        self._event = None
+        self._pending = False
+        self._lock = threading.Lock()
+
+    def bind(self, loop: asyncio.AbstractEventLoop = None):
+        self._loop = loop or asyncio.get_running_loop()
+        self._event = asyncio.Event()
+        self._pending = False
+
+    def clear(self):
+        self._event.clear()
+
+    async def wait(self):
+        await self._event.wait()
+
+    def notify(self):
+        """Schedule a wakeup unless one is already pending; safe from any thread."""
+        with self._lock:
+            if self._pending or self._loop is None:
+                return
+            self._pending = True
+        try:
+            self._loop.call_soon_threadsafe(self._wake)
+        except RuntimeError:
+            # Loop already closed; nothing left to wake
+            pass
+
+    def _wake(self):
+        with self._lock:
+            self._pending = False
+        self._event.set()
+
+
+class PcmRingBuffer:
+    """Preallocated PCM ring buffer written from a PortAudio callback.
+
+    `write` only copies samples into a fixed array (clipping and scaling float
+    input to int16 through a reused scratch block), so the audio thread does no per-block allocation. A
+    coroutine drains it with `read`. On overflow the oldest frames are
+    overwritten (DROP_OLDEST) or the incoming frames discarded (DROP_NEWEST),
+    and the lost frames are counted.
+    """
+
+    def __init__(self, capacity_frames: int, channels: int = 1, dtype='int16',
+                 policy: str = DROP_OLDEST):
+        if policy not in (DROP_OLDEST, DROP_NEWEST):
+            raise ValueError(f"Unknown overflow policy: {policy}")
+        self.capacity = max(1, capacity_frames)
+        self.channels = channels
+        self.policy = policy
+        self._buf = np.zeros((self.capacity, channels), dtype=dtype)
+        self._scale = float(np.iinfo(self._buf.dtype).max) if self._buf.dtype.kind == 'i' else 1.0
+        self._scratch = None  # float input is clipped here before it is scaled into the ring
+        # Absolute frame counters; positions in the array are taken modulo capacity
+        self._write_pos = 0
+        self._read_pos = 0
+        self._lock = threading.Lock()
+        self._waker = _LoopWaker()
+        self._closed = False
+        self.dropped_frames = 0
+        self.max_fill = 0
+
+    def bind(self, loop: asyncio.AbstractEventLoop = None):
+        """Attach to the consuming event loop and reset; call from that loop."""
+        self._waker.bind(loop)
+        with self._lock:
+            self._write_pos = self._read_pos = 0
+            self._closed = False
+        self.dropped_frames = 0
+        self.max_fill = 0
+
+    def _copy_in(self, start, data):
+        """Copy `data` into the ring at absolute frame `start`, wrapping as needed."""
+        n = len(data)
+        offset = start % self.capacity
+        first = min(n, self.capacity - offset)
+        if data.dtype == self._buf.dtype:
+            self._buf[offset:offset + first] = data[:first]
+            self._buf[:n - first] = data[first:]
+        else:
+            # Clip float samples so overs saturate instead of wrapping, then scale them
+            # straight into the int16 storage; the scratch is only reallocated for a larger block
+            if self._scratch is None or len(self._scratch) < n or self._scratch.dtype != data.dtype:
+                self._scratch = np.empty((n, self.channels), dtype=data.dtype)
+            clipped = self._scratch[:n]
+            np.clip(data, -1.0, 1.0, out=clipped)
+            np.multiply(clipped[:first], self._scale, out=self._buf[offset:offset + first], casting='unsafe')
+            np.multiply(clipped[first:], self._scale, out=self._buf[:n - first], casting='unsafe')
+
+    def write(self, data) -> int:
+        """Append frames from any thread; returns the number of frames stored."""
+        n = len(data)
+        with self._lock:
+            if self._closed:
+                return 0
+            if n > self.capacity:
+                self.dropped_frames += n - self.capacity
+                data = data[n - self.capacity:]
+                n = self.capacity
+            free = self.capacity - (self._write_pos - self._read_pos)
+            if n > free:
+                if self.policy == DROP_NEWEST:
+                    self.dropped_frames += n - free
+                    data = data[:free]
+                    n = free
+                else:
+                    self.dropped_frames += n - free
+                    self._read_pos += n - free
+            if n:
+                self._copy_in(self._write_pos, data)
+                self._write_pos += n
+            self.max_fill = max(self.max_fill, self._write_pos - self._read_pos)
+        self._waker.notify()
+        return n
+
+    @property
+    def nbytes(self) -> int:
+        """Size of the preallocated sample storage."""
+        return self._buf.nbytes
+
+    @property
+    def available(self) -> int:
+        with self._lock:
+            return self._write_pos - self._read_pos
+
+    def read(self, max_frames: int = None):
+        """Return up to `max_frames` buffered frames as a new array (consumer side)."""
+        with self._lock:
+            n = self._write_pos - self._read_pos
+            if max_frames is not None:
+                n = min(n, max_frames)
+            offset = self._read_pos % self.capacity
+            first = min(n, self.capacity - offset)
+            out = np.concatenate((self._buf[offset:offset + first], self._buf[:n - first]))
+            self._read_pos += n
+        return out
+
+    def clear(self):
+        """Discard all buffered frames."""
+        with self._lock:
+            self._read_pos = self._write_pos
+
+    async def read_async(self, max_frames: int = None):
+        """Wait until frames are available and return them; None once closed and drained."""
+        while True:
+            with self._lock:
+                if self._write_pos > self._read_pos:
+                    break
+                if self._closed:
+                    return None
+                self._waker.clear()
+            await self._waker.wait()
+        return self.read(max_frames)
+
+    def close(self):
+        """Stop accepting frames and wake the consumer."""
+        with self._lock:
+            self._closed = True
+        self._waker.notify()
+
+    def stats(self) -> dict:
+        """Counters for reporting buffer health."""
+        with self._lock:
+            fill = self._write_pos - self._read_pos
+            written = self._write_pos
+        return {
+            "fill_frames": fill,
+            "capacity_frames": self.capacity,
+            "policy": self.policy,
+            "written_frames": written,
+            "dropped_frames": self.dropped_frames,
+            "max_fill_frames": self.max_fill,
+        }
+
+
+class JitterBuffer(PcmRingBuffer):
+    """Playback buffer written by the event loop and drained by an output callback.
+
+    Output stays silent until `target_frames` are buffered, which absorbs
+    network jitter between received chunks. If the buffer runs dry mid-stream
+    it counts an underrun and re-primes. `flush` marks the end of an utterance
+    so the tail plays out even if it is shorter than the target depth.
+    """
+
+    def __init__(self, capacity_frames: int, channels: int = 1, target_frames: int = 0):
+        super().__init__(capacity_frames, channels, dtype='int16', policy=DROP_OLDEST)
+        self.target_frames = min(max(0, target_frames), self.capacity)
+        self._primed = False
+        self._draining = False
+        self.underruns = 0
+        self.played_frames = 0
+        self.silent_frames = 0
+        self.primed_at = None  # monotonic time playback last (re)started
+
+    def flush(self):
+        """Play out whatever is buffered without waiting for the target depth."""
+        with self._lock:
+            self._draining = True
+
+    def clear(self):
+        """Drop buffered audio, e.g. when the model's turn is interrupted."""
+        with self._lock:
+            self._read_pos = self._write_pos
+            self._primed = False
+            self._draining = False
+
+    def fill(self, outdata):
+        """Copy buffered frames into `outdata` from the audio thread, padding with silence."""
+        frames = len(outdata)
+        with self._lock:
+            available = self._write_pos - self._read_pos
+            if not self._primed:
+                if available < max(1, self.target_frames) and not self._draining:
+                    outdata.fill(0)
+                    self.silent_frames += frames
+                    return
+                self._primed = True
+                self.primed_at = time.monotonic()
+
+            n = min(available, frames)
+            offset = self._read_pos % self.capacity
+            first = min(n, self.capacity - offset)
+            outdata[:first] = self._buf[offset:offset + first]
+            outdata[first:n] = self._buf[:n - first]
+            self._read_pos += n
+            self.played_frames += n
+
+            if n < frames:
+                outdata[n:] = 0
+                self.silent_frames += frames - n
+                if not self._draining:
+                    self.underruns += 1
+                self._primed = False
+                self._draining = False
+
+    def stats(self) -> dict:
+        result = super().stats()
+        result.update({
+            "target_frames": self.target_frames,
+            "underruns": self.underruns,
+            "played_frames": self.played_frames,
+            "silent_frames": self.silent_frames,
+        })
+        return result
+
+
+class HistoryBuffer(PcmRingBuffer):
+    """Ring that always holds the most recent `capacity_frames` of a stream.
+
+    Nothing consumes it: new frames overwrite the oldest, and `snapshot` copies
+    out any window that is still retained, addressed by absolute frame number
+    (frames written since the last reset). Writing from the audio thread copies
+    into the preallocated array only.
+    """
+
+    def __init__(self, capacity_frames: int, channels: int = 1, dtype='int16'):
+        super().__init__(capacity_frames, channels, dtype=dtype, policy=DROP_OLDEST)
+
+    def window(self) -> tuple:
+        """`(first, end)`: absolute frame range currently retained."""
+        with self._lock:
+            return self._read_pos, self._write_pos
+
+    def snapshot(self, start: int, end: int):
+        """Copy frames `[start, end)`, clipped to what is retained; returns `(first_frame, data)`."""
+        with self._lock:
+            start = max(start, self._read_pos)
+            end = min(end, self._write_pos)
+            n = max(0, end - start)
+            offset = start % self.capacity
+            first = min(n, self.capacity - offset)
+            data = np.concatenate((self._buf[offset:offset + first], self._buf[:n - first]))
+        return start, data
+
+    def stats(self) -> dict:
+        result = super().stats()
+        # Frames pushed out of the window are expected here, not data loss
+        result["aged_out_frames"] = result.pop("dropped_frames")
+        return result
+
+
+class CallbackStats:
+    """Per-callback timing and xrun counters updated from the audio thread."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.callbacks = 0
+        self.input_overflows = 0
+        self.input_underflows = 0
+        self.output_overflows = 0
+        self.output_underflows = 0
+        self.total_ns = 0
+        self.max_ns = 0
+
+    def record(self, status, elapsed_ns: int):
+        """Account one callback invocation given its status flags and duration."""
+        self.callbacks += 1
+        if status:
+            self.input_overflows += bool(status.input_overflow)
+            self.input_underflows += bool(status.input_underflow)
+            self.output_overflows += bool(status.output_overflow)
+            self.output_underflows += bool(status.output_underflow)
+        self.total_ns += elapsed_ns
+        if elapsed_ns > self.max_ns:
+            self.max_ns = elapsed_ns
+
+    def stats(self) -> dict:
+        return {
+            "callbacks": self.callbacks,
+            "input_overflows": self.input_overflows,
+            "input_underflows": self.input_underflows,
+            "output_overflows": self.output_overflows,
+            "output_underflows": self.output_underflows,
+            "mean_callback_us": (self.total_ns / self.callbacks / 1000) if self.callbacks else 0.0,
+            "max_callback_us": self.max_ns / 1000,
+        }
+
+
+class AdaptiveBatcher:
+    """Accumulate upload bytes and size each batch from measured send latency.
+
+    The batch duration follows `rtt_factor` times the smoothed send round-trip
+    time, plus any capture backlog, within `[min_latency, max_latency]`: on a
+    fast link small batches keep latency low, on a slow one larger batches
+    amortize per-message overhead so the sender keeps up. A batch is also
+    released once its oldest audio is `max_latency` old, whatever its size.
+    """
+
+    def __init__(self, bytes_per_second: int, min_latency: float, max_latency: float,
+                 initial_latency: float = None, rtt_factor: float = 2.0, smoothing: float = 0.2):
+        self.bytes_per_second = bytes_per_second
+        self.min_latency = min_latency
+        self.max_latency = max(min_latency, max_latency)
+        self.rtt_factor = rtt_factor
+        self.smoothing = smoothing
+        initial = initial_latency if initial_latency is not None else min_latency
+        self.target_latency = min(max(initial, self.min_latency), self.max_latency)
+        self._buffer = bytearray()
+        self._oldest = None
+        self.rtt = None
+        self.batches = 0
+        self.bytes_sent = 0
+        self.last_latency = 0.0
+        self.mean_latency = 0.0
+        self.max_latency_seen = 0.0
+
+    @property
+    def target_bytes(self) -> int:
+        """Current batch size in bytes (whole 16-bit samples)."""
+        return max(2, int(self.target_latency * self.bytes_per_second) // 2 * 2)
+
+    def __len__(self):
+        return len(self._buffer)
+
+    def add(self, data: bytes, captured_at: float):
+        """Append audio whose oldest sample was captured at `captured_at` (monotonic)."""
+        if not data:
+            return
+        if not self._buffer:
+            self._oldest = captured_at
+        self._buffer.extend(data)
+
+    def ready(self, now: float) -> bool:
+        """True when the pending batch should be sent."""
+        if not self._buffer:
+            return False
+        return len(self._buffer) >= self.target_bytes or now - self._oldest >= self.max_latency
+
+    def take(self):
+        """Remove and return `(batch_bytes, oldest_capture_time)`."""
+        data, oldest = bytes(self._buffer), self._oldest
+        self._buffer.clear()
+        self._oldest = None
+        return data, oldest
+
+    def record_send(self, size: int, rtt: float, oldest: float, done: float, backlog: float = 0.0):
+        """Account a completed send and re-pick the batch duration."""
+        self.rtt = rtt if self.rtt is None else self.rtt + self.smoothing * (rtt - self.rtt)
+        latency = done - oldest
+        self.batches += 1
+        self.bytes_sent += size
+        self.last_latency = latency
+        self.mean_latency += (latency - self.mean_latency) / self.batches
+        self.max_latency_seen = max(self.max_latency_seen, latency)
+        wanted = self.rtt_factor * self.rtt + backlog
+        self.target_latency = min(max(wanted, self.min_latency), self.max_latency)
+
+    def stats(self) -> dict:
+        return {
+            "target_batch_ms": self.target_latency * 1000,
+            "target_batch_bytes": self.target_bytes,
+            "send_rtt_ms": (self.rtt or 0.0) * 1000,
+            "batches": self.batches,
+            "bytes_sent": self.bytes_sent,
+            "last_mic_to_send_ms": self.last_latency * 1000,
+            "mean_mic_to_send_ms": self.mean_latency * 1000,
+            "max_mic_to_send_ms": self.max_latency_seen * 1000,
+        }
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""SQLite catalog of recordings written to the audio/ directory.
+
+Each recording is registered when it is written, together with the capture
+settings and simple loudness statistics, so recordings can be listed and
+filtered with indexed queries instead of scanning the directory and opening
+every file.
+"""
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+DEFAULT_CATALOG_PATH = os.path.join("audio", "recordings.db")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS recordings (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    created REAL NOT NULL,
+    device TEXT,
+    samplerate INTEGER NOT NULL,
+    channels INTEGER NOT NULL,
+    frames INTEGER NOT NULL,
+    duration REAL NOT NULL,
+    format TEXT,
+    size INTEGER,
+    peak_db REAL,
+    rms_db REAL,
+    sha256 TEXT
+);
+CREATE INDEX IF NOT EXISTS recordings_created ON recordings (created);
+CREATE INDEX IF NOT EXISTS recordings_duration ON recordings (duration);
+CREATE INDEX IF NOT EXISTS recordings_rms ON recordings (rms_db);
+CREATE INDEX IF NOT EXISTS recordings_sha256 ON recordings (sha256);
+"""
+
+# Columns accepted by RecordingCatalog.add
+_COLUMNS = ("path", "created", "device", "samplerate", "channels", "frames", "duration",
+            "format", "size", "peak_db", "rms_db", "sha256")
+
+
+def _timestamp(value):
+    """Accept a datetime, ISO 8601 string or Unix time and return Unix time."""
+    if value is None or isinstance(value, (int, float)):
+        return value
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return value.timestamp()
+
+
+class RecordingCatalog:
+    """Indexed table of recordings, opened lazily on first use.
+
+    Rows are dicts with the columns of the `recordings` table; `created` is
+    Unix time. Safe to use from several threads.
+    """
+
+    def __init__(self, path: str = DEFAULT_CATALOG_PATH):
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def add(self, path: str, samplerate: int, channels: int, frames: int, **fields) -> int:
+        """Register a recording (replacing any row for the same path); returns its row ID."""
+        row = dict(fields, path=str(path), samplerate=samplerate, channels=channels, frames=frames)
+        row.setdefault("created", datetime.now().timestamp())
+        row["created"] = _timestamp(row["created"])
+        row.setdefault("duration", frames / samplerate if samplerate else 0.0)
+        if "size" not in row and os.path.exists(row["path"]):
+            row["size"] = os.path.getsize(row["path"])
+        unknown = set(row) - set(_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown catalog fields: {', '.join(sorted(unknown))}")
+
+        names = ", ".join(row)
+        placeholders = ", ".join("?" for _ in row)
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                cursor = conn.execute(
+                    f"INSERT OR REPLACE INTO recordings ({names}) VALUES ({placeholders})",
+                    tuple(row.values()))
+            return cursor.lastrowid
+
+    def move(self, old_path: str, new_path: str, format: str = None):
+        """Point a row at a new file, e.g. after it was re-encoded."""
+        new_path = str(new_path)
+        size = os.path.getsize(new_path) if os.path.exists(new_path) else None
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute("UPDATE recordings SET path = ?, size = ?, format = COALESCE(?, format) "
+                             "WHERE path = ?", (new_path, size, format, str(old_path)))
+
+    def get(self, path: str) -> dict:
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT * FROM recordings WHERE path = ?", (str(path),)).fetchone()
+        return dict(row) if row else None
+
+    def remove(self, path: str) -> bool:
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                cursor = conn.execute("DELETE FROM recordings WHERE path = ?", (str(path),))
+            return cursor.rowcount > 0
+
+    def find(self, since=None, until=None, min_duration: float = None, max_duration: float = None,
+             min_rms_db: float = None, max_rms_db: float = None, sha256: str = None,
+             limit: int = 50, offset: int = 0) -> list:
+        """Return recordings matching all given filters, newest first."""
+        filters = [
+            ("created >= ?", _timestamp(since)),
+            ("created <= ?", _timestamp(until)),
+            ("duration >= ?", min_duration),
+            ("duration <= ?", max_duration),
+            ("rms_db >= ?", min_rms_db),
+            ("rms_db <= ?", max_rms_db),
+            ("sha256 = ?", sha256),
+        ]
+        clauses = [clause for clause, value in filters if value is not None]
+        params = [value for _, value in filters if value is not None]
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            rows = self._connect().execute(
+                f"SELECT * FROM recordings {where} ORDER BY created DESC, id DESC LIMIT ? OFFSET ?",
+                (*params, limit, offset)).fetchall()
+        return [dict(row) for row in rows]
+
+    def count(self) -> int:
+        with self._lock:
+            return self._connect().execute("SELECT COUNT(*) FROM recordings").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""Per-client limits for the shared HTTP/SSE daemon mode.
+
+In daemon mode one server process serves every client, sharing the device
+registry, catalog, encoder pool and Gemini client. `ClientLimiter` caps how
+many tool calls each connected client may have in flight, so one busy client
+cannot tie up all the device and network workers (background jobs keep
+their slot until they finish), and gives every client a
+short name used to keep their Gemini conversations apart.
+"""
+import itertools
+import weakref
+from contextlib import contextmanager
+from mcp import types
+
+DEFAULT_MAX_CLIENT_CALLS = 4
+
+
+class ClientBusy(RuntimeError):
+    """Raised when a client already has its maximum number of calls in flight."""
+
+
+class ClientLimiter:
+    """Tracks in-flight tool calls per MCP session.
+
+    Sessions are held weakly, so a client's entry goes away when its session
+    is closed. Only used from the event loop, so no locking is needed.
+    """
+
+    def __init__(self, max_calls: int = DEFAULT_MAX_CLIENT_CALLS):
+        if max_calls < 1:
+            raise ValueError("max_calls must be at least 1")
+        self.max_calls = max_calls
+        self._clients = weakref.WeakKeyDictionary()  # session -> [name, in_flight]
+        self._ids = itertools.count(1)
+        self.rejected = 0
+
+    def _entry(self, session):
+        entry = self._clients.get(session)
+        if entry is None:
+            entry = self._clients[session] = [f"client-{next(self._ids)}", 0]
+        return entry
+
+    def name(self, session) -> str:
+        """Stable short name of a client for the lifetime of its session."""
+        return self._entry(session)[0]
+
+    @contextmanager
+    def slot(self, session):
+        """Hold one of the client's call slots for the duration of the block."""
+        entry = self._entry(session)
+        if entry[1] >= self.max_calls:
+            self.rejected += 1
+            raise ClientBusy(f"{entry[0]} already has {self.max_calls} tool calls in progress; "
+                             "wait for one to finish and try again")
+        entry[1] += 1
+        try:
+            yield entry[0]
+        finally:
+            entry[1] -= 1
+
+    def hold(self, session):
+        """Take a slot for work that outlives the current call, such as a background job.
+
+        The calling request already passed the limit check and hands its slot
+        over, so this does not check it again. Returns the client's name and a
+        function that releases the slot (safe to call more than once).
+        """
+        entry = self._entry(session)
+        entry[1] += 1
+        released = False
+
+        def release():
+            nonlocal released
+            if not released:
+                released = True
+                entry[1] -= 1
+        return entry[0], release
+
+    def hold_current(self, server):
+        """`hold` for the client whose request is being handled; `(None, None)` outside a request."""
+        try:
+            session = server.request_context.session
+        except LookupError:
+            return None, None
+        return self.hold(session)
+
+    def clients(self) -> dict:
+        """In-flight call count per connected client name."""
+        return {name: in_flight for name, in_flight in self._clients.values()}
+
+    def current_name(self, server) -> str:
+        """Name of the client whose request is being handled, or None outside a request."""
+        try:
+            session = server.request_context.session
+        except LookupError:
+            return None
+        return self.name(session)
+
+    def install(self, server):
+        """Wrap the low-level server's call_tool handler so every call takes a slot.
+
+        The MCP SDK has no public hook around tool calls, so this replaces the
+        handler registered in `request_handlers` and reads the session from
+        `request_context`, as laid out in mcp 1.8 (the first release with
+        streamable HTTP, see requirements.txt) up to at least 1.30.
+        """
+        handler = server.request_handlers[types.CallToolRequest]
+
+        async def limited(request):
+            try:
+                with self.slot(server.request_context.session):
+                    return await handler(request)
+            except ClientBusy as e:
+                return types.ServerResult(types.CallToolResult(
+                    content=[types.TextContent(type="text", text=f"Error: {e}")], isError=True))
+
+        server.request_handlers[types.CallToolRequest] = limited
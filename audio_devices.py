@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""Cached registry of PortAudio devices and their capabilities.
+
+Querying PortAudio is slow (every host API is probed) and device indices shift
+when hardware is plugged in, so the server scans once, keys each device by a
+stable ID and only re-queries on an explicit rescan.
+"""
+import threading
+from audio_lazy import lazy_import
+
+sd = lazy_import("sounddevice")
+
+INPUT = "input"
+OUTPUT = "output"
+
+# Sample rates probed for every device during a scan.
+COMMON_SAMPLE_RATES = (8000, 16000, 22050, 24000, 32000, 44100, 48000, 88200, 96000)
+# Highest channel count probed individually; larger devices only probe their maximum.
+MAX_PROBED_CHANNELS = 8
+
+
+class DeviceError(ValueError):
+    """Raised when a requested device does not exist or cannot do what was asked."""
+
+
+def _supported(check, index, samplerate=None, channels=None) -> bool:
+    try:
+        check(device=index, samplerate=samplerate, channels=channels)
+        return True
+    except Exception:
+        return False
+
+
+def _probe(index, kind, max_channels, default_rate):
+    """Return the sample rates and channel counts a device accepts for `kind`."""
+    check = sd.check_input_settings if kind == INPUT else sd.check_output_settings
+    rates = [r for r in COMMON_SAMPLE_RATES if _supported(check, index, samplerate=r, channels=1)]
+    if default_rate not in rates and _supported(check, index, samplerate=default_rate, channels=1):
+        rates.append(default_rate)
+        rates.sort()
+    probe = sorted(set(range(1, min(max_channels, MAX_PROBED_CHANNELS) + 1)) | {max_channels})
+    channels = [c for c in probe if _supported(check, index, samplerate=default_rate, channels=c)]
+    return rates, channels
+
+
+class DeviceRegistry:
+    """Device table keyed by stable ID, with precomputed capabilities.
+
+    Each entry is a dict with the fields returned by `sd.query_devices()` plus
+    `id`, `hostapi_name`, `input_samplerates`, `input_channels`,
+    `output_samplerates` and `output_channels`.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_id = {}
+        self._by_index = {}
+        self._scanned = False
+
+    @property
+    def scanned(self) -> bool:
+        return self._scanned
+
+    def scan(self):
+        """Query PortAudio and rebuild the device table. Blocking."""
+        hostapis = sd.query_hostapis()
+        by_id = {}
+        by_index = {}
+        for position, device in enumerate(sd.query_devices()):
+            entry = dict(device)
+            index = entry.get('index', position)
+            entry['index'] = index
+            hostapi = entry.get('hostapi')
+            entry['hostapi_name'] = hostapis[hostapi]['name'] if hostapi is not None else ""
+
+            # Stable ID from host API and name, disambiguated if a name repeats
+            base_id = f"{entry['hostapi_name']}:{entry['name']}" if entry['hostapi_name'] else entry['name']
+            device_id = base_id
+            suffix = 1
+            while device_id in by_id:
+                suffix += 1
+                device_id = f"{base_id}#{suffix}"
+            entry['id'] = device_id
+
+            default_rate = int(entry.get('default_samplerate') or 0) or None
+            for kind in (INPUT, OUTPUT):
+                max_channels = entry[f'max_{kind}_channels']
+                if max_channels > 0:
+                    rates, channels = _probe(index, kind, max_channels, default_rate)
+                else:
+                    rates, channels = [], []
+                entry[f'{kind}_samplerates'] = rates
+                entry[f'{kind}_channels'] = channels
+
+            by_id[device_id] = entry
+            by_index[index] = entry
+
+        with self._lock:
+            self._by_id = by_id
+            self._by_index = by_index
+            self._scanned = True
+
+    def ensure_scanned(self):
+        """Scan once on first use."""
+        if not self._scanned:
+            self.scan()
+
+    def devices(self, kind: str = None) -> list:
+        """Return cached devices, optionally only those usable for `kind`."""
+        with self._lock:
+            entries = list(self._by_index.values())
+        if kind is None:
+            return entries
+        return [d for d in entries if d[f'max_{kind}_channels'] > 0]
+
+    def get(self, device) -> dict:
+        """Look up a device by stable ID or PortAudio index; returns None if unknown."""
+        with self._lock:
+            if isinstance(device, str):
+                return self._by_id.get(device)
+            return self._by_index.get(device)
+
+    def resolve(self, device, kind: str, samplerate: int = None, channels: int = None) -> int:
+        """Validate `device` for `kind` and return its PortAudio index.
+
+        `device` may be a stable ID or a PortAudio index; None selects the
+        system default device and skips validation.
+        """
+        if device is None:
+            return None
+        entry = self.get(device)
+        if entry is None or entry[f'max_{kind}_channels'] <= 0:
+            raise DeviceError(f"Invalid device {'ID' if isinstance(device, str) else 'index'} {device}. "
+                              "Use list_audio_devices tool to see available devices.")
+        if samplerate is not None and entry[f'{kind}_samplerates'] and samplerate not in entry[f'{kind}_samplerates']:
+            raise DeviceError(f"Device {entry['id']} does not support {samplerate} Hz. "
+                              f"Supported rates: {entry[f'{kind}_samplerates']}")
+        if channels is not None and channels > entry[f'max_{kind}_channels']:
+            raise DeviceError(f"Device {entry['id']} supports at most "
+                              f"{entry[f'max_{kind}_channels']} {kind} channels.")
+        return entry['index']
+
+    def native_rate(self, device, kind: str) -> int:
+        """Return the device's default (native) sample rate, or None if unknown."""
+        if device is None:
+            device = sd.default.device[0 if kind == INPUT else 1]
+        entry = self.get(device)
+        if entry is None or not entry.get('default_samplerate'):
+            return None
+        return int(entry['default_samplerate'])
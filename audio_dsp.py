@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+"""Block-based DSP stages for the real-time audio pipeline.
+
+Every stage keeps its own state between calls so audio can be processed one
+PortAudio block at a time without clicks or discontinuities at block edges.
+"""
+from collections import deque
+from math import gcd
+from audio_lazy import lazy_import
+
+np = lazy_import("numpy")
+
+# Filter taps per input sample span when upsampling; decimation scales this by
+# the downsampling factor so the transition band stays equally sharp.
+DEFAULT_TAPS_PER_PHASE = 24
+# Passband edge as a fraction of the lower Nyquist frequency.
+DEFAULT_ROLLOFF = 0.9
+KAISER_BETA = 8.6
+
+
+def _design_polyphase(up: int, down: int, taps_per_phase: int, rolloff: float):
+    """Design a Kaiser-windowed sinc lowpass and split it into `up` phases."""
+    length = up * taps_per_phase
+    cutoff = 0.5 * rolloff / max(up, down)  # cycles per sample at the upsampled rate
+    n = np.arange(length) - (length - 1) / 2
+    h = 2 * cutoff * np.sinc(2 * cutoff * n) * np.kaiser(length, KAISER_BETA)
+    h *= up / h.sum()
+    # bank[p, m] = h[p + m * up]
+    return h.reshape(taps_per_phase, up).T.astype(np.float32)
+
+
+class StreamingResampler:
+    """Rational polyphase resampler that converts audio block by block.
+
+    Filter history and output phase carry over between calls to `process`,
+    so feeding a signal in arbitrary block sizes gives the same result as
+    resampling it in one piece. Input is `(frames, channels)` or 1-D; the
+    output has the same layout and dtype (int16 input is rounded and clipped).
+    """
+
+    def __init__(self, in_rate: int, out_rate: int, channels: int = 1,
+                 taps_per_phase: int = DEFAULT_TAPS_PER_PHASE,
+                 rolloff: float = DEFAULT_ROLLOFF):
+        self.in_rate = int(in_rate)
+        self.out_rate = int(out_rate)
+        self.channels = channels
+        g = gcd(self.in_rate, self.out_rate)
+        self.up = self.out_rate // g
+        self.down = self.in_rate // g
+        self.taps = -(-taps_per_phase * max(self.up, self.down) // self.up)
+        self._bank = _design_polyphase(self.up, self.down, self.taps, rolloff)
+        self._taps_range = np.arange(self.taps)
+        self.reset()
+
+    @property
+    def passthrough(self) -> bool:
+        return self.up == self.down
+
+    def reset(self):
+        """Forget filter history, e.g. after a discontinuity in the input."""
+        self._history = np.zeros((self.taps - 1, self.channels), dtype=np.float32)
+        # Upsampled-time position of the next output, relative to the next input block
+        self._next_t = 0
+
+    def process(self, block):
+        """Resample one block and return however many output frames it yields."""
+        block = np.asarray(block)
+        if self.passthrough:
+            return block
+        flat = block.ndim == 1
+        x = block.reshape(-1, self.channels)
+        n = len(x)
+
+        buf = np.concatenate((self._history, x.astype(np.float32, copy=False)))
+        limit = n * self.up
+        count = max(0, -(-(limit - self._next_t) // self.down))
+        t = self._next_t + np.arange(count) * self.down
+        phase = t % self.up
+        newest = t // self.up + self.taps - 1
+        frames = buf[newest[:, None] - self._taps_range[None, :]]  # (count, taps, channels)
+        y = np.einsum('ck,ckd->cd', self._bank[phase], frames)
+
+        self._next_t += count * self.down - limit
+        self._history = buf[len(buf) - (self.taps - 1):]
+
+        if block.dtype == np.int16:
+            y = np.clip(np.rint(y), -32768, 32767).astype(np.int16)
+        else:
+            y = y.astype(block.dtype, copy=False)
+        return y.ravel() if flat else y
+
+
+# Clock drift larger than this (relative to the nominal rate) is treated as a bad estimate
+MAX_CLOCK_DRIFT = 0.005
+# Seconds of timestamps needed before a drift estimate is trusted
+DRIFT_MIN_SPAN = 2.0
+
+
+class ClockDriftEstimator:
+    """Estimate the true sample rate of a device from block timestamps.
+
+    Fits `frame = rate * time + offset` by least squares over every block
+    seen so far, with running sums, so memory stays constant however long the
+    recording. Timestamp jitter averages out as the span grows; until
+    `DRIFT_MIN_SPAN` seconds are covered (or if the fit is implausible) the
+    nominal rate is reported and `frame_at`/`time_at` return None.
+    """
+
+    def __init__(self, nominal_rate: float):
+        self.nominal_rate = float(nominal_rate)
+        self._origin = None
+        self._n = 0
+        self._sx = self._sy = self._sxx = self._sxy = 0.0
+        self.span = 0.0
+
+    def add(self, timestamp: float, frame: int):
+        """Record that frame number `frame` was captured at `timestamp` seconds."""
+        if self._origin is None:
+            self._origin = (timestamp, frame)
+        x = timestamp - self._origin[0]
+        # Fit the deviation from the nominal rate, which keeps the sums small
+        y = frame - self._origin[1] - self.nominal_rate * x
+        self._n += 1
+        self._sx += x
+        self._sy += y
+        self._sxx += x * x
+        self._sxy += x * y
+        self.span = max(self.span, x)
+
+    def _fit(self):
+        """(rate, intercept) of the fitted line, or None while it cannot be trusted."""
+        if self._n < 3 or self.span < DRIFT_MIN_SPAN:
+            return None
+        denominator = self._n * self._sxx - self._sx * self._sx
+        if denominator <= 0:
+            return None
+        deviation = (self._n * self._sxy - self._sx * self._sy) / denominator
+        if abs(deviation) > MAX_CLOCK_DRIFT * self.nominal_rate:
+            return None
+        return self.nominal_rate + deviation, (self._sy - deviation * self._sx) / self._n
+
+    @property
+    def rate(self) -> float:
+        fit = self._fit()
+        return fit[0] if fit else self.nominal_rate
+
+    def frame_at(self, timestamp: float):
+        """Fitted frame number at `timestamp`."""
+        fit = self._fit()
+        if fit is None:
+            return None
+        rate, intercept = fit
+        return self._origin[1] + intercept + rate * (timestamp - self._origin[0])
+
+    def time_at(self, frame: float):
+        """Fitted time at which frame number `frame` was captured."""
+        fit = self._fit()
+        if fit is None:
+            return None
+        rate, intercept = fit
+        return self._origin[0] + (frame - self._origin[1] - intercept) / rate
+
+
+class DriftCorrector:
+    """Resample a stream by a slowly varying ratio close to 1, block by block.
+
+    `process(block, ratio)` reads `ratio` input frames per output frame, so a
+    device whose clock runs fast (ratio > 1) is stretched back onto the
+    reference clock. Linear interpolation is plenty for the few hundred ppm
+    that real clocks drift by; the read position carries over between calls,
+    and a ratio of exactly 1 on a whole-frame position copies the input.
+    """
+
+    def __init__(self, channels: int = 1):
+        self.channels = channels
+        self._tail = np.zeros((0, channels), dtype=np.float32)  # last frame of the previous block
+        self._pos = 0.0  # read position of the next output frame, relative to _tail
+        self.frames_in = 0
+        self.frames_out = 0
+
+    @property
+    def position(self) -> float:
+        """Input frame (since the first block) that the next output frame is read at."""
+        return self.frames_in - len(self._tail) + self._pos
+
+    def process(self, block, ratio: float = 1.0):
+        """Return the output frames that `block` completes, as float32 `(frames, channels)`."""
+        block = np.asarray(block, dtype=np.float32).reshape(-1, self.channels)
+        if not len(block):
+            return block
+        data = np.concatenate((self._tail, block))
+        last = len(data) - 1
+        if self._pos > last:
+            count = 0
+        else:
+            count = int((last - self._pos) // ratio) + 1
+        if ratio == 1.0 and self._pos == int(self._pos):
+            start = int(self._pos)
+            out = data[start:start + count]
+        else:
+            positions = self._pos + ratio * np.arange(count)
+            index = np.minimum(positions.astype(np.int64), last)
+            frac = (positions - index).astype(np.float32)[:, None]
+            out = data[index] * (1 - frac) + data[np.minimum(index + 1, last)] * frac
+        self._pos += ratio * count - last
+        self._tail = data[last:]
+        self.frames_in += len(block)
+        self.frames_out += count
+        return out
+
+
+# Voice activity gate defaults
+VAD_FRAME_DURATION = 0.02  # seconds per analysis frame
+VAD_THRESHOLD_DB = -50.0  # frames quieter than this (dBFS) are never speech
+VAD_MARGIN_DB = 10.0  # speech must also be this far above the tracked noise floor
+VAD_MAX_ZCR = 0.35  # zero-crossing rate above which a frame is treated as noise
+VAD_MAX_FLATNESS = 0.3  # spectral flatness above which a frame is noise-like (white noise ~0.56)
+VAD_HANGOVER = 0.5  # seconds kept open after speech so word endings and pauses survive
+VAD_PREROLL = 0.3  # seconds of audio before an onset that are sent with it
+VAD_NOISE_ADAPT = 0.05  # noise floor smoothing per block
+
+
+class VoiceActivityGate:
+    """Energy + zero-crossing voice activity gate for int16 mono PCM.
+
+    Audio is analysed in fixed frames; speech frames (plus a hangover after
+    each utterance and a pre-roll before each onset) pass through, silence is
+    dropped or, with `keep_silence_every=N`, thinned to every Nth frame.
+    Classification is vectorized over all frames in a block; an optional
+    spectral-flatness check rejects steady broadband noise. `ended` tells
+    whether an utterance ended (the gate closed) in the last block, so the
+    sender can signal end of speech instead of the silence it drops.
+    """
+
+    def __init__(self, sample_rate: int, frame_duration: float = VAD_FRAME_DURATION,
+                 threshold_db: float = VAD_THRESHOLD_DB, margin_db: float = VAD_MARGIN_DB,
+                 max_zcr: float = VAD_MAX_ZCR, hangover: float = VAD_HANGOVER,
+                 preroll: float = VAD_PREROLL, keep_silence_every: int = 0,
+                 spectral: bool = False, max_flatness: float = VAD_MAX_FLATNESS):
+        self.sample_rate = sample_rate
+        self.frame_len = max(2, int(sample_rate * frame_duration))
+        self.threshold_db = threshold_db
+        self.margin_db = margin_db
+        self.max_zcr = max_zcr
+        self.hangover_frames = int(round(hangover / frame_duration))
+        self.keep_silence_every = keep_silence_every
+        self.spectral = spectral
+        self.max_flatness = max_flatness
+        self._window = np.hanning(self.frame_len).astype(np.float32)
+        self._preroll = deque(maxlen=max(0, int(round(preroll / frame_duration))))
+        self._pending = np.empty(0, dtype=np.int16)
+        self._hang = 0
+        self._silent_run = 0
+        self.noise_floor_db = threshold_db - margin_db
+        self.frames_in = 0
+        self.frames_sent = 0
+        self.speech_frames = 0
+        self.utterances = 0
+        self.ended = False
+
+    @property
+    def active(self) -> bool:
+        """True while the gate is open (in speech or hangover)."""
+        return self._hang > 0
+
+    def classify(self, frames):
+        """Return a boolean speech mask for a `(n, frame_len)` float array in [-1, 1]."""
+        energy_db = 10 * np.log10(np.mean(frames * frames, axis=1) + 1e-10)
+        signs = np.signbit(frames)
+        zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / (self.frame_len - 1)
+        threshold = max(self.threshold_db, self.noise_floor_db + self.margin_db)
+        speech = (energy_db > threshold) & (zcr < self.max_zcr)
+        if self.spectral:
+            power = np.abs(np.fft.rfft(frames * self._window, axis=1)) ** 2 + 1e-12
+            flatness = np.exp(np.mean(np.log(power), axis=1)) / np.mean(power, axis=1)
+            speech &= flatness < self.max_flatness
+
+        # Track the noise floor from frames judged to be silence
+        quiet = energy_db[~speech]
+        if len(quiet):
+            self.noise_floor_db += VAD_NOISE_ADAPT * (float(quiet.mean()) - self.noise_floor_db)
+        return speech
+
+    def process(self, block):
+        """Gate one block of int16 samples; returns the samples to send (may be empty)."""
+        self.ended = False
+        samples = np.concatenate((self._pending, np.asarray(block, dtype=np.int16).ravel()))
+        count = len(samples) // self.frame_len
+        self._pending = samples[count * self.frame_len:]
+        if count == 0:
+            return samples[:0]
+
+        frames = samples[:count * self.frame_len].reshape(count, self.frame_len)
+        speech = self.classify(frames.astype(np.float32) / 32768.0)
+        self.frames_in += count
+        self.speech_frames += int(np.count_nonzero(speech))
+
+        out = []
+        for frame, is_speech in zip(frames, speech):
+            if is_speech:
+                if self._hang == 0:
+                    # Onset: send the buffered lead-in so the first syllable is not clipped
+                    out.extend(self._preroll)
+                    self._preroll.clear()
+                self._hang = self.hangover_frames + 1
+            if self._hang > 0:
+                self._hang -= 1
+                out.append(frame)
+                self._silent_run = 0
+                if self._hang == 0:
+                    self.utterances += 1
+                    self.ended = True
+                continue
+            self._silent_run += 1
+            if self.keep_silence_every and self._silent_run % self.keep_silence_every == 0:
+                out.append(frame)
+            elif self._preroll.maxlen:
+                self._preroll.append(frame)
+
+        self.frames_sent += len(out)
+        if not out:
+            return samples[:0]
+        return np.concatenate(out)
+
+    def stats(self) -> dict:
+        """Counters for the session: how much audio the gate kept back."""
+        frame_bytes = self.frame_len * 2
+        return {
+            "frames_in": self.frames_in,
+            "frames_sent": self.frames_sent,
+            "speech_frames": self.speech_frames,
+            "utterances": self.utterances,
+            "bytes_in": self.frames_in * frame_bytes,
+            "bytes_sent": self.frames_sent * frame_bytes,
+            "bytes_saved": (self.frames_in - self.frames_sent) * frame_bytes,
+            "noise_floor_db": self.noise_floor_db,
+        }
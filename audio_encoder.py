@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""Background encoding of captured audio into its final file format.
+
+Recordings land on disk as 16-bit WAV as soon as capture stops; converting
+them to the requested format happens in worker processes afterwards, so the
+tool that captured the audio can return without waiting for the codec and
+several recordings can be encoded in parallel.
+"""
+import asyncio
+import io
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+from audio_executors import get_process_pool
+from audio_lazy import lazy_import
+from audio_metrics import metrics
+
+sf = lazy_import("soundfile")
+
+# Target formats: name -> (file extension, libsndfile format, subtype)
+FORMATS = {
+    "ogg": (".ogg", "OGG", "VORBIS"),
+    "flac": (".flac", "FLAC", "PCM_16"),
+    "wav": (".wav", "WAV", "PCM_16"),
+}
+MIME_TYPES = {
+    "ogg": "audio/ogg",
+    "flac": "audio/flac",
+    "wav": "audio/wav",
+}
+# Subtype of the intermediate capture file
+CAPTURE_SUBTYPE = "PCM_16"
+ENCODE_BLOCKSIZE = 65536
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+# Finished jobs kept around for get_encoding_status/wait_for_encoding
+MAX_FINISHED_JOBS = 100
+
+
+def encode_file(source: str, target: str, fmt: str, remove_source: bool = True) -> str:
+    """Re-encode `source` into `target` block by block; returns the target path.
+
+    Runs in a worker process, so it must stay a plain module-level function.
+    """
+    _, sf_format, subtype = FORMATS[fmt]
+    with sf.SoundFile(source) as src:
+        with sf.SoundFile(target, mode='w', samplerate=src.samplerate, channels=src.channels,
+                          format=sf_format, subtype=subtype) as dst:
+            for block in src.blocks(blocksize=ENCODE_BLOCKSIZE, dtype='float32', always_2d=True):
+                dst.write(block)
+    if remove_source:
+        os.unlink(source)
+    return target
+
+
+def encode_bytes(data, samplerate: int, fmt: str = "flac") -> bytes:
+    """Encode a `(frames, channels)` array in memory and return the file bytes."""
+    _, sf_format, subtype = FORMATS[fmt]
+    buffer = io.BytesIO()
+    with metrics.span(f"encode.{fmt}_in_memory"):
+        sf.write(buffer, data, samplerate, format=sf_format, subtype=subtype)
+    return buffer.getvalue()
+
+
+class EncodingJobs:
+    """Registry of background encode jobs submitted to the process pool."""
+
+    def __init__(self, executor=None):
+        self._executor = executor
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, source, target, fmt: str, remove_source: bool = True, on_done=None) -> str:
+        """Queue `source` for encoding to `target` in format `fmt`; returns a job ID.
+
+        `on_done(source, target)` is called from a pool thread once the
+        target has been written successfully.
+        """
+        if fmt not in FORMATS:
+            raise ValueError(f"Unsupported format '{fmt}'. Choose one of: {', '.join(FORMATS)}")
+        executor = self._executor or get_process_pool()
+        job_id = uuid.uuid4().hex[:12]
+        submitted = time.perf_counter()
+        future = executor.submit(encode_file, str(source), str(target), fmt, remove_source)
+        # Time from submission to finish, including any wait for a free worker
+        future.add_done_callback(lambda f: metrics.observe(f"encode.{fmt}", time.perf_counter() - submitted))
+        if on_done is not None:
+            def _finished(f):
+                if not f.cancelled() and f.exception() is None:
+                    on_done(str(source), f.result())
+            future.add_done_callback(_finished)
+        with self._lock:
+            self._jobs[job_id] = {
+                "future": future,
+                "source": str(source),
+                "target": str(target),
+                "format": fmt,
+                "submitted": datetime.now().isoformat(timespec="seconds"),
+            }
+            self._prune_locked()
+        return job_id
+
+    def _prune_locked(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job["future"].done()]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._jobs[job_id]
+
+    def status(self, job_id: str) -> dict:
+        """State of one job (pending/running/done/failed), or None if unknown."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        future = job["future"]
+        info = {k: v for k, v in job.items() if k != "future"}
+        info["id"] = job_id
+        if not future.done():
+            info["state"] = RUNNING if future.running() else PENDING
+        elif future.cancelled():
+            info["state"] = FAILED
+            info["error"] = "cancelled"
+        elif future.exception() is not None:
+            info["state"] = FAILED
+            info["error"] = str(future.exception())
+        else:
+            info["state"] = DONE
+        return info
+
+    def list(self) -> list:
+        with self._lock:
+            job_ids = list(self._jobs)
+        return [self.status(job_id) for job_id in job_ids]
+
+    async def wait(self, job_id: str, timeout: float = None) -> dict:
+        """Wait for a job to finish (or `timeout` seconds) and return its status."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        try:
+            await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(job["future"])), timeout)
+        except asyncio.TimeoutError:
+            pass
+        except Exception:
+            # Failures are reported through the status
+            pass
+        return self.status(job_id)
@@ -0,0 +1,522 @@
+#!/usr/bin/env python3
+"""Server-lifetime PortAudio streams shared by all tools.
+
+Opening a PortAudio stream often takes 50-300 ms (on ALSA in particular), and
+tools opening the same device at once can fail or interfere with each other.
+`AudioEngine` keeps one input stream open per device and sample rate, and one
+output stream per device at its native rate, and hands out lightweight
+clients instead:
+
+- `input_stream()` returns a capture tap that receives every input block;
+- `output_stream()` returns a playback voice that is resampled to the device
+  rate and mixed into the output, with its own gain and optional ducking of
+  the other voices.
+
+Taps and voices take the same arguments as `sd.InputStream`/`sd.OutputStream`
+and behave like them (callback signature, `CallbackStop`, `finished_callback`,
+context manager), so the helpers in `audio_streams` can use either. A device
+stream stays open while it has clients and for `idle_timeout` seconds after
+the last one leaves.
+"""
+import os
+import threading
+import time
+from contextlib import ExitStack
+from audio_devices import INPUT, OUTPUT
+from audio_dsp import StreamingResampler
+from audio_lazy import lazy_import
+from audio_metrics import metrics
+
+np = lazy_import("numpy")
+sd = lazy_import("sounddevice")
+
+# Frames per callback of the shared device streams
+DEFAULT_ENGINE_BLOCKSIZE = 1024
+# Device streams open with at least this many channels (if the device has them),
+# so mono and stereo clients can share a stream without reopening it
+SHARED_CHANNELS = 2
+# Seconds an unused device stream is kept open before it is closed
+DEFAULT_IDLE_TIMEOUT = 30.0
+IDLE_TIMEOUT_ENV = "AUDIO_ENGINE_IDLE_TIMEOUT"
+
+
+def _native_rate(device, default: int) -> int:
+    """Default sample rate of an output device, or `default` if it cannot be queried."""
+    try:
+        return int(sd.query_devices(device, OUTPUT)['default_samplerate'])
+    except Exception:
+        return default
+
+
+class _Client:
+    """A logical stream attached to a shared device stream."""
+
+    def __init__(self, engine, kind, samplerate, channels, dtype='float32', blocksize=None,
+                 device=None, callback=None, finished_callback=None, **kwargs):
+        self._engine = engine
+        self.kind = kind
+        self.samplerate = samplerate
+        self.channels = channels
+        self.dtype = dtype
+        self.blocksize = blocksize or engine.blocksize
+        self.device = device
+        self.callback = callback
+        self.finished_callback = finished_callback
+        self.closed = False
+        self._float = np.dtype(dtype).kind == 'f'
+        self._device_stream = None
+        self._done = threading.Event()
+        self._done_lock = threading.Lock()
+
+    @property
+    def active(self) -> bool:
+        return self._device_stream is not None and not self._done.is_set()
+
+    def _finish(self):
+        """Mark the client finished and notify its owner, once."""
+        with self._done_lock:
+            if self._done.is_set():
+                return
+            self._done.set()
+        if self.finished_callback is not None:
+            self.finished_callback()
+
+    def start(self):
+        self._done.clear()
+        self._device_stream = self._engine._attach(self)
+
+    def stop(self):
+        device_stream, self._device_stream = self._device_stream, None
+        if device_stream is not None:
+            device_stream.detach(self)
+            self._finish()
+
+    abort = stop
+
+    def close(self):
+        self.stop()
+        self.closed = True
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class _ChunkTime:
+    """Timestamps of a re-chunked input block, reused for every block of a tap."""
+
+    __slots__ = ("inputBufferAdcTime", "currentTime", "outputBufferDacTime")
+
+    def set(self, time_info, delay):
+        """Copy `time_info`, moving the ADC time `delay` seconds later (if it is known)."""
+        adc = getattr(time_info, 'inputBufferAdcTime', 0.0)
+        self.inputBufferAdcTime = adc + delay if adc else adc
+        self.currentTime = getattr(time_info, 'currentTime', 0.0)
+        self.outputBufferDacTime = getattr(time_info, 'outputBufferDacTime', 0.0)
+
+
+class CaptureTap(_Client):
+    """Receives the blocks of a shared input stream, like an `sd.InputStream` callback.
+
+    Blocks are re-chunked to the tap's `blocksize` and converted to its dtype
+    (int16 scaled by 32767, as PortAudio does) in buffers allocated when the
+    tap starts, so the audio thread does not allocate. A float tap whose
+    block size matches the device stream's gets the device blocks directly.
+    """
+
+    def start(self):
+        self._chunk = np.zeros((self.blocksize, self.channels), dtype=self.dtype)
+        self._scaled = None if self._float else np.zeros((self.blocksize, self.channels), dtype=np.float32)
+        self._chunk_fill = 0
+        self._chunk_time = _ChunkTime()
+        super().start()
+
+    def _call(self, block, frames, time_info, status) -> bool:
+        try:
+            self.callback(block, frames, time_info, status)
+            return True
+        except (sd.CallbackStop, sd.CallbackAbort):
+            self._finish()
+        except Exception:
+            # A failing tap must not take the shared stream (and the other taps) down
+            self._finish()
+        return False
+
+    def _deliver(self, indata, frames, time_info, status):
+        if self._float and frames == self.blocksize and not self._chunk_fill:
+            self._call(indata[:, :self.channels], frames, time_info, status)
+            return
+        offset = 0
+        while offset < frames:
+            n = min(frames - offset, self.blocksize - self._chunk_fill)
+            if not self._chunk_fill and time_info is not None:
+                self._chunk_time.set(time_info, offset / self.samplerate)
+            source = indata[offset:offset + n, :self.channels]
+            target = self._chunk[self._chunk_fill:self._chunk_fill + n]
+            if self._float:
+                target[...] = source
+            else:
+                scaled = self._scaled[:n]
+                np.clip(source, -1.0, 1.0, out=scaled)
+                np.multiply(scaled, 32767, out=scaled)
+                np.copyto(target, scaled, casting='unsafe')
+            self._chunk_fill += n
+            offset += n
+            if self._chunk_fill == self.blocksize:
+                self._chunk_fill = 0
+                chunk_time = self._chunk_time if time_info is not None else None
+                if not self._call(self._chunk, self.blocksize, chunk_time, status):
+                    return
+
+
+class PlaybackVoice(_Client):
+    """Produces blocks for a shared output stream, like an `sd.OutputStream` callback.
+
+    The callback is asked for `blocksize` frames at a time; blocks are
+    resampled to the device rate if the voice's differs, and re-chunked to
+    the device stream's block size through a FIFO allocated when the voice
+    starts. Without resampling the audio thread does not allocate.
+
+    `gain` scales the voice and may be changed while it plays. While a voice
+    with `ducking` set is playing, every other voice on the device is scaled
+    by `ducking` as well (e.g. 0.3 to keep music audible under speech). Gain
+    changes are ramped over one block to avoid clicks.
+    """
+
+    def __init__(self, *args, gain: float = 1.0, ducking: float = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.gain = gain
+        self.ducking = ducking
+        self._applied_gain = None  # gain at the end of the last mixed block
+        self._resampler = None  # voice rate -> device rate, when they differ
+        self._pull_frames = self.blocksize  # most frames one callback block adds to the FIFO
+        # Integer callbacks write here first; float ones write straight into the FIFO
+        self._block = None if self._float else np.zeros((self.blocksize, self.channels), dtype=self.dtype)
+        self._staging = None  # float copy of an integer block, for the resampler
+        self._fifo = None  # frames produced but not yet mixed: _fifo[_head:_head + _fill]
+        self._head = 0
+        self._fill = 0
+        self._eof = False
+
+    def start(self):
+        self._head = self._fill = 0
+        self._eof = False
+        self._applied_gain = None
+        self._set_rate(self._engine._device_stream(self).samplerate)
+        self._reserve(self._engine.blocksize)
+        super().start()
+
+    def _set_rate(self, device_rate):
+        """Set up resampling from the voice's rate to `device_rate`."""
+        if device_rate == self.samplerate:
+            self._resampler = None
+            self._pull_frames = self.blocksize
+            return
+        self._resampler = StreamingResampler(self.samplerate, device_rate, self.channels)
+        self._pull_frames = -(-self.blocksize * int(device_rate) // int(self.samplerate)) + 1
+        if self._float:
+            self._block = np.zeros((self.blocksize, self.channels), dtype=self.dtype)
+        else:
+            self._staging = np.zeros((self.blocksize, self.channels), dtype=np.float32)
+
+    def _reserve(self, frames):
+        """Make room for `frames` frames plus one callback block, keeping what is pending."""
+        if self._fifo is not None and len(self._fifo) >= frames + self._pull_frames:
+            return
+        fifo = np.zeros((frames + self._pull_frames, self.channels), dtype=np.float32)
+        if self._fifo is not None:
+            fifo[:self._fill] = self._fifo[self._head:self._head + self._fill]
+        self._fifo, self._head = fifo, 0
+
+    def _compact(self):
+        self._fifo[:self._fill] = self._fifo[self._head:self._head + self._fill]
+        self._head = 0
+
+    def _pull(self, time_info, status) -> bool:
+        """Ask the callback for one block and append it to the FIFO; False if it failed."""
+        end = self._head + self._fill
+        direct = self._float and self._resampler is None
+        block = self._fifo[end:end + self.blocksize] if direct else self._block
+        block.fill(0)
+        try:
+            self.callback(block, self.blocksize, time_info, status)
+        except sd.CallbackStop:
+            # As with PortAudio, the block written before stopping is still played
+            self._eof = True
+        except Exception:
+            self._eof = True
+            return False
+        if self._resampler is None:
+            if not self._float:
+                np.multiply(block, 1 / 32768, out=self._fifo[end:end + self.blocksize], casting='unsafe')
+            self._fill += self.blocksize
+            return True
+        if not self._float:
+            np.multiply(block, 1 / 32768, out=self._staging, casting='unsafe')
+            block = self._staging
+        resampled = self._resampler.process(block)
+        self._fifo[end:end + len(resampled)] = resampled
+        self._fill += len(resampled)
+        return True
+
+    def _read(self, frames, time_info, status):
+        """A view of the next `frames` frames (zero-padded at the end), or None once finished.
+
+        The view stays valid until the next call.
+        """
+        self._reserve(frames)
+        while self._fill < frames and not self._eof:
+            if self._head + self._fill + self._pull_frames > len(self._fifo):
+                self._compact()
+            if not self._pull(time_info, status):
+                break
+        if not self._fill:
+            self._finish()
+            return None
+        if self._fill < frames:
+            if self._head + frames > len(self._fifo):
+                self._compact()
+            self._fifo[self._head + self._fill:self._head + frames] = 0
+            self._fill = frames
+        data = self._fifo[self._head:self._head + frames]
+        self._fill -= frames
+        self._head = self._head + frames if self._fill else 0
+        return data
+
+
+class _DeviceStream:
+    """One long-lived PortAudio stream and the clients attached to it.
+
+    The client list is replaced, never mutated, so the audio callback can
+    iterate it without taking the lock.
+    """
+
+    def __init__(self, engine, kind, device, samplerate):
+        self.engine = engine
+        self.kind = kind
+        self.device = device
+        self.samplerate = samplerate
+        self.channels = 0
+        self.clients = ()
+        self.opens = 0
+        self._stream = None
+        self._exit = None
+        self._closing = False
+        self._failed = False
+        self._timer = None
+        self._lock = threading.RLock()
+        self._scratch = None  # mixing buffers, see _prepare()
+
+    @property
+    def is_open(self) -> bool:
+        return self._stream is not None and not self._failed
+
+    def attach(self, client):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self.is_open or client.channels > self.channels:
+                # Reopen with enough channels for every client
+                channels = max([client.channels, min(SHARED_CHANNELS, self._device_channels())]
+                               + [c.channels for c in self.clients])
+                self._open(channels)
+            self.clients = self.clients + (client,)
+
+    def detach(self, client):
+        with self._lock:
+            self.clients = tuple(c for c in self.clients if c is not client)
+            if not self.clients:
+                self._schedule_close()
+
+    def _device_channels(self) -> int:
+        try:
+            return int(sd.query_devices(self.device, self.kind)[f'max_{self.kind}_channels'])
+        except Exception:
+            return 0
+
+    def _open(self, channels):
+        self._close_stream()
+        stream_cls = sd.InputStream if self.kind == INPUT else sd.OutputStream
+        start = time.perf_counter()
+        try:
+            stream = stream_cls(samplerate=self.samplerate, channels=channels, dtype='float32',
+                                blocksize=self.engine.blocksize, device=self.device,
+                                callback=self._callback,
+                                finished_callback=lambda: self._on_finished(stream))
+            exit_stack = ExitStack()
+            exit_stack.enter_context(stream)
+        except Exception:
+            # Clients of the stream that was just closed have nothing to run on
+            for client in self.clients:
+                client._finish()
+            self.clients = ()
+            raise
+        self._stream, self._exit = stream, exit_stack
+        self.channels = channels
+        self._failed = False
+        self.opens += 1
+        metrics.observe(f"{self.kind}.engine_open", time.perf_counter() - start)
+
+    def _close_stream(self):
+        if self._stream is None:
+            return
+        self._closing = True
+        try:
+            self._exit.close()
+        finally:
+            self._stream = self._exit = None
+            self._closing = False
+            self.channels = 0
+
+    def _schedule_close(self):
+        timeout = self.engine.idle_timeout
+        if timeout <= 0:
+            self._close_stream()
+            return
+        self._timer = threading.Timer(timeout, self._close_if_idle)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _close_if_idle(self):
+        with self._lock:
+            if not self.clients:
+                self._close_stream()
+
+    def close(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            for client in self.clients:
+                client._finish()
+            self.clients = ()
+            self._close_stream()
+
+    def _on_finished(self, stream):
+        if self._closing or stream is not self._stream:
+            return
+        # The stream ended on its own (e.g. device unplugged): release the
+        # clients now and reopen on the next attach
+        self._failed = True
+        for client in self.clients:
+            client._finish()
+
+    def _callback(self, data, frames, time_info, status):
+        if self._closing:
+            raise sd.CallbackStop
+        if self.kind == INPUT:
+            for client in self.clients:
+                if not client._done.is_set():
+                    client._deliver(data, frames, time_info, status)
+            return
+
+        self._mix(data, frames, time_info, status)
+
+    def _prepare(self, frames, channels):
+        """Allocate the mixing buffers for blocks of `frames` frames."""
+        self._scratch = np.zeros((frames, channels), dtype=np.float32)
+        self._ramp = np.zeros((frames, 1), dtype=np.float32)
+        self._ramp_steps = (np.arange(1, frames + 1, dtype=np.float32) / frames)[:, None]
+
+    def _mix(self, data, frames, time_info, status):
+        """Sum the voices into `data`, with gain, ducking and a one-block ramp on gain changes."""
+        if self._scratch is None or len(self._scratch) != frames or self._scratch.shape[1] < data.shape[1]:
+            self._prepare(frames, data.shape[1])
+        clients = self.clients
+        duckers = [c for c in clients if c.ducking is not None and not c._done.is_set()]
+        data.fill(0)
+        for client in clients:
+            if client._done.is_set():
+                continue
+            block = client._read(frames, time_info, status)
+            if block is None:
+                continue
+            gain = client.gain
+            for other in duckers:
+                if other is not client:
+                    gain *= other.ducking
+            start = client._applied_gain
+            if start is None:
+                start = gain
+            client._applied_gain = gain
+            scratch = self._scratch[:, :block.shape[1]]
+            if start == gain:
+                if gain == 1.0:
+                    scratch = block
+                else:
+                    np.multiply(block, gain, out=scratch)
+            else:
+                np.multiply(self._ramp_steps, gain - start, out=self._ramp)
+                self._ramp += start
+                np.multiply(block, self._ramp, out=scratch)
+            if block.shape[1] == 1 or block.shape[1] == data.shape[1]:
+                # Mono voices play on every channel
+                data += scratch
+            else:
+                data[:, :block.shape[1]] += scratch
+        np.clip(data, -1.0, 1.0, out=data)
+
+
+class AudioEngine:
+    """Shared device streams: inputs per (device, sample rate), outputs per device.
+
+    `input_stream(...)`/`output_stream(...)` take the arguments of
+    `sd.InputStream`/`sd.OutputStream` and return a tap or voice; the device
+    stream is opened on the first start() and reused by later ones. Output
+    streams run at the device's native rate, so voices at any rate share one
+    stream (exclusive devices, e.g. ALSA hw: ones, cannot be opened twice).
+    """
+
+    def __init__(self, blocksize: int = DEFAULT_ENGINE_BLOCKSIZE, idle_timeout: float = None):
+        self.blocksize = blocksize
+        if idle_timeout is None:
+            idle_timeout = float(os.environ.get(IDLE_TIMEOUT_ENV, DEFAULT_IDLE_TIMEOUT))
+        self.idle_timeout = idle_timeout
+        self._streams = {}
+        self._lock = threading.Lock()
+
+    def _device_stream(self, client) -> _DeviceStream:
+        """The device stream `client` runs on, created (but not opened) if needed."""
+        if client.kind == OUTPUT:
+            key = (OUTPUT, client.device)
+        else:
+            key = (client.kind, client.device, client.samplerate)
+        with self._lock:
+            device_stream = self._streams.get(key)
+            if device_stream is None:
+                samplerate = client.samplerate
+                if client.kind == OUTPUT:
+                    samplerate = _native_rate(client.device, samplerate)
+                device_stream = self._streams[key] = _DeviceStream(self, client.kind, client.device, samplerate)
+        return device_stream
+
+    def _attach(self, client):
+        device_stream = self._device_stream(client)
+        device_stream.attach(client)
+        return device_stream
+
+    def input_stream(self, **kwargs) -> CaptureTap:
+        return CaptureTap(self, INPUT, **kwargs)
+
+    def output_stream(self, **kwargs) -> PlaybackVoice:
+        return PlaybackVoice(self, OUTPUT, **kwargs)
+
+    def status(self) -> list:
+        """One dict per device stream: kind, device, samplerate, channels, open, clients, opens."""
+        with self._lock:
+            streams = list(self._streams.values())
+        return [{"kind": s.kind, "device": s.device, "samplerate": s.samplerate,
+                 "channels": s.channels, "open": s.is_open, "clients": len(s.clients),
+                 "opens": s.opens} for s in streams]
+
+    def close(self):
+        """Close every device stream, finishing any clients still attached."""
+        with self._lock:
+            streams = list(self._streams.values())
+            self._streams.clear()
+        for device_stream in streams:
+            device_stream.close()
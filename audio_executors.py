@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""Bounded thread pools for blocking audio device, codec and network work.
+
+The MCP tools are coroutines served from a single event loop, so anything that
+blocks (PortAudio calls, libsndfile encode/decode, synchronous HTTP clients)
+must be handed to one of these executors to keep the server responsive.
+CPU-bound batch work (background encoding) goes to a separate process pool so
+it runs across cores instead of contending for the GIL.
+"""
+import asyncio
+import functools
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+# Resource classes and their default worker counts. Each can be overridden
+# with an AUDIO_<CLASS>_WORKERS environment variable.
+DEVICE = "device"
+CODEC = "codec"
+NETWORK = "network"
+
+DEFAULT_WORKERS = {
+    DEVICE: 4,
+    CODEC: max(2, min(4, os.cpu_count() or 1)),
+    NETWORK: 8,
+}
+
+# Worker processes for background encoding; override with AUDIO_ENCODER_WORKERS.
+DEFAULT_PROCESS_WORKERS = max(1, min(4, os.cpu_count() or 1))
+
+_executors = {}
+_process_pool = None
+_lock = threading.Lock()
+
+
+def get_executor(kind: str) -> ThreadPoolExecutor:
+    """Return the shared executor for a resource class, creating it on first use."""
+    if kind not in DEFAULT_WORKERS:
+        raise ValueError(f"Unknown executor kind: {kind}")
+
+    with _lock:
+        executor = _executors.get(kind)
+        if executor is None:
+            workers = int(os.environ.get(f"AUDIO_{kind.upper()}_WORKERS", DEFAULT_WORKERS[kind]))
+            executor = ThreadPoolExecutor(max_workers=max(1, workers),
+                                          thread_name_prefix=f"audio-{kind}")
+            _executors[kind] = executor
+        return executor
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """Return the shared process pool for CPU-bound jobs, creating it on first use."""
+    global _process_pool
+    with _lock:
+        if _process_pool is None:
+            workers = int(os.environ.get("AUDIO_ENCODER_WORKERS", DEFAULT_PROCESS_WORKERS))
+            # Spawn rather than fork: the server has PortAudio callback and pool threads
+            # running, and a forked child can deadlock on a lock one of them held
+            _process_pool = ProcessPoolExecutor(max_workers=max(1, workers),
+                                                mp_context=multiprocessing.get_context("spawn"))
+        return _process_pool
+
+
+async def run_blocking(kind: str, func, *args, **kwargs):
+    """Run a blocking callable on the executor for `kind` and await its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(kind), functools.partial(func, *args, **kwargs))
+
+
+async def run_device(func, *args, **kwargs):
+    """Run blocking PortAudio work (open/record/play/wait) off the event loop."""
+    return await run_blocking(DEVICE, func, *args, **kwargs)
+
+
+async def run_codec(func, *args, **kwargs):
+    """Run blocking encode/decode or file I/O off the event loop."""
+    return await run_blocking(CODEC, func, *args, **kwargs)
+
+
+async def run_network(func, *args, **kwargs):
+    """Run a blocking network request off the event loop."""
+    return await run_blocking(NETWORK, func, *args, **kwargs)
+
+
+def shutdown_executors(wait: bool = True):
+    """Shut down all executors (used on server exit and in tests)."""
+    global _process_pool
+    with _lock:
+        executors = list(_executors.values())
+        _executors.clear()
+        if _process_pool is not None:
+            executors.append(_process_pool)
+            _process_pool = None
+    for executor in executors:
+        executor.shutdown(wait=wait)
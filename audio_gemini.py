@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""Server-lifetime Gemini client with pooled chat sessions.
+
+The client is configured once, on first use, so repeated tool calls reuse its
+HTTP connections. Chat sessions are kept per conversation ID, which preserves
+the conversation history between turns, and are dropped after sitting idle.
+"""
+import importlib
+import importlib.util
+import os
+import threading
+import time
+from audio_metrics import metrics
+
+# google.generativeai takes most of a second to import, so it is only located
+# here and imported when the client is first configured
+try:
+    GENAI_AVAILABLE = importlib.util.find_spec("google.generativeai") is not None
+except ImportError:
+    GENAI_AVAILABLE = False
+genai = None
+
+DEFAULT_MODEL = "gemini-2.0-flash"
+DEFAULT_CONVERSATION = "default"
+DEFAULT_IDLE_TIMEOUT = 15 * 60  # seconds a chat session may sit unused
+DEFAULT_MAX_SESSIONS = 64
+# Optional API endpoint override, e.g. http://127.0.0.1:8080 for a local stub
+ENDPOINT_ENV = "GEMINI_API_ENDPOINT"
+
+
+def preload():
+    """Import google.generativeai ahead of the first request (used by the warm-up)."""
+    global genai
+    if GENAI_AVAILABLE and genai is None:
+        genai = importlib.import_module("google.generativeai")
+
+
+class GeminiUnavailable(RuntimeError):
+    """Raised when the Gemini client cannot be set up (package or API key missing)."""
+
+
+class GeminiClientManager:
+    """Lazily configured Gemini client and a pool of chat sessions.
+
+    `send(conversation_id, message)` is blocking and meant to run on the
+    network executor. Turns in the same conversation are serialized; turns in
+    different conversations run concurrently.
+    """
+
+    def __init__(self, model_name: str = DEFAULT_MODEL, api_key: str = None,
+                 endpoint: str = None, idle_timeout: float = DEFAULT_IDLE_TIMEOUT,
+                 max_sessions: int = DEFAULT_MAX_SESSIONS, clock=time.monotonic):
+        self.model_name = model_name
+        self._api_key = api_key
+        self._endpoint = endpoint
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max_sessions
+        self._clock = clock
+        self._model = None
+        self._sessions = {}  # conversation_id -> [chat, lock, last_used]
+        self._lock = threading.Lock()
+        self.configure_count = 0
+
+    def _configure(self):
+        if not GENAI_AVAILABLE:
+            raise GeminiUnavailable("Google Generative AI package is not installed. "
+                                    "Please install it with: pip install google-generativeai")
+        api_key = self._api_key or os.environ.get("GOOGLE_API_KEY")
+        if not api_key:
+            raise GeminiUnavailable("No API key provided. Please provide a valid Google AI API key "
+                                    "or set the GOOGLE_API_KEY environment variable.")
+        preload()
+        endpoint = self._endpoint or os.environ.get(ENDPOINT_ENV)
+        options = {"api_key": api_key}
+        if endpoint:
+            # Plain REST lets the endpoint be any HTTP server, including a test stub
+            options.update(transport="rest", client_options={"api_endpoint": endpoint})
+        genai.configure(**options)
+        self.configure_count += 1
+        return genai.GenerativeModel(self.model_name)
+
+    @property
+    def model(self):
+        """The shared GenerativeModel, configuring the client on first access."""
+        with self._lock:
+            if self._model is None:
+                self._model = self._configure()
+            return self._model
+
+    def _session(self, conversation_id):
+        model = self.model
+        with self._lock:
+            self._evict_idle_locked()
+            entry = self._sessions.get(conversation_id)
+            if entry is None:
+                if len(self._sessions) >= self.max_sessions:
+                    # Make room by dropping the least recently used conversation
+                    oldest = min(self._sessions, key=lambda key: self._sessions[key][2])
+                    del self._sessions[oldest]
+                entry = [model.start_chat(), threading.Lock(), self._clock()]
+                self._sessions[conversation_id] = entry
+            entry[2] = self._clock()
+            return entry
+
+    def send(self, conversation_id: str, message) -> str:
+        """Send one turn in a conversation and return the model's text reply.
+
+        The reply is streamed so the time to its first chunk can be recorded
+        (`gemini.first_chunk`) separately from the full request (`gemini.request`).
+        """
+        conversation_id = conversation_id or DEFAULT_CONVERSATION
+        entry = self._session(conversation_id)
+        chat, lock, _ = entry
+        with lock:
+            start = time.perf_counter()
+            response = chat.send_message(message, stream=True)
+            try:
+                first = True
+                for _ in response:
+                    if first:
+                        metrics.observe("gemini.first_chunk", time.perf_counter() - start)
+                        first = False
+                metrics.observe("gemini.request", time.perf_counter() - start)
+                return response.text
+            except Exception:
+                # A stream that failed or was blocked leaves the session unusable (later turns
+                # raise BrokenResponseError), so take this turn back out of its history
+                self._discard_turn(conversation_id, entry)
+                raise
+
+    def _discard_turn(self, conversation_id, entry):
+        try:
+            entry[0].rewind()
+        except Exception:
+            with self._lock:
+                if self._sessions.get(conversation_id) is entry:
+                    del self._sessions[conversation_id]
+
+    def _evict_idle_locked(self):
+        deadline = self._clock() - self.idle_timeout
+        for conversation_id in [k for k, v in self._sessions.items() if v[2] < deadline]:
+            del self._sessions[conversation_id]
+
+    def evict_idle(self) -> int:
+        """Drop chat sessions idle for longer than `idle_timeout`; returns how many remain."""
+        with self._lock:
+            self._evict_idle_locked()
+            return len(self._sessions)
+
+    def history_length(self, conversation_id: str) -> int:
+        with self._lock:
+            entry = self._sessions.get(conversation_id)
+        return len(entry[0].history) if entry else 0
+
+    def end(self, conversation_id: str) -> bool:
+        """Forget a conversation; returns False if it did not exist."""
+        with self._lock:
+            return self._sessions.pop(conversation_id, None) is not None
+
+    def conversations(self) -> list:
+        with self._lock:
+            return list(self._sessions)
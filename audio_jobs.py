@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""Background jobs for long-running tools.
+
+A tool wrapped with `JobManager.background(resource)` gains a `background`
+argument; called with `background=True` it returns a job ID straight away and
+runs as an asyncio task instead of holding the MCP request open. Jobs are
+grouped by the resource class they mostly use (device, codec, network, as in
+`audio_executors`). Each class has a cap on concurrently running jobs; jobs
+over the cap wait in the PENDING state.
+
+Each job records the client that started it (in daemon mode, see
+`audio_clients`); the status, wait and cancel calls only see a client's own
+jobs.
+"""
+import asyncio
+import contextvars
+import functools
+import inspect
+import os
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from audio_executors import DEFAULT_WORKERS
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+# Finished jobs kept around for job_status/job_wait
+MAX_FINISHED_JOBS = 100
+
+_current_job = contextvars.ContextVar("current_job", default=None)
+
+
+def report_progress(fraction: float = None, message: str = None, source=None):
+    """Update the progress of the job running in the current task; no-op outside a job.
+
+    `source` is a callable returning the current fraction, evaluated only when
+    the status is read, so tight loops (or audio threads) need not report.
+    """
+    job = _current_job.get()
+    if job is None:
+        return
+    if fraction is not None:
+        job.progress = max(0.0, min(1.0, fraction))
+        job.progress_source = None
+    if source is not None:
+        job.progress_source = source
+    if message is not None:
+        job.message = message
+
+
+class Job:
+    """One background tool call."""
+
+    def __init__(self, job_id: str, name: str, resource: str, arguments: dict, client: str = None):
+        self.id = job_id
+        self.name = name
+        self.resource = resource
+        self.arguments = arguments
+        self.client = client
+        self.state = PENDING
+        self.progress = 0.0
+        self.progress_source = None
+        self.message = None
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.task = None
+
+    def _progress(self) -> float:
+        if self.progress_source is not None and self.state == RUNNING:
+            try:
+                return max(0.0, min(1.0, float(self.progress_source())))
+            except Exception:
+                pass
+        return self.progress
+
+    def status(self) -> dict:
+        progress = self._progress()
+        info = {
+            "id": self.id,
+            "name": self.name,
+            "resource": self.resource,
+            "state": self.state,
+            "progress": progress,
+            "message": self.message,
+            "created": datetime.fromtimestamp(self.created).isoformat(timespec="seconds"),
+            "arguments": self.arguments,
+            "client": self.client,
+        }
+        if self.started is not None:
+            end = self.finished or time.time()
+            info["elapsed"] = round(end - self.started, 2)
+        if self.state in FINISHED:
+            info["result"] = self.result
+            info["error"] = self.error
+        return info
+
+
+class JobManager:
+    """Runs tool coroutines as background jobs with a concurrency cap per resource class.
+
+    Caps default to the worker counts of the matching executors and can be
+    set with `limits` or AUDIO_<CLASS>_JOBS environment variables. Only used
+    from the event loop.
+
+    `owner`, if set, is called when a tool is started in the background and
+    returns `(client, release)`: the calling client's name and a function to
+    call once the job has finished (e.g. to free a per-client call slot).
+    """
+
+    def __init__(self, limits: dict = None):
+        self.limits = {kind: int(os.environ.get(f"AUDIO_{kind.upper()}_JOBS", workers))
+                       for kind, workers in DEFAULT_WORKERS.items()}
+        self.limits.update(limits or {})
+        self._semaphores = {}
+        self._jobs = OrderedDict()
+        self.owner = None
+
+    def _semaphore(self, resource):
+        semaphore = self._semaphores.get(resource)
+        if semaphore is None:
+            if resource not in self.limits:
+                raise ValueError(f"Unknown resource class: {resource}")
+            semaphore = self._semaphores[resource] = asyncio.Semaphore(max(1, self.limits[resource]))
+        return semaphore
+
+    def submit(self, name: str, resource: str, coro_factory, arguments: dict = None,
+               client: str = None, release=None) -> str:
+        """Start `coro_factory()` as a job once a `resource` slot is free; returns the job ID.
+
+        `client` owns the job; `release` is called once the job is finished or cancelled.
+        """
+        semaphore = self._semaphore(resource)
+        job = Job(uuid.uuid4().hex[:12], name, resource, arguments or {}, client)
+        job.task = asyncio.get_running_loop().create_task(self._run(job, semaphore, coro_factory))
+        if release is not None:
+            # A done callback also runs for a task cancelled before it started
+            job.task.add_done_callback(lambda _: release())
+        self._jobs[job.id] = job
+        self._prune()
+        return job.id
+
+    async def _run(self, job, semaphore, coro_factory):
+        _current_job.set(job)
+        try:
+            async with semaphore:
+                job.state = RUNNING
+                job.started = time.time()
+                result = await coro_factory()
+            job.result = result
+            # Tools report failures as "Error: ..." strings rather than raising
+            if isinstance(result, str) and result.lstrip().startswith("Error"):
+                job.state = FAILED
+                job.error = result.strip()
+            else:
+                job.progress = 1.0
+                job.progress_source = None
+                job.state = DONE
+        except asyncio.CancelledError:
+            job.progress, job.progress_source = job._progress(), None
+            job.state = CANCELLED
+            raise
+        except Exception as e:
+            job.state = FAILED
+            job.error = str(e)
+        finally:
+            job.finished = time.time()
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.state in FINISHED]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._jobs[job_id]
+
+    def _get(self, job_id, client):
+        """A job by ID; another client's jobs count as unknown. `client=None` sees every job."""
+        job = self._jobs.get(job_id)
+        if job is None or (client is not None and job.client != client):
+            return None
+        return job
+
+    def status(self, job_id: str, client: str = None) -> dict:
+        """Status of one job, or None if unknown."""
+        job = self._get(job_id, client)
+        return job.status() if job else None
+
+    def list(self, client: str = None) -> list:
+        return [job.status() for job in self._jobs.values() if client is None or job.client == client]
+
+    async def wait(self, job_id: str, timeout: float = None, client: str = None) -> dict:
+        """Wait for a job to finish (or `timeout` seconds) and return its status."""
+        job = self._get(job_id, client)
+        if job is None:
+            return None
+        # asyncio.wait never raises the job's own exception or cancellation
+        await asyncio.wait({job.task}, timeout=timeout)
+        return job.status()
+
+    async def cancel(self, job_id: str, timeout: float = 5.0, client: str = None) -> dict:
+        """Cancel a job and wait briefly for it to stop; returns its status."""
+        job = self._get(job_id, client)
+        if job is None:
+            return None
+        if job.state not in FINISHED:
+            job.task.cancel()
+            await asyncio.wait({job.task}, timeout=timeout)
+        return job.status()
+
+    def background(self, resource: str):
+        """Decorator adding a `background: bool = False` argument to a tool coroutine.
+
+        With `background=True` the call is submitted as a job of class
+        `resource` and a message with the job ID is returned instead. The job
+        is owned by the client reported by `owner`, if set.
+        """
+        def decorator(func):
+            signature = inspect.signature(func)
+            flag = inspect.Parameter("background", inspect.Parameter.KEYWORD_ONLY,
+                                     default=False, annotation=bool)
+
+            @functools.wraps(func)
+            async def wrapper(*args, background: bool = False, **kwargs):
+                if not background:
+                    return await func(*args, **kwargs)
+                arguments = dict(signature.bind(*args, **kwargs).arguments)
+                client, release = self.owner() if self.owner else (None, None)
+                try:
+                    job_id = self.submit(func.__name__, resource, functools.partial(func, *args, **kwargs),
+                                         arguments, client, release)
+                except BaseException:
+                    if release is not None:
+                        release()
+                    raise
+                return (f"Started {func.__name__} as background job {job_id}. "
+                        "Use job_status, job_wait or job_cancel with this job ID.")
+
+            wrapper.__signature__ = signature.replace(parameters=[*signature.parameters.values(), flag])
+            return wrapper
+        return decorator
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""Deferred imports for the heavy third-party modules.
+
+MCP clients start a fresh server process for every session, so anything
+imported at module level is paid for on every connect. `lazy_import()`
+returns a stand-in module straight away and only imports the real one when
+one of its attributes is first used, e.g. `sounddevice` (which initializes
+PortAudio and probes every host API) on the first device query.
+"""
+import importlib
+import importlib.util
+import sys
+import threading
+import types
+
+# One stand-in per module name, so every importer (and every test patch) sees the same object
+_stand_ins = {}
+_stand_ins_lock = threading.Lock()
+
+
+class _LazyModule(types.ModuleType):
+    """Stand-in that forwards attribute access to the real module, importing it on demand.
+
+    Every lookup goes through `importlib.import_module`, which returns the
+    cached module once it is loaded and holds the import lock while another
+    thread is still loading it, so the executors can race on first use.
+    Attributes patched on the real module (e.g. in tests) are seen as well.
+    """
+
+    def __getattr__(self, attr):
+        return getattr(importlib.import_module(self.__name__), attr)
+
+
+def lazy_import(name: str):
+    """Return module `name`, deferring the actual import until first attribute access.
+
+    Modules that are already loaded are returned as-is. Missing modules raise
+    ImportError here, just like a plain import.
+    """
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    with _stand_ins_lock:
+        module = _stand_ins.get(name)
+        if module is None:
+            if importlib.util.find_spec(name) is None:
+                raise ImportError(f"No module named {name!r}", name=name)
+            module = _stand_ins[name] = _LazyModule(name)
+    return module
+
+
+def is_loaded(name: str) -> bool:
+    """True once module `name` has actually been imported."""
+    return name in sys.modules
@@ -0,0 +1,419 @@
+#!/usr/bin/env python3
+"""Gemini Live conversations, several at once, keyed by session ID.
+
+A `LiveSession` owns the whole pipeline of one conversation: a capture tap
+and a playback voice (on the shared `AudioEngine` when one is given, so
+sessions on the same devices share one stream each and their replies are
+mixed), the capture ring, resamplers, voice gate, upload batcher, upload task
+and its own callback and latency statistics. `LiveSessionManager` starts,
+lists and stops sessions by ID.
+
+Sessions reach the Live API through a `connect()` callable that returns the
+SDK's async connection context manager, so this module does not import the
+SDK itself.
+"""
+import asyncio
+import base64
+import sys
+import time
+from collections import OrderedDict
+from time import monotonic, perf_counter_ns
+from audio_buffers import AdaptiveBatcher, CallbackStats, JitterBuffer, PcmRingBuffer, DROP_OLDEST
+from audio_dsp import StreamingResampler, VoiceActivityGate
+from audio_executors import run_device
+from audio_lazy import lazy_import
+from audio_metrics import MetricsRegistry, metrics
+
+np = lazy_import("numpy")
+sd = lazy_import("sounddevice")
+
+INITIAL_UPLOAD_BATCH = 0.16  # seconds; 5120 bytes at 16 kHz, as in TEN-Agent's fixed threshold
+DEFAULT_MIN_UPLOAD_LATENCY = 0.04  # seconds; smallest upload batch
+DEFAULT_MAX_UPLOAD_LATENCY = 0.5  # seconds; largest batch and oldest audio allowed to wait
+GEMINI_INPUT_RATE = 16000  # Live API expects 16 kHz 16-bit mono PCM
+GEMINI_OUTPUT_RATE = 24000  # Live API replies with 24 kHz 16-bit mono PCM
+CAPTURE_BUFFER_SECONDS = 2.0  # Oldest captured audio is dropped beyond this backlog
+DEFAULT_BLOCK_DURATION = 0.1  # seconds per capture callback
+DEFAULT_JITTER_BUFFER = 0.2  # seconds of model audio buffered before playback starts
+PLAYBACK_BUFFER_SECONDS = 60.0  # Model audio arrives faster than real time; hold whole replies
+PLAYBACK_BLOCK_DURATION = 0.02  # seconds per playback callback
+
+DEFAULT_SESSION = "default"
+# Live sessions allowed to run at once, and finished ones kept for status queries
+DEFAULT_MAX_LIVE_SESSIONS = 8
+MAX_FINISHED_SESSIONS = 20
+
+STARTING = "starting"
+RUNNING = "running"
+STOPPING = "stopping"
+FINISHED = "finished"
+FAILED = "failed"
+ENDED = (FINISHED, FAILED)
+
+
+class LiveSession:
+    """One real-time conversation: its streams, buffers, upload task and statistics."""
+
+    def __init__(self, session_id: str, sample_rate: int, output_sample_rate: int,
+                 channels: int = 1, device=None, output_device=None, duration: float = 60.0,
+                 block_duration: float = DEFAULT_BLOCK_DURATION,
+                 jitter_buffer: float = DEFAULT_JITTER_BUFFER, vad: bool = True,
+                 min_upload_latency: float = DEFAULT_MIN_UPLOAD_LATENCY,
+                 max_upload_latency: float = DEFAULT_MAX_UPLOAD_LATENCY, engine=None):
+        self.id = session_id
+        self.sample_rate = sample_rate
+        self.output_sample_rate = output_sample_rate
+        self.channels = channels
+        self.device = device
+        self.output_device = output_device
+        self.duration = duration
+        self.block_duration = block_duration
+        self.engine = engine
+        # Run both devices at their native rates and resample to/from the Live API rates
+        self.upload_resampler = StreamingResampler(sample_rate, GEMINI_INPUT_RATE)
+        self.playback_resampler = StreamingResampler(GEMINI_OUTPUT_RATE, output_sample_rate)
+        self.voice_gate = VoiceActivityGate(GEMINI_INPUT_RATE) if vad else None
+        self.upload_batcher = AdaptiveBatcher(GEMINI_INPUT_RATE * 2, min_upload_latency, max_upload_latency,
+                                              initial_latency=INITIAL_UPLOAD_BATCH)
+        # Preallocated capture ring, and the jitter buffer feeding the playback voice
+        self.capture_buffer = PcmRingBuffer(int(CAPTURE_BUFFER_SECONDS * sample_rate), channels,
+                                            policy=DROP_OLDEST)
+        self.playback_buffer = JitterBuffer(int(PLAYBACK_BUFFER_SECONDS * output_sample_rate), 1,
+                                            target_frames=int(jitter_buffer * output_sample_rate))
+        self.capture_stats = CallbackStats()
+        self.playback_stats = CallbackStats()
+        self.metrics = MetricsRegistry()
+        self.state = STARTING
+        self.error = None
+        self.result = None
+        self.created = time.time()
+        self.finished = None
+        self.last_upload_at = None  # monotonic time of the most recent upload
+        self.task = None
+        self._active = False
+        self._input = None
+        self._output = None
+        self._live = None
+
+    def _log(self, message: str):
+        # stdout carries the MCP protocol, so report on stderr
+        print(f"[{self.id}] {message}", file=sys.stderr)
+
+    def _observe(self, stage: str, seconds: float):
+        """Record a latency for this session and in the server-wide metrics."""
+        metrics.observe(stage, seconds)
+        self.metrics.observe(stage, seconds)
+
+    def _capture_callback(self, indata, frames, time_info, status):
+        """Called for each input block; it only copies into the capture ring."""
+        start = perf_counter_ns()
+        # Only buffer audio while the conversation is active; never allocates or blocks
+        if self._active:
+            self.capture_buffer.write(indata)
+        self.capture_stats.record(status, perf_counter_ns() - start)
+
+    def _playback_callback(self, outdata, frames, time_info, status):
+        """Drain the jitter buffer into the output; silence when nothing is buffered."""
+        start = perf_counter_ns()
+        self.playback_buffer.fill(outdata)
+        self.playback_stats.record(status, perf_counter_ns() - start)
+
+    def _enqueue_audio(self, audio_data):
+        """Queue int16 PCM bytes from the model for gapless playback; returns immediately."""
+        start = time.perf_counter()
+        audio_np = np.frombuffer(audio_data, dtype=np.int16).reshape(-1, 1)
+        self.playback_buffer.write(self.playback_resampler.process(audio_np))
+        self._observe("live.enqueue_playback", time.perf_counter() - start)
+
+    def _open_streams(self):
+        """Attach the capture tap and playback voice (or open streams of their own). Blocking."""
+        open_input = self.engine.input_stream if self.engine else sd.InputStream
+        open_output = self.engine.output_stream if self.engine else sd.OutputStream
+        # Capture int16 directly
+        self._input = open_input(
+            samplerate=self.sample_rate,
+            channels=self.channels,
+            device=self.device,
+            dtype='int16',
+            callback=self._capture_callback,
+            blocksize=max(1, int(self.block_duration * self.sample_rate))
+        )
+        self._output = open_output(
+            samplerate=self.output_sample_rate,
+            channels=1,
+            device=self.output_device,
+            dtype='int16',
+            callback=self._playback_callback,
+            blocksize=max(1, int(PLAYBACK_BLOCK_DURATION * self.output_sample_rate))
+        )
+        self._input.start()
+        self._output.start()
+
+    def _close_streams(self):
+        for name in ("_input", "_output"):
+            stream = getattr(self, name)
+            setattr(self, name, None)
+            if stream is not None:
+                stream.close()
+
+    async def _upload_loop(self, live):
+        """Send captured audio to Gemini in latency-adaptive batches."""
+        capture_rate = self.upload_resampler.in_rate
+        batcher = self.upload_batcher
+
+        while self._active:
+            try:
+                # Wait for the capture callback to buffer more frames
+                audio_chunk = await self.capture_buffer.read_async()
+                if audio_chunk is None:
+                    break
+                captured_at = monotonic() - len(audio_chunk) / capture_rate
+
+                start = time.perf_counter()
+                # Downmix and convert from the device rate to the 16 kHz the Live API expects
+                if audio_chunk.shape[1] > 1:
+                    audio_chunk = audio_chunk.mean(axis=1, keepdims=True).astype(np.int16)
+                pcm = self.upload_resampler.process(audio_chunk)
+
+                # Hold back silence; speech onsets are sent together with their pre-roll
+                if self.voice_gate is not None:
+                    pcm = self.voice_gate.process(pcm)
+                speech_ended = self.voice_gate is not None and self.voice_gate.ended
+                self._observe("live.upload_dsp", time.perf_counter() - start)
+                batcher.add(pcm.tobytes(), captured_at)
+
+                # Send once the batch reaches the size picked from recent send times,
+                # or straight away when an utterance has just ended
+                if batcher.ready(monotonic()) or (speech_ended and len(batcher)):
+                    batch, oldest = batcher.take()
+                    media_chunks = [{
+                        "data": base64.b64encode(batch).decode('utf-8'),
+                        "mime_type": f"audio/pcm;rate={GEMINI_INPUT_RATE}"
+                    }]
+
+                    try:
+                        sent_at = monotonic()
+                        await live.send(media_chunks)
+                        done = monotonic()
+                        batcher.record_send(len(batch), done - sent_at, oldest, done,
+                                            backlog=self.capture_buffer.available / capture_rate)
+                        self._observe("live.upload_send", done - sent_at)
+                        self._observe("live.mic_to_send", done - oldest)
+                        self.last_upload_at = done
+                        self._log(f"Sent {len(batch)} bytes of audio to Gemini")
+                    except Exception as e:
+                        self._log(f"Error sending audio: {e}")
+
+                # The silence after an utterance is not uploaded, so the server's own VAD
+                # would never hear it end; tell it the audio stream has paused instead
+                if speech_ended:
+                    try:
+                        await live.send_realtime_input(audio_stream_end=True)
+                    except Exception as e:
+                        self._log(f"Error sending end of audio stream: {e}")
+            except Exception as e:
+                self._log(f"Error in audio processing: {e}")
+                await asyncio.sleep(0.1)
+
+    async def _receive_loop(self, live):
+        """Play the model's replies until the duration is reached or the session is stopped."""
+        loop = asyncio.get_running_loop()
+        start_time = loop.time()
+        first_audio_at = None  # monotonic time the current reply's first audio arrived
+
+        while self._active and loop.time() - start_time < self.duration:
+            async for message in live.receive():
+                content = getattr(message, 'server_content', None)
+                if content:
+                    # The user barged in; drop the rest of the model's reply
+                    if getattr(content, 'interrupted', False):
+                        self.playback_buffer.clear()
+                        self.playback_resampler.reset()
+                        first_audio_at = None
+
+                    if getattr(content, 'model_turn', None):
+                        for part in content.model_turn.parts:
+                            if getattr(part, 'text', None):
+                                self._log(f"Gemini says: {part.text}")
+
+                            # Only enqueue audio, so receiving continues at network speed
+                            inline_data = getattr(part, 'inline_data', None)
+                            if inline_data and inline_data.data:
+                                if first_audio_at is None:
+                                    first_audio_at = monotonic()
+                                    if self.last_upload_at is not None:
+                                        self._observe("live.response_latency",
+                                                      first_audio_at - self.last_upload_at)
+                                self._enqueue_audio(inline_data.data)
+
+                    if getattr(content, 'turn_complete', False):
+                        self._log("Turn complete")
+                        self.playback_buffer.flush()
+                        primed_at = self.playback_buffer.primed_at
+                        if first_audio_at is not None and primed_at is not None and primed_at >= first_audio_at:
+                            self._observe("live.playback_start", primed_at - first_audio_at)
+                        first_audio_at = None
+
+                elif getattr(message, 'setup_complete', None):
+                    self._log("Setup complete")
+
+                if loop.time() - start_time >= self.duration:
+                    self._log("Conversation timeout reached")
+                    break
+
+    async def run(self, connect) -> str:
+        """Run the conversation until `duration` elapses or stop(); returns a summary or an error."""
+        try:
+            self.capture_buffer.bind(asyncio.get_running_loop())
+            self._active = True
+            await run_device(self._open_streams)
+
+            async with connect() as live:
+                self._live = live
+                if self.state == STARTING:
+                    self.state = RUNNING
+                self._log("Connected to Gemini LiveConnect API")
+                uploader = asyncio.create_task(self._upload_loop(live))
+                try:
+                    # Send greeting to start the conversation
+                    await live.send(input="Hello Gemini", end_of_turn=True)
+                    await self._receive_loop(live)
+                except Exception as e:
+                    if self._active:
+                        self._log(f"Error in response processing: {e}")
+                finally:
+                    uploader.cancel()
+                try:
+                    await live.close()
+                except Exception:
+                    pass
+
+            self.result = self.summary()
+            self.state = FINISHED
+            return self.result
+        except Exception as e:
+            self.state = FAILED
+            self.error = str(e)
+            return f"Error in Gemini real-time conversation: {str(e)}"
+        finally:
+            if self.state not in ENDED:
+                self.state = FINISHED  # cancelled
+            self._active = False
+            self.capture_buffer.close()
+            self._close_streams()
+            self._live = None
+            self.finished = time.time()
+
+    async def stop(self) -> bool:
+        """End capture and close the streams and the Live connection; False if already ended."""
+        if self.state in ENDED:
+            return False
+        self.state = STOPPING
+        # Clear the flag and wake the upload task
+        self._active = False
+        self.capture_buffer.close()
+        self._close_streams()
+        if self._live is not None:
+            try:
+                await self._live.close()
+            except Exception:
+                pass
+        return True
+
+    def summary(self) -> str:
+        stats = self.capture_buffer.stats()
+        xruns = self.capture_stats.stats()
+        playback = self.playback_buffer.stats()
+        return (f"Real-time conversation with Gemini completed (session {self.id}). "
+                f"Captured {stats['written_frames']} frames, dropped {stats['dropped_frames']} "
+                f"on capture buffer overflow, {xruns['input_overflows']} input overflows. "
+                f"Played {playback['played_frames']} frames with {playback['underruns']} playback underruns."
+                + (f" Voice gate held back {self.voice_gate.stats()['bytes_saved']} bytes of silence."
+                   if self.voice_gate is not None else "")
+                + f" Upload batches: {self.upload_batcher.target_bytes} bytes, "
+                f"mean mic-to-send latency {self.upload_batcher.mean_latency * 1000:.0f} ms.")
+
+    def status(self) -> dict:
+        end = self.finished or time.time()
+        return {
+            "id": self.id,
+            "state": self.state,
+            "elapsed": round(end - self.created, 1),
+            "device": self.device,
+            "output_device": self.output_device,
+            "sample_rate": self.sample_rate,
+            "output_sample_rate": self.output_sample_rate,
+            "captured_frames": self.capture_buffer.stats()["written_frames"],
+            "played_frames": self.playback_buffer.stats()["played_frames"],
+            "error": self.error,
+        }
+
+    def pipeline_stats(self) -> dict:
+        """Callback timing, xrun counts and buffer health, by pipeline stage."""
+        sections = {
+            "Capture callback": self.capture_stats.stats(),
+            "Capture buffer": self.capture_buffer.stats(),
+            "Playback callback": self.playback_stats.stats(),
+            "Playback jitter buffer": self.playback_buffer.stats(),
+        }
+        if self.voice_gate is not None:
+            sections["Voice activity gate"] = self.voice_gate.stats()
+        sections["Upload batching"] = self.upload_batcher.stats()
+        return sections
+
+
+class LiveSessionManager:
+    """Live sessions by ID, at most `max_sessions` running at once.
+
+    Only used from the event loop. Finished sessions are kept (up to
+    `MAX_FINISHED_SESSIONS`) so their status and statistics can still be read.
+    """
+
+    def __init__(self, max_sessions: int = DEFAULT_MAX_LIVE_SESSIONS):
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+
+    def active(self) -> list:
+        return [s for s in self._sessions.values() if s.state not in ENDED]
+
+    def start(self, session_id: str, connect, **options) -> LiveSession:
+        """Create a session and run it as a task; raises ValueError if the ID is in use or the server is full."""
+        existing = self._sessions.get(session_id)
+        if existing is not None and existing.state not in ENDED:
+            raise ValueError(f"Live session {session_id} is already running")
+        if len(self.active()) >= self.max_sessions:
+            raise ValueError(f"{self.max_sessions} Live sessions are already running")
+        session = LiveSession(session_id, **options)
+        self._sessions.pop(session_id, None)
+        self._sessions[session_id] = session
+        session.task = asyncio.get_running_loop().create_task(session.run(connect))
+        self._prune()
+        return session
+
+    def _prune(self):
+        ended = [session_id for session_id, s in self._sessions.items() if s.state in ENDED]
+        for session_id in ended[:max(0, len(ended) - MAX_FINISHED_SESSIONS)]:
+            del self._sessions[session_id]
+
+    def get(self, session_id: str) -> LiveSession:
+        return self._sessions.get(session_id)
+
+    def list(self) -> list:
+        return list(self._sessions.values())
+
+    async def stop(self, session_id: str, timeout: float = 5.0) -> LiveSession:
+        """Stop a session and wait briefly for it to wind down; None if the ID is unknown."""
+        session = self._sessions.get(session_id)
+        if session is None:
+            return None
+        if await session.stop() and session.task is not None:
+            done, _ = await asyncio.wait({session.task}, timeout=timeout)
+            if not done:
+                session.task.cancel()
+        return session
+
+    async def stop_all(self, timeout: float = 5.0) -> list:
+        """Stop every running session; returns the sessions that were stopped."""
+        sessions = self.active()
+        await asyncio.gather(*(self.stop(s.id, timeout) for s in sessions))
+        return sessions
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""Latency histograms for the stages of each audio tool.
+
+Stages are timed with the monotonic `time.perf_counter` clock, with the
+`span()` context manager, the `timed()` decorator for whole coroutines, or by
+passing a measured duration to `observe()`.
+Each stage keeps a count, a sum, cumulative Prometheus-style buckets and a
+window of recent samples for p50/p95/p99.
+"""
+import functools
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from audio_lazy import lazy_import
+
+np = lazy_import("numpy")
+
+# Bucket upper bounds in seconds, from sub-millisecond callbacks to long captures
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+           1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+# Recent samples kept per stage for percentiles
+WINDOW = 1024
+QUANTILES = (50, 95, 99)
+
+
+class Histogram:
+    """Latency distribution for one stage."""
+
+    def __init__(self, buckets=BUCKETS, window: int = WINDOW):
+        self.buckets = buckets
+        self.bucket_counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self._recent = deque(maxlen=window)
+
+    def observe(self, seconds: float):
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+        self._recent.append(seconds)
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                self.bucket_counts[i] += 1
+                break
+
+    def quantiles(self) -> dict:
+        """p50/p95/p99 in seconds over the recent window."""
+        if not self._recent:
+            return {f"p{q}": None for q in QUANTILES}
+        values = np.percentile(np.fromiter(self._recent, dtype=float), QUANTILES)
+        return {f"p{q}": float(v) for q, v in zip(QUANTILES, values)}
+
+    def stats(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else None,
+            "max": self.max,
+            **self.quantiles(),
+        }
+
+
+class MetricsRegistry:
+    """Named stage histograms, safe to update from any thread."""
+
+    def __init__(self):
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, seconds: float):
+        """Record one duration (in seconds) for `stage`."""
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = Histogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def span(self, stage: str):
+        """Time the enclosed block as one observation of `stage`.
+
+        The duration is recorded even if the block raises or is cancelled.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def timed(self, stage: str):
+        """Decorator timing every call of a coroutine function as `stage`."""
+        def decorator(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                with self.span(stage):
+                    return await func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def snapshot(self) -> dict:
+        """Stats for every stage, keyed by stage name."""
+        with self._lock:
+            return {stage: h.stats() for stage, h in sorted(self._histograms.items())}
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+
+    def format_text(self) -> str:
+        """One line per stage with count and p50/p95/p99/max in milliseconds."""
+        snapshot = self.snapshot()
+        if not snapshot:
+            return "No metrics recorded yet."
+
+        def ms(value):
+            return f"{value * 1000:.1f}" if value is not None else "-"
+
+        lines = ["stage: count, p50 / p95 / p99 / max (ms)"]
+        for stage, s in snapshot.items():
+            lines.append(f"{stage}: {s['count']}, {ms(s['p50'])} / {ms(s['p95'])} / "
+                         f"{ms(s['p99'])} / {ms(s['max'])}")
+        return "\n".join(lines)
+
+    def prometheus(self, prefix: str = "audio_mcp_stage_seconds") -> str:
+        """Render all stages in the Prometheus text exposition format."""
+        with self._lock:
+            items = [(stage, h.buckets, list(h.bucket_counts), h.count, h.sum, h.quantiles())
+                     for stage, h in sorted(self._histograms.items())]
+
+        lines = [f"# HELP {prefix} Latency of audio tool stages in seconds.",
+                 f"# TYPE {prefix} histogram"]
+        for stage, buckets, counts, count, total, quantiles in items:
+            cumulative = 0
+            for bound, n in zip(buckets, counts):
+                cumulative += n
+                lines.append(f'{prefix}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'{prefix}_bucket{{stage="{stage}",le="+Inf"}} {count}')
+            lines.append(f'{prefix}_sum{{stage="{stage}"}} {total}')
+            lines.append(f'{prefix}_count{{stage="{stage}"}} {count}')
+
+        lines.append(f"# HELP {prefix}_recent Recent latency percentiles in seconds.")
+        lines.append(f"# TYPE {prefix}_recent gauge")
+        for stage, _, _, _, _, quantiles in items:
+            for name, value in quantiles.items():
+                if value is not None:
+                    quantile = int(name[1:]) / 100
+                    lines.append(f'{prefix}_recent{{stage="{stage}",quantile="{quantile}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+
+# Process-wide registry shared by the servers and the stream helpers
+metrics = MetricsRegistry()
@@ -1,23 +1,34 @@
 #!/usr/bin/env python3
+import argparse
 import asyncio
+import hashlib
 import io
 import json
 import os
-import sounddevice as sd
-import soundfile as sf
-import numpy as np
+import sys
+import uuid
 import wave
 from datetime import datetime
 from pathlib import Path
+from typing import List
+from mcp import types
 from mcp.server.fastmcp import FastMCP
 from dotenv import load_dotenv
+from audio_catalog import RecordingCatalog
+from audio_clients import DEFAULT_MAX_CLIENT_CALLS, ClientLimiter
+from audio_devices import INPUT, OUTPUT, DeviceError, DeviceRegistry
+from audio_engine import AudioEngine
+from audio_encoder import CAPTURE_SUBTYPE, DONE, FAILED, FORMATS, MIME_TYPES, EncodingJobs, encode_bytes
+from audio_executors import CODEC, DEVICE, NETWORK, run_codec, run_device, run_network, shutdown_executors
+from audio_gemini import DEFAULT_CONVERSATION, GeminiClientManager, GeminiUnavailable, preload as preload_gemini
+from audio_jobs import FINISHED, JobManager, report_progress
+from audio_lazy import lazy_import
+from audio_metrics import metrics
+from audio_streams import HistoryRecorder, MemoryRecorder, MultiDeviceRecorder, StreamingPlayer, StreamingRecorder, pcm16
 
-# Import Google Generative AI for Gemini integration
-try:
-    import google.generativeai as genai
-    GENAI_AVAILABLE = True
-except ImportError:
-    GENAI_AVAILABLE = False
+# numpy, soundfile and sounddevice load on first use so the MCP handshake stays fast
+np = lazy_import("numpy")
+sf = lazy_import("soundfile")
 
 # Initialize FastMCP server
 mcp = FastMCP("audio-interface")
@@ -27,18 +38,60 @@ load_dotenv()
 DEFAULT_SAMPLE_RATE = 44100
 DEFAULT_CHANNELS = 1
 DEFAULT_DURATION = 5  # seconds
+DEFAULT_FORMAT = "ogg"
+# Audio sent to Gemini is encoded in memory with this (lossless) format
+GEMINI_AUDIO_FORMAT = "flac"
+DEFAULT_AUDIO_PROMPT = "Listen to this recording and respond to what is said."
+
+# Server-level device table, scanned on first use and on rescan_audio_devices
+device_registry = DeviceRegistry()
+# Long-lived input/output streams shared by every recording and playback
+audio_engine = AudioEngine()
+# Background encode jobs for finished recordings
+encoding_jobs = EncodingJobs()
+# Index of everything record_audio has written to audio/
+recording_catalog = RecordingCatalog()
+# Long-running tools called with background=True, with a concurrency cap per resource class
+job_manager = JobManager()
+# Gemini client, configured on first use and shared by all conversations
+gemini_client = GeminiClientManager()
+# Per-client call limits; only set in the shared HTTP/SSE daemon mode
+client_limiter = None
+# Always-on capture of recent microphone input, while start_history_capture is active
+history_recorder = None
+history_lock = asyncio.Lock()
+MAX_HISTORY_MINUTES = 60
+
+async def _ensure_devices():
+    """Scan the device registry on first use, on the device executor."""
+    if not device_registry.scanned:
+        await run_device(device_registry.ensure_scanned)
 
 async def get_audio_devices():
-    """Get a list of all available audio devices."""
-    devices = sd.query_devices()
-    input_devices = [d for d in devices if d['max_input_channels'] > 0]
-    output_devices = [d for d in devices if d['max_output_channels'] > 0]
+    """Get a list of all available audio devices from the cached registry."""
+    await _ensure_devices()
     
     return {
-        "input_devices": input_devices,
-        "output_devices": output_devices
+        "input_devices": device_registry.devices(INPUT),
+        "output_devices": device_registry.devices(OUTPUT)
     }
 
+async def resolve_device(device_index, device_id, kind, samplerate=None, channels=None):
+    """Map a tool's device arguments to a PortAudio index (None means system default)."""
+    device = device_id if device_id is not None else device_index
+    if device is None:
+        return None
+    await _ensure_devices()
+    return device_registry.resolve(device, kind, samplerate=samplerate, channels=channels)
+
+def _format_device(device, kind):
+    rates = device[f'{kind}_samplerates']
+    rate_info = f", Native rate: {int(device['default_samplerate'])} Hz" if device.get('default_samplerate') else ""
+    if rates:
+        rate_info += f", Rates: {', '.join(str(r) for r in rates)}"
+    return (f"{device['index']}: {device['name']} "
+            f"(ID: {device['id']}, Channels: {device[f'max_{kind}_channels']}{rate_info})\n")
+
 @mcp.tool()
 async def list_audio_devices() -> str:
     """List all available audio input and output devices on the system."""
@@ -47,68 +100,541 @@ async def list_audio_devices() -> str:
     result = "Audio devices available on your system:\n\n"
     
     result += "INPUT DEVICES (MICROPHONES):\n"
-    for i, device in enumerate(devices["input_devices"]):
-        result += f"{i}: {device['name']} (Channels: {device['max_input_channels']})\n"
+    for device in devices["input_devices"]:
+        result += _format_device(device, INPUT)
     
     result += "\nOUTPUT DEVICES (SPEAKERS):\n"
-    for i, device in enumerate(devices["output_devices"]):
-        result += f"{i}: {device['name']} (Channels: {device['max_output_channels']})\n"
+    for device in devices["output_devices"]:
+        result += _format_device(device, OUTPUT)
     
     return result
 
 @mcp.tool()
+async def rescan_audio_devices() -> str:
+    """Re-query the system for audio devices, e.g. after plugging in a microphone."""
+    try:
+        await run_device(device_registry.scan)
+        return (f"Found {len(device_registry.devices(INPUT))} input and "
+                f"{len(device_registry.devices(OUTPUT))} output devices.")
+    except Exception as e:
+        return f"Error scanning audio devices: {str(e)}"
+
+def _capture_stem(duration):
+    """Timestamped path, without extension, for a new recording in the 'audio' folder."""
+    # Create 'audio' subfolder if it doesn't exist
+    audio_dir = Path("audio")
+    audio_dir.mkdir(exist_ok=True)
+    
+    # Generate a sensible filename with timestamp and duration; takes can run concurrently,
+    # so add milliseconds and a random suffix to keep two takes from sharing a file
+    now = datetime.now()
+    timestamp = f"{now.strftime('%Y-%m-%d_%H-%M-%S')}-{now.microsecond // 1000:03d}"
+    return audio_dir / f"audio_{timestamp}_{duration}s_{uuid.uuid4().hex[:6]}"
+
+def _device_label(device):
+    entry = device_registry.get(device) if device is not None else None
+    return entry['id'] if entry else "default"
+
+def _save_capture(file_path, audio_bytes, data, sample_rate, device, **fields):
+    """Write an already encoded in-memory capture to disk and catalog it. Blocking."""
+    file_path = Path(file_path).resolve()
+    with metrics.span("disk_write"):
+        file_path.write_bytes(audio_bytes)
+    samples = data.astype(np.float32) / 32768.0
+    recording_catalog.add(
+        file_path, sample_rate, data.shape[1], len(data), device=device,
+        format=file_path.suffix.lstrip('.'), peak_db=_to_db(float(np.max(np.abs(samples)))),
+        rms_db=_to_db(float(np.sqrt(np.mean(samples ** 2)))),
+        sha256=hashlib.sha256(pcm16(data).tobytes()).hexdigest(), **fields)
+
+async def _saved_note(save, file_path):
+    """Wait for a `_save_capture` started alongside another call and describe its outcome."""
+    if save is None:
+        return ""
+    try:
+        await save
+    except Exception as e:
+        return f"\n\nError saving audio to {file_path}: {str(e)}"
+    return f"\n\nAudio saved to: {file_path}"
+
+@mcp.tool()
+@job_manager.background(DEVICE)
+@metrics.timed("record_audio.total")
 async def record_audio(duration: float = DEFAULT_DURATION, 
-                       sample_rate: int = DEFAULT_SAMPLE_RATE,
+                       sample_rate: int = None,
                        channels: int = DEFAULT_CHANNELS,
-                       device_index: int = None) -> str:
+                       device_index: int = None,
+                       device_id: str = None,
+                       format: str = DEFAULT_FORMAT) -> str:
     """Record audio from the microphone. 
     
+    The capture is saved as WAV straight away; conversion to `format` runs in
+    the background (see get_encoding_status and wait_for_encoding).
+    
     Args:
         duration: Recording duration in seconds (default: 5)
-        sample_rate: Sample rate in Hz (default: 44100)
+        sample_rate: Sample rate in Hz (default: the device's native rate, else 44100)
         channels: Number of audio channels (default: 1)
         device_index: Specific input device index to use (default: system default)
+        device_id: Stable device ID from list_audio_devices (overrides device_index)
+        format: Final file format: ogg, flac or wav (default: ogg)
+        background: Return a job ID at once and record in the background (default: False)
     
     Returns:
         A message confirming the recording was captured
     """
+    format = format.lower()
+    if format not in FORMATS:
+        return f"Error: Unsupported format '{format}'. Choose one of: {', '.join(FORMATS)}"
     try:
         # Check if the specified device exists and is an input device
-        if device_index is not None:
-            devices = await get_audio_devices()
-            input_devices = devices["input_devices"]
-            if device_index < 0 or device_index >= len(input_devices):
-                return f"Error: Invalid device index {device_index}. Use list_audio_devices tool to see available devices."
+        try:
+            device = await resolve_device(device_index, device_id, INPUT,
+                                          samplerate=sample_rate, channels=channels)
+        except DeviceError as e:
+            return f"Error: {e}"
         
-        # Record audio
-        recording = sd.rec(
-            int(duration * sample_rate),
-            samplerate=sample_rate,
-            channels=channels,
-            device=device_index
-        )
+        # Prefer the device's native rate to avoid resampling in the host API
+        if sample_rate is None:
+            await _ensure_devices()
+            sample_rate = device_registry.native_rate(device, INPUT) or DEFAULT_SAMPLE_RATE
         
-        # Wait for the recording to complete
-        sd.wait()
+        stem = _capture_stem(duration)
+        file_path = Path(f"{stem}.wav")
         
-        # Create 'audio' subfolder if it doesn't exist
-        audio_dir = Path("audio")
-        audio_dir.mkdir(exist_ok=True)
+        # Record straight to disk as 16-bit WAV on the device executor so the event loop stays free
+        recorder = StreamingRecorder(file_path, sample_rate, channels, device=device,
+                                     subtype=CAPTURE_SUBTYPE, engine=audio_engine)
+        total_frames = max(1, int(duration * sample_rate))
+        report_progress(message="recording", source=lambda: recorder.frames_written / total_frames)
+        try:
+            with metrics.span("record_audio.capture"):
+                await run_device(recorder.record, duration)
+        except asyncio.CancelledError:
+            recorder.stop()
+            raise
         
-        # Generate a sensible filename with timestamp and duration
-        timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-        filename = f"audio_{timestamp}_{duration}s.ogg"
-        file_path = audio_dir / filename
+        # Register the take while its statistics are at hand
+        report_progress(1.0, "saving")
+        with metrics.span("record_audio.catalog"):
+            await run_codec(
+                recording_catalog.add, file_path.resolve(), sample_rate, channels, recorder.frames_written,
+                device=_device_label(device), format="wav",
+                peak_db=_to_db(recorder.peak), rms_db=_to_db(recorder.rms), sha256=recorder.sha256)
         
-        # Save the audio to the file
-        sf.write(file_path, recording, sample_rate)
+        if format == "wav":
+            return f"Audio recorded and saved to: {file_path.resolve()}"
         
-        return f"Audio recorded and saved to: {file_path.resolve()}"
+        # Hand the codec work to the process pool instead of making the caller wait for it
+        target = Path(f"{stem}{FORMATS[format][0]}").resolve()
+        job_id = encoding_jobs.submit(
+            file_path.resolve(), target, format,
+            on_done=lambda source, final: recording_catalog.move(source, final, format=format))
+        return (f"Audio recorded and saved to: {file_path.resolve()}\n"
+                f"Encoding to {format.upper()} in the background (job ID: {job_id}). "
+                f"Use get_encoding_status or wait_for_encoding to get the final file: {target}")
             
     except Exception as e:
         return f"Error recording audio: {str(e)}"
 
+@mcp.tool()
+@job_manager.background(DEVICE)
+@metrics.timed("record_multi_device.total")
+async def record_multi_device(duration: float = DEFAULT_DURATION,
+                              device_indexes: List[int] = None,
+                              device_ids: List[str] = None,
+                              sample_rate: int = None,
+                              channels: int = DEFAULT_CHANNELS,
+                              interleaved: bool = False,
+                              format: str = DEFAULT_FORMAT) -> str:
+    """Record from several microphones at once, aligned sample by sample.
+    
+    All devices start at the same instant and clock drift between them is
+    corrected, so the tracks stay in sync however long the recording. The
+    WAV files are saved straight away and encoded to `format` in the
+    background, like record_audio.
+    
+    Args:
+        duration: Recording duration in seconds (default: 5)
+        device_indexes: Input device indexes to record from
+        device_ids: Stable device IDs from list_audio_devices (used instead of device_indexes)
+        sample_rate: Sample rate in Hz for every device (default: the first device's native rate, else 44100)
+        channels: Number of channels taken from each device (default: 1)
+        interleaved: Write one multichannel file with every device's channels in order,
+            instead of one file per device (default: False)
+        format: Final file format: ogg, flac or wav (default: ogg)
+        background: Return a job ID at once and record in the background (default: False)
+    
+    Returns:
+        The saved files, and how far each device was offset and drifting
+    """
+    format = format.lower()
+    if format not in FORMATS:
+        return f"Error: Unsupported format '{format}'. Choose one of: {', '.join(FORMATS)}"
+    selectors = [(None, device_id) for device_id in device_ids] if device_ids else \
+        [(index, None) for index in device_indexes or []]
+    if len(selectors) < 2:
+        return "Error: Give at least two devices in device_ids or device_indexes"
+    try:
+        try:
+            devices = [await resolve_device(index, device_id, INPUT, samplerate=sample_rate, channels=channels)
+                       for index, device_id in selectors]
+        except DeviceError as e:
+            return f"Error: {e}"
+        if len(set(devices)) < len(devices):
+            return "Error: Each device can only be recorded once"
+        
+        if sample_rate is None:
+            await _ensure_devices()
+            sample_rate = device_registry.native_rate(devices[0], INPUT) or DEFAULT_SAMPLE_RATE
+        
+        stem = _capture_stem(duration)
+        if interleaved:
+            file_paths = [Path(f"{stem}.wav")]
+        else:
+            file_paths = [Path(f"{stem}_{n}.wav") for n in range(1, len(devices) + 1)]
+        
+        recorder = MultiDeviceRecorder(file_paths, sample_rate, devices, channels,
+                                       subtype=CAPTURE_SUBTYPE, engine=audio_engine)
+        total_frames = max(1, int(duration * sample_rate))
+        report_progress(message="recording", source=lambda: recorder.frames_written / total_frames)
+        try:
+            with metrics.span("record_multi_device.capture"):
+                await run_device(recorder.record, duration)
+        except asyncio.CancelledError:
+            recorder.stop()
+            raise
+        
+        report_progress(1.0, "saving")
+        labels = [_device_label(device) for device in devices]
+        for n, (file_path, file_channels) in enumerate(zip(file_paths, recorder.output_channels)):
+            await run_codec(
+                recording_catalog.add, file_path.resolve(), sample_rate, file_channels, recorder.frames_written,
+                device=",".join(labels) if interleaved else labels[n], format="wav",
+                peak_db=_to_db(recorder.peak[n]), rms_db=_to_db(recorder.rms(n)), sha256=recorder.sha256(n))
+        
+        stats = recorder.stats()
+        lines = [f"Recorded {len(devices)} devices for {recorder.frames_written / sample_rate:.2f} seconds "
+                 f"(aligned on {stats['clock']} timestamps):"]
+        for label, info in zip(labels, stats['devices']):
+            line = f"- {label}: started {info['offset_frames']} frames early, drift {info['drift_ppm']:+.1f} ppm"
+            if info['padded_frames']:
+                line += f", {info['padded_frames']} frames padded with silence"
+            lines.append(line)
+        
+        for file_path in file_paths:
+            if format == "wav":
+                lines.append(f"Saved to: {file_path.resolve()}")
+                continue
+            target = Path(f"{file_path.with_suffix('')}{FORMATS[format][0]}").resolve()
+            job_id = encoding_jobs.submit(
+                file_path.resolve(), target, format,
+                on_done=lambda source, final: recording_catalog.move(source, final, format=format))
+            lines.append(f"Saved to: {file_path.resolve()} (encoding to {format.upper()}, job ID: {job_id})")
+        return "\n".join(lines)
+    
+    except Exception as e:
+        return f"Error recording audio: {str(e)}"
+
+
+
+SILENCE_DB = -120.0  # level recorded for all-zero captures
+
+def _to_db(level):
+    return round(max(SILENCE_DB, 20 * np.log10(max(level, 1e-9))), 1)
+
+def _format_recording(row):
+    created = datetime.fromtimestamp(row['created']).isoformat(sep=' ', timespec='seconds')
+    loudness = f", Peak: {row['peak_db']} dBFS, RMS: {row['rms_db']} dBFS"
+    size = f", {row['size']} bytes" if row['size'] is not None else ""
+    return (f"{created} {row['path']} ({row['duration']:.1f}s, {row['samplerate']} Hz, "
+            f"{row['channels']} ch, Device: {row['device']}{loudness}{size})")
+
+def _format_recordings(rows, total):
+    if not rows:
+        return "No recordings found."
+    return f"{len(rows)} of {total} recordings:\n" + "\n".join(_format_recording(row) for row in rows)
+
+def _history_status():
+    recorder = history_recorder
+    return (f"Keeping the last {recorder.seconds / 60:g} minutes from {_device_label(recorder.device)} "
+            f"at {recorder.samplerate} Hz, {recorder.channels} channel(s); "
+            f"{recorder.retained_seconds():.1f} s buffered ({recorder.ring.nbytes / 1e6:.1f} MB)")
+
+@mcp.tool()
+async def start_history_capture(minutes: float = 5,
+                                sample_rate: int = None,
+                                channels: int = DEFAULT_CHANNELS,
+                                device_index: int = None,
+                                device_id: str = None) -> str:
+    """
+    Keep listening in the background so recent audio can be saved after the fact.
+    
+    The last `minutes` of microphone input are kept in a fixed-size memory
+    buffer; use save_recent_audio to save any part of it.
+    
+    Args:
+        minutes: How much recent audio to keep (default: 5, at most 60)
+        sample_rate: Sample rate in Hz (default: the device's native rate, else 44100)
+        channels: Number of audio channels (default: 1)
+        device_index: Specific input device index to use (default: system default)
+        device_id: Stable device ID from list_audio_devices (overrides device_index)
+    
+    Returns:
+        A message describing the running capture
+    """
+    global history_recorder
+    if not 0 < minutes <= MAX_HISTORY_MINUTES:
+        return f"Error: minutes must be between 0 and {MAX_HISTORY_MINUTES}"
+    async with history_lock:
+        if history_recorder is not None:
+            return f"Error: History capture is already running. {_history_status()}"
+        try:
+            device = await resolve_device(device_index, device_id, INPUT,
+                                          samplerate=sample_rate, channels=channels)
+        except DeviceError as e:
+            return f"Error: {e}"
+        try:
+            if sample_rate is None:
+                await _ensure_devices()
+                sample_rate = device_registry.native_rate(device, INPUT) or DEFAULT_SAMPLE_RATE
+            recorder = HistoryRecorder(sample_rate, channels, minutes * 60, device=device, engine=audio_engine)
+            await run_device(recorder.start)
+        except Exception as e:
+            return f"Error starting history capture: {str(e)}"
+        history_recorder = recorder
+        return f"History capture started. {_history_status()}"
+
+@mcp.tool()
+async def stop_history_capture() -> str:
+    """Stop the background capture started by start_history_capture and free its buffer."""
+    global history_recorder
+    async with history_lock:
+        if history_recorder is None:
+            return "Error: History capture is not running"
+        recorder, history_recorder = history_recorder, None
+        await run_device(recorder.stop)
+    return "History capture stopped."
+
+@mcp.tool()
+async def get_history_capture_status() -> str:
+    """Report whether background history capture is running and how much audio it holds."""
+    if history_recorder is None:
+        return "History capture is not running. Start it with start_history_capture."
+    return _history_status()
+
+@mcp.tool()
+@job_manager.background(CODEC)
+async def save_recent_audio(seconds: float = 30, seconds_ago: float = 0, format: str = DEFAULT_FORMAT) -> str:
+    """
+    Save audio that was already heard by the background history capture.
+    
+    Args:
+        seconds: Length of the window to save (default: 30)
+        seconds_ago: How long ago the window ends; 0 means now (default: 0)
+        format: File format: ogg, flac or wav (default: ogg)
+        background: Return a job ID at once and save in the background (default: False)
+    
+    Returns:
+        The path of the saved file
+    """
+    format = format.lower()
+    if format not in FORMATS:
+        return f"Error: Unsupported format '{format}'. Choose one of: {', '.join(FORMATS)}"
+    if seconds <= 0 or seconds_ago < 0:
+        return "Error: seconds must be positive and seconds_ago must not be negative"
+    recorder = history_recorder
+    if recorder is None:
+        return "Error: History capture is not running. Start it with start_history_capture first."
+    try:
+        started, data = await run_codec(recorder.snapshot, seconds, seconds_ago)
+        if not len(data):
+            return "Error: No buffered audio covers that window."
+        audio_bytes = await run_codec(encode_bytes, data, recorder.samplerate, format)
+        duration = round(len(data) / recorder.samplerate, 1)
+        file_path = Path(f"{_capture_stem(duration)}{FORMATS[format][0]}").resolve()
+        await run_codec(_save_capture, file_path, audio_bytes, data, recorder.samplerate,
+                        _device_label(recorder.device), created=started)
+    except Exception as e:
+        return f"Error saving recent audio: {str(e)}"
+    
+    note = ""
+    if duration < seconds:
+        note = f" (only {duration} of the requested {seconds:g} seconds were buffered)"
+    return (f"Saved {duration} seconds of audio starting "
+            f"{datetime.fromtimestamp(started).strftime('%H:%M:%S')} to: {file_path}{note}")
+
+@mcp.tool()
+async def list_recordings(limit: int = 20, offset: int = 0) -> str:
+    """
+    List recordings made with record_audio, newest first.
+    
+    Args:
+        limit: Maximum number of recordings to return (default: 20)
+        offset: Number of recordings to skip, for paging (default: 0)
+    
+    Returns:
+        One line per recording with its path, duration, format and loudness
+    """
+    try:
+        rows = await run_codec(recording_catalog.find, limit=limit, offset=offset)
+        return _format_recordings(rows, await run_codec(recording_catalog.count))
+    except Exception as e:
+        return f"Error listing recordings: {str(e)}"
+
+@mcp.tool()
+async def find_recordings(since: str = None,
+                          until: str = None,
+                          min_duration: float = None,
+                          max_duration: float = None,
+                          min_rms_db: float = None,
+                          max_rms_db: float = None,
+                          limit: int = 20) -> str:
+    """
+    Search recordings by time, duration and loudness.
+    
+    Args:
+        since: Only recordings made at or after this ISO 8601 time, e.g. 2025-01-31T09:00
+        until: Only recordings made at or before this ISO 8601 time
+        min_duration: Minimum duration in seconds
+        max_duration: Maximum duration in seconds
+        min_rms_db: Minimum RMS level in dBFS, e.g. -40 to skip near-silent takes
+        max_rms_db: Maximum RMS level in dBFS
+        limit: Maximum number of recordings to return (default: 20)
+    
+    Returns:
+        One line per matching recording, newest first
+    """
+    try:
+        rows = await run_codec(recording_catalog.find, since=since, until=until,
+                               min_duration=min_duration, max_duration=max_duration,
+                               min_rms_db=min_rms_db, max_rms_db=max_rms_db, limit=limit)
+        return _format_recordings(rows, await run_codec(recording_catalog.count))
+    except ValueError as e:
+        return f"Error: {e}"
+    except Exception as e:
+        return f"Error searching recordings: {str(e)}"
+
+def _format_job(job):
+    line = f"{job['id']}: {job['state']} {job['format'].upper()} -> {job['target']}"
+    if job['state'] == FAILED:
+        line += f" (error: {job['error']})"
+    return line
+
+@mcp.tool()
+async def get_encoding_status(job_id: str = None) -> str:
+    """
+    Check background encoding of recordings.
+    
+    Args:
+        job_id: Job ID returned by record_audio (default: list all jobs)
+    
+    Returns:
+        The state of the job(s) and the final file path
+    """
+    if job_id is None:
+        jobs = encoding_jobs.list()
+        if not jobs:
+            return "No encoding jobs."
+        return "\n".join(_format_job(job) for job in jobs)
+    
+    job = encoding_jobs.status(job_id)
+    if job is None:
+        return f"Error: Unknown encoding job {job_id}"
+    return _format_job(job)
+
+@mcp.tool()
+async def wait_for_encoding(job_id: str, timeout: float = 60) -> str:
+    """
+    Wait until a recording has been encoded and return its final path.
+    
+    Args:
+        job_id: Job ID returned by record_audio
+        timeout: Maximum time to wait in seconds (default: 60)
+    
+    Returns:
+        The final file path, or the job state if it has not finished
+    """
+    job = await encoding_jobs.wait(job_id, timeout)
+    if job is None:
+        return f"Error: Unknown encoding job {job_id}"
+    if job['state'] == DONE:
+        return f"Audio encoded and saved to: {job['target']}"
+    if job['state'] == FAILED:
+        return f"Error encoding audio: {job['error']}"
+    return f"Encoding still {job['state']} after {timeout} seconds: {job['target']}"
+
+def _client_name():
+    """Name of the calling client in daemon mode; None for a single stdio client."""
+    return client_limiter.current_name(mcp._mcp_server) if client_limiter else None
 
+def _format_background_job(job):
+    line = f"{job['id']}: {job['name']} {job['state']} ({job['resource']}, {job['progress']:.0%})"
+    if job['message'] and job['state'] not in FINISHED:
+        line += f" - {job['message']}"
+    if 'elapsed' in job:
+        line += f", {job['elapsed']}s"
+    if job['state'] in (DONE, FAILED):
+        line += f"\n{job['result'] if job['result'] is not None else job['error']}"
+    return line
+
+@mcp.tool()
+async def job_status(job_id: str = None) -> str:
+    """
+    Check tools started with background=True.
+    
+    Args:
+        job_id: Job ID returned by the tool (default: list all jobs)
+    
+    Returns:
+        The state and progress of the job(s), and the result once finished
+    """
+    client = _client_name()
+    if job_id is None:
+        jobs = job_manager.list(client)
+        if not jobs:
+            return "No background jobs."
+        return "\n".join(_format_background_job(job) for job in jobs)
+    
+    job = job_manager.status(job_id, client)
+    if job is None:
+        return f"Error: Unknown background job {job_id}"
+    return _format_background_job(job)
+
+@mcp.tool()
+async def job_wait(job_id: str, timeout: float = 60) -> str:
+    """
+    Wait until a background job finishes and return its result.
+    
+    Args:
+        job_id: Job ID returned by the tool
+        timeout: Maximum time to wait in seconds (default: 60)
+    
+    Returns:
+        The job's result, or its state and progress if it has not finished
+    """
+    job = await job_manager.wait(job_id, timeout, client=_client_name())
+    if job is None:
+        return f"Error: Unknown background job {job_id}"
+    if job['state'] in FINISHED:
+        return _format_background_job(job)
+    return f"Job still {job['state']} after {timeout} seconds: {_format_background_job(job)}"
+
+@mcp.tool()
+async def job_cancel(job_id: str) -> str:
+    """
+    Cancel a background job; a recording or playback in progress is stopped.
+    
+    Args:
+        job_id: Job ID returned by the tool
+    
+    Returns:
+        The job's final state
+    """
+    job = await job_manager.cancel(job_id, client=_client_name())
+    if job is None:
+        return f"Error: Unknown background job {job_id}"
+    return _format_background_job(job)
 
 @mcp.tool()
 async def play_audio(text: str, voice: str = "default") -> str:
@@ -136,13 +662,22 @@ async def play_audio(text: str, voice: str = "default") -> str:
     except Exception as e:
         return f"Error playing audio: {str(e)}"
 @mcp.tool()
-async def play_audio_file(file_path: str, device_index: int = None) -> str:
+@job_manager.background(DEVICE)
+@metrics.timed("play_audio_file.total")
+async def play_audio_file(file_path: str, device_index: int = None, device_id: str = None,
+                          gain: float = 1.0, ducking: float = None) -> str:
     """
     Play an audio file through the speakers.
     
+    Files played at the same time on one device are mixed together.
+    
     Args:
         file_path: Path to the audio file
         device_index: Specific output device index to use (default: system default)
+        device_id: Stable device ID from list_audio_devices (overrides device_index)
+        gain: Volume of this file, 1.0 for unchanged (default: 1.0)
+        ducking: Lower other sounds on the device to this gain while the file plays, e.g. 0.3 (default: none)
+        background: Return a job ID at once and play in the background (default: False)
     
     Returns:
         A message indicating if the audio was played successfully
@@ -151,130 +686,248 @@ async def play_audio_file(file_path: str, device_index: int = None) -> str:
         # Check if the file exists
         if not os.path.exists(file_path):
             return f"Error: File not found at {file_path}"
+        if gain < 0 or (ducking is not None and not 0 <= ducking <= 1):
+            return "Error: gain must be at least 0 and ducking between 0 and 1"
         
         # Check if the specified device exists and is an output device
-        if device_index is not None:
-            devices = await get_audio_devices()
-            output_devices = devices["output_devices"]
-            if device_index < 0 or device_index >= len(output_devices):
-                return f"Error: Invalid device index {device_index}. Use list_audio_devices tool to see available devices."
-        
-        # Read the audio file
-        data, fs = sf.read(file_path)
+        try:
+            device = await resolve_device(device_index, device_id, OUTPUT)
+        except DeviceError as e:
+            return f"Error: {e}"
         
-        # Play the audio
-        sd.play(data, fs, device=device_index)
-        sd.wait()  # Wait until the audio is done playing
+        # Stream the file block by block instead of decoding it all up front
+        player = StreamingPlayer(file_path, device=device, engine=audio_engine, gain=gain, ducking=ducking)
+        report_progress(message="playing", source=lambda: player.frames_played / max(1, player.frames_total or 1))
+        try:
+            await run_device(player.play)
+        except asyncio.CancelledError:
+            player.stop()
+            raise
         
         return f"Successfully played audio file: {file_path}"
     except Exception as e:
         return f"Error playing audio file: {str(e)}"
-# Function to initialize Google Generative AI client
-def initialize_genai(api_key):
-    """Initialize the Google GenAI client with the provided API key."""
-    if not GENAI_AVAILABLE:
-        return None
-    
-    try:
-        genai.configure(api_key=api_key)
-        # Return the module as the client
-        return genai
-    except Exception as e:
-        print(f"Error initializing Gemini: {e}")
-        return None
-
 @mcp.tool()
+@job_manager.background(NETWORK)
+@metrics.timed("gemini_conversation.total")
 async def gemini_conversation(duration: float = DEFAULT_DURATION,
-                             sample_rate: int = DEFAULT_SAMPLE_RATE,
+                             sample_rate: int = None,
                              channels: int = DEFAULT_CHANNELS,
-                             device_index: int = None) -> str:
+                             device_index: int = None,
+                             device_id: str = None,
+                             conversation_id: str = DEFAULT_CONVERSATION,
+                             prompt: str = DEFAULT_AUDIO_PROMPT,
+                             save_recording: bool = False) -> str:
     """
-    Start a real-time conversation with Gemini using your microphone and speakers.
+    Record from your microphone and send the audio to Gemini.
     
     Args:
         duration: Maximum recording duration in seconds (default: 5)
-        sample_rate: Sample rate in Hz (default: 44100)
+        sample_rate: Sample rate in Hz (default: the device's native rate, else 44100)
         channels: Number of audio channels (default: 1)
         device_index: Specific input device index to use (default: system default)
+        device_id: Stable device ID from list_audio_devices (overrides device_index)
+        conversation_id: Conversation to continue; turns with the same ID share history (default: "default")
+        prompt: Instruction sent along with the audio
+        save_recording: Also save the recording to the audio folder, while Gemini answers (default: False)
+        background: Return a job ID at once and run the whole turn in the background (default: False)
     
     Returns:
         A message indicating the conversation result
     """
-    if not GENAI_AVAILABLE:
-        return ("Google Generative AI package is not installed. "
-                "Please install it with: pip install google-generativeai")
+    try:
+        # Configures the client on the first call only
+        await run_network(lambda: gemini_client.model)
+    except GeminiUnavailable as e:
+        return f"Error: {e}"
+    except Exception as e:
+        return f"Error: Failed to initialize Gemini model: {str(e)}. Please check your API key and connection."
     
     try:
-        # Get API key from environment
-        actual_api_key = os.environ.get("GOOGLE_API_KEY")
-        if not actual_api_key:
-            return ("No API key provided. Please provide a valid Google AI API key "
-                    "or set the GOOGLE_API_KEY environment variable.")
-        print(actual_api_key)
-        # Initialize Gemini (Google Generative AI)
-        model = initialize_genai(actual_api_key)
-        if not model:
-            return "Failed to initialize Gemini model. Please check your API key and connection."
-        
         # Check if the specified device exists and is an input device
-        if device_index is not None:
-            devices = await get_audio_devices()
-            input_devices = devices["input_devices"]
-            if device_index < 0 or device_index >= len(input_devices):
-                return (
-                    f"Error: Invalid device index {device_index}. "
-                    "Use list_audio_devices tool to see available devices.")
+        try:
+            device = await resolve_device(device_index, device_id, INPUT,
+                                          samplerate=sample_rate, channels=channels)
+        except DeviceError as e:
+            return f"Error: {e}"
         
-        # Record audio
-        print(f"Recording for {duration} seconds...")
-        recorded_file_path = await record_audio(
-            duration, 
-            sample_rate=sample_rate, 
-            channels=channels, 
-            device_index=device_index
-        )
+        # Capture straight into memory; nothing touches the disk unless asked to
+        if sample_rate is None:
+            await _ensure_devices()
+            sample_rate = device_registry.native_rate(device, INPUT) or DEFAULT_SAMPLE_RATE
+        recorder = MemoryRecorder(sample_rate, channels, device=device, engine=audio_engine)
+        total_frames = max(1, int(duration * sample_rate))
+        report_progress(message="recording", source=lambda: 0.5 * recorder.frames_captured / total_frames)
+        try:
+            with metrics.span("gemini_conversation.capture"):
+                data = await run_device(recorder.record, duration)
+        except asyncio.CancelledError:
+            recorder.stop()
+            raise
+        if not len(data):
+            return "Error: No audio was captured."
         
-        if "Error" in recorded_file_path:
-            return f"Failed to record audio: {recorded_file_path}"
-            
-        # For demonstration, simulate a transcript.
-        transcript = "Hello Gemini, can you tell me about yourself?"
-        print(f"Simulated transcript: {transcript}")
+        audio_bytes = await run_codec(encode_bytes, data, sample_rate, GEMINI_AUDIO_FORMAT)
+        
+        save = file_path = None
+        if save_recording:
+            file_path = Path(f"{_capture_stem(duration)}{FORMATS[GEMINI_AUDIO_FORMAT][0]}").resolve()
+            # Write the file while Gemini works on the turn; the reply waits for both
+            save = asyncio.ensure_future(run_codec(_save_capture, file_path, audio_bytes, data,
+                                                   sample_rate, _device_label(device)))
         
-        # Attempt to create a chat session and get a response.
+        # Continue the pooled chat session for this conversation, with the audio inline
+        report_progress(0.5, "waiting for Gemini")
+        message = [prompt, {"mime_type": MIME_TYPES[GEMINI_AUDIO_FORMAT], "data": audio_bytes}]
         try:
-            chat_session = model.ChatSession(model="models/gemini-2.0-flash")
-            response = chat_session.send_message(transcript)
-            response_text = response.last
+            response_text = await run_network(gemini_client.send, _conversation_key(conversation_id), message)
         except Exception as api_error:
-            # Fallback to a simulated response if the API call fails.
-            print(f"API call failed: {api_error}")
-            response_text = ("Simulated Gemini response: I am Gemini, a conversational AI. "
-                             "Due to current integration issues, this is a placeholder response.")
-        
-        print(f"Gemini response: {response_text}")
+            return f"Error: Gemini request failed: {str(api_error)}{await _saved_note(save, file_path)}"
         
+        saved_to = await _saved_note(save, file_path)
         return f"""
-Real-time conversation with Gemini completed:
+Real-time conversation with Gemini completed (conversation: {conversation_id}):
 
-User (simulated transcript): "{transcript}"
+Sent {len(data) / sample_rate:.1f} seconds of audio ({len(audio_bytes)} bytes {GEMINI_AUDIO_FORMAT.upper()}).
 
 Gemini's response: 
-{response_text}
-
-Audio saved to: {recorded_file_path}
-
-Note: This is a simplified implementation. A full implementation would:
-1. Use Gemini's audio transcription capabilities for accurate speech-to-text.
-2. Convert Gemini's response to audio using text-to-speech.
-3. Play the response through speakers automatically.
+{response_text}{saved_to}
 """
     
     except Exception as e:
         return (f"Error in Gemini conversation: {str(e)}\n\n"
                 "Make sure you have installed the 'google-generativeai' package and provided a valid API key.")
 
+@mcp.tool()
+async def get_metrics(format: str = "text", path: str = None) -> str:
+    """
+    Show per-stage latency (p50/p95/p99) for device open, capture, encoding,
+    disk writes, Gemini requests and playback start.
+    
+    Args:
+        format: "text" for a summary in milliseconds or "prometheus" for the Prometheus text format
+        path: Also write the Prometheus text to this file (e.g. for a node_exporter textfile collector)
+    
+    Returns:
+        The metrics in the requested format
+    """
+    if format not in ("text", "prometheus"):
+        return "Error: format must be 'text' or 'prometheus'"
+    try:
+        if path:
+            await run_codec(Path(path).write_text, metrics.prometheus())
+        return metrics.prometheus() if format == "prometheus" else metrics.format_text()
+    except Exception as e:
+        return f"Error getting metrics: {str(e)}"
+
+@mcp.resource("metrics://latency")
+def latency_metrics() -> str:
+    """Per-stage latency histograms in the Prometheus text format."""
+    return metrics.prometheus()
+
+def _conversation_key(conversation_id):
+    """Scope a conversation ID to the calling client when several clients share the server."""
+    client = _client_name()
+    return f"{client}/{conversation_id}" if client else conversation_id
+
+@mcp.tool()
+async def end_gemini_conversation(conversation_id: str = DEFAULT_CONVERSATION) -> str:
+    """
+    Forget a Gemini conversation so the next turn starts fresh.
+    
+    Args:
+        conversation_id: Conversation to end (default: "default")
+    
+    Returns:
+        A message confirming the conversation was ended
+    """
+    if gemini_client.end(_conversation_key(conversation_id)):
+        return f"Ended Gemini conversation: {conversation_id}"
+    return f"Error: No active Gemini conversation {conversation_id}"
+
+def _load_codecs():
+    # Touching an attribute executes the lazily imported modules
+    np.zeros(1)
+    sf.available_formats()
+
+async def _warm_step(stage, func, *args, runner=run_device):
+    try:
+        with metrics.span(stage):
+            await runner(func, *args)
+    except Exception as e:
+        # stdout carries the MCP protocol, so report on stderr
+        print(f"Warm-up step {stage} failed: {e}", file=sys.stderr)
+
+async def warm_up():
+    """Initialize PortAudio, the device registry, the codecs and the Gemini SDK in the background.
+
+    Steps run one after another, cheapest and most often needed first, so the
+    slow Gemini import does not hold up the device scan.
+    """
+    with metrics.span("warmup.total"):
+        await _warm_step("warmup.devices", device_registry.scan)
+        await _warm_step("warmup.codecs", _load_codecs, runner=run_codec)
+        await _warm_step("warmup.gemini", preload_gemini, runner=run_network)
+
+# Set AUDIO_WARMUP=1 to start warm_up() as soon as a client completes the handshake
+WARMUP_ENV = "AUDIO_WARMUP"
+warmup_task = None
+
+# Set AUDIO_HISTORY_MINUTES to start history capture on the default input when a client connects
+HISTORY_ENV = "AUDIO_HISTORY_MINUTES"
+history_task = None
+
+async def _on_initialized(notification):
+    global warmup_task, history_task
+    if warmup_task is None and os.environ.get(WARMUP_ENV, "").lower() in ("1", "true", "yes"):
+        warmup_task = asyncio.create_task(warm_up())
+    if history_task is None and os.environ.get(HISTORY_ENV):
+        history_task = asyncio.create_task(start_history_capture(minutes=float(os.environ[HISTORY_ENV])))
+
+mcp._mcp_server.notification_handlers[types.InitializedNotification] = _on_initialized
+
+TRANSPORTS = ("stdio", "sse", "streamable-http")
+
+def serve(transport="stdio", host=None, port=None, max_client_calls=DEFAULT_MAX_CLIENT_CALLS):
+    """Run the server.
+
+    `stdio` serves the single client that spawned the process. `sse` and
+    `streamable-http` run a long-lived daemon that serves any number of
+    clients from one process, sharing the device registry, caches and the
+    Gemini client, with at most `max_client_calls` tool calls in flight per client.
+    """
+    global client_limiter
+    if transport not in TRANSPORTS:
+        raise ValueError(f"Unknown transport {transport!r}; use one of {', '.join(TRANSPORTS)}")
+    if transport != "stdio":
+        if host:
+            mcp.settings.host = host
+        if port:
+            mcp.settings.port = port
+        client_limiter = ClientLimiter(max_client_calls)
+        client_limiter.install(mcp._mcp_server)
+        # Background jobs belong to the client that started them and keep its call slot until done
+        job_manager.owner = lambda: client_limiter.hold_current(mcp._mcp_server)
+    try:
+        mcp.run(transport=transport)
+    finally:
+        # Let queued encodes finish writing their files, then stop the worker threads and processes
+        shutdown_executors()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Audio MCP server")
+    parser.add_argument("--transport", choices=TRANSPORTS,
+                        default=os.environ.get("AUDIO_MCP_TRANSPORT", "stdio"),
+                        help="stdio for one client per process, sse or streamable-http for a shared daemon")
+    parser.add_argument("--host", default=os.environ.get("AUDIO_MCP_HOST"),
+                        help="address the daemon listens on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=os.environ.get("AUDIO_MCP_PORT"),
+                        help="port the daemon listens on (default: 8000)")
+    parser.add_argument("--max-client-calls", type=int,
+                        default=int(os.environ.get("AUDIO_MAX_CLIENT_CALLS", DEFAULT_MAX_CLIENT_CALLS)),
+                        help=f"tool calls each daemon client may run at once (default: {DEFAULT_MAX_CLIENT_CALLS})")
+    args = parser.parse_args(argv)
+    serve(args.transport, args.host, args.port, args.max_client_calls)
 
 if __name__ == "__main__":
-    # Initialize and run the server
-    mcp.run(transport='stdio')
+    main()
@@ -1,18 +1,23 @@
 #!/usr/bin/env python3
-import asyncio
-import base64
-import io
-import json
 import os
 import sounddevice as sd
 import soundfile as sf
-import numpy as np
-import tempfile
-import wave
-import queue
-import threading
+from pathlib import Path
 from mcp.server.fastmcp import FastMCP
 from dotenv import load_dotenv
+from audio_engine import AudioEngine
+from audio_executors import run_codec, run_device
+from audio_live import (
+    DEFAULT_BLOCK_DURATION,
+    DEFAULT_JITTER_BUFFER,
+    DEFAULT_MAX_UPLOAD_LATENCY,
+    DEFAULT_MIN_UPLOAD_LATENCY,
+    DEFAULT_SESSION,
+    ENDED as LIVE_ENDED,
+    LiveSessionManager,
+)
+from audio_metrics import metrics
+from audio_store import RecordingStore
 
 # Import new Google GenAI SDK for Gemini integration
 from google import genai
@@ -38,13 +43,13 @@ load_dotenv()
 DEFAULT_SAMPLE_RATE = 44100
 DEFAULT_CHANNELS = 1
 DEFAULT_DURATION = 5  # seconds
-AUDIO_BUFFER_THRESHOLD = 5120  # Similar to TEN-Agent's threshold
 
-# Global variables for real-time conversation
-audio_queue = queue.Queue()
-conversation_active = False
-audio_stream = None
-session = None
+# Recordings made with record_audio, kept as raw PCM for replay
+recording_store = RecordingStore()
+
+# Shared device streams, and the Live conversations using them
+audio_engine = AudioEngine()
+live_sessions = LiveSessionManager()
 
 async def get_audio_devices():
     """Get a list of all available audio devices."""
@@ -98,84 +103,90 @@ async def record_audio(duration: float = DEFAULT_DURATION,
             if device_index < 0 or device_index >= len(input_devices):
                 return f"Error: Invalid device index {device_index}. Use list_audio_devices tool to see available devices."
         
-        # Record audio
-        recording = sd.rec(
-            int(duration * sample_rate),
-            samplerate=sample_rate,
-            channels=channels,
-            device=device_index
-        )
+        # Record audio as int16 PCM off the event loop
+        def _capture():
+            recording = sd.rec(
+                int(duration * sample_rate),
+                samplerate=sample_rate,
+                channels=channels,
+                device=device_index,
+                dtype='int16'
+            )
+            # Wait for the recording to complete
+            sd.wait()
+            return recording
         
-        # Wait for the recording to complete
-        sd.wait()
+        recording = await run_device(_capture)
         
-        # Generate a temp file for storage
-        fd, temp_path = tempfile.mkstemp(suffix='.wav')
-        try:
-            with wave.open(temp_path, 'wb') as wf:
-                wf.setnchannels(channels)
-                wf.setsampwidth(2)  # 16-bit
-                wf.setframerate(sample_rate)
-                wf.writeframes((recording * 32767).astype(np.int16).tobytes())
-            
-            # Encode the file for storage
-            with open(temp_path, 'rb') as f:
-                encoded_audio = base64.b64encode(f.read()).decode('utf-8')
-                
-            # Store the audio in a global variable for later playback
-            global latest_recording
-            latest_recording = {
-                'audio_data': encoded_audio,
-                'sample_rate': sample_rate,
-                'channels': channels
-            }
-            
-            return f"Successfully recorded {duration} seconds of audio. Use play_latest_recording tool to play it back."
-        finally:
-            os.close(fd)
-            os.unlink(temp_path)
+        # Keep the raw samples for zero-decode playback; storing may spill older takes to disk
+        recording_id = await run_codec(recording_store.put, recording, sample_rate, device=device_index)
+        
+        return (f"Successfully recorded {duration} seconds of audio (recording ID: {recording_id}). "
+                "Use play_latest_recording or play_recording tool to play it back.")
             
     except Exception as e:
         return f"Error recording audio: {str(e)}"
 
-# Global variable to store the latest recording
-latest_recording = None
+async def _play_stored(recording_id, device_index=None):
+    """Play a stored recording straight from its PCM buffer."""
+    stored = recording_store.get(recording_id)
+    if stored is None:
+        return None
+    data, sample_rate = stored
+    
+    def _playback():
+        sd.play(data, sample_rate, device=device_index)
+        sd.wait()  # Wait until the audio is done playing
+    
+    await run_device(_playback)
+    return recording_id
 
 @mcp.tool()
 async def play_latest_recording() -> str:
     """Play the latest recorded audio through the speakers."""
-    global latest_recording
-    
-    if latest_recording is None:
+    if recording_store.latest_id is None:
         return "No recording available. Use record_audio tool first."
     
     try:
-        # Decode the audio data
-        audio_data = base64.b64decode(latest_recording['audio_data'])
-        sample_rate = latest_recording['sample_rate']
-        channels = latest_recording['channels']
-        
-        # Create a temporary file
-        fd, temp_path = tempfile.mkstemp(suffix='.wav')
-        try:
-            # Write the audio data to the temp file
-            with open(temp_path, 'wb') as f:
-                f.write(audio_data)
-            
-            # Read the audio file
-            data, fs = sf.read(temp_path)
-            
-            # Play the audio
-            sd.play(data, fs)
-            sd.wait()  # Wait until the audio is done playing
-            
-            return "Successfully played the latest recording."
-        finally:
-            os.close(fd)
-            os.unlink(temp_path)
+        await _play_stored(recording_store.latest_id)
+        return "Successfully played the latest recording."
     except Exception as e:
         return f"Error playing audio: {str(e)}"
 
+@mcp.tool()
+async def play_recording(recording_id: str, device_index: int = None) -> str:
+    """
+    Play a stored recording through the speakers.
+    
+    Args:
+        recording_id: ID returned by record_audio (see list_recordings)
+        device_index: Specific output device index to use (default: system default)
+    
+    Returns:
+        A message indicating if the recording was played successfully
+    """
+    try:
+        if await _play_stored(recording_id, device_index) is None:
+            return f"Error: No recording with ID {recording_id}. Use list_recordings tool to see stored recordings."
+        return f"Successfully played recording {recording_id}."
+    except Exception as e:
+        return f"Error playing audio: {str(e)}"
+
+@mcp.tool()
+async def list_recordings() -> str:
+    """List recordings held in the in-memory recording store."""
+    recordings = recording_store.list()
+    if not recordings:
+        return "No recordings stored. Use record_audio tool first."
+    
+    result = (f"Stored recordings ({recording_store.memory_bytes} of "
+              f"{recording_store.byte_budget} bytes in memory):\n")
+    for info in recordings:
+        location = "memory" if info["in_memory"] else "disk"
+        result += (f"{info['id']}: {info['duration']:.1f}s, {info['samplerate']} Hz, "
+                   f"{info['channels']} ch, {info['created']} ({location})\n")
+    return result
+
 @mcp.tool()
 async def play_audio(text: str, voice: str = "default") -> str:
     """
@@ -237,243 +248,241 @@ async def play_audio_file(file_path: str, device_index: int = None) -> str:
     except Exception as e:
         return f"Error playing audio file: {str(e)}"
 
-# Audio callback function for continuous recording
-def audio_callback(indata, frames, time, status):
-    """This is called for each audio block."""
-    if status:
-        print(f"Status: {status}")
-    
-    # Convert to bytes and add to queue
-    audio_data = (indata * 32767).astype(np.int16).tobytes()
-    
-    # Only add to queue if conversation is active
-    if conversation_active:
-        audio_queue.put(audio_data)
+def _native_rate(device, kind):
+    """Default sample rate of a device (or the system default device for `kind`)."""
+    return int(sd.query_devices(device, kind)['default_samplerate'])
 
-# Function to play audio received from Gemini
-async def play_audio_bytes(audio_data, sample_rate=24000):
-    """Play audio bytes directly."""
-    try:
-        # Convert the PCM audio data to numpy array
-        audio_np = np.frombuffer(audio_data, dtype=np.int16) / 32767.0
-        
-        # Play the audio
-        sd.play(audio_np, sample_rate)
-        await asyncio.sleep(len(audio_np) / sample_rate)  # Non-blocking wait
-    except Exception as e:
-        print(f"Error playing audio response: {e}")
+def _live_connect(api_key):
+    """A connect() for LiveSession: opens a Gemini LiveConnect session."""
+    # Initialize the Gemini client with the new API
+    # Explicitly set API version to beta for access to experimental features
+    client = genai.Client(
+        api_key=api_key,
+        http_options=HttpOptions(api_version="v1beta1")  # Specify beta API version
+    )
 
-# Process audio queue and send to Gemini in chunks
-async def process_audio_queue(session):
-    """Process audio from queue and send to Gemini in chunks."""
-    buffer = bytearray()
-    
-    while conversation_active:
-        try:
-            # Get audio data from queue with a timeout
-            try:
-                audio_chunk = audio_queue.get(timeout=0.1)
-                buffer.extend(audio_chunk)
-            except queue.Empty:
-                await asyncio.sleep(0.01)
-                continue
-            
-            # If buffer reaches threshold, send to Gemini
-            if len(buffer) >= AUDIO_BUFFER_THRESHOLD:
-                # Encode and send
-                base64_audio = base64.b64encode(buffer).decode('utf-8')
-                media_chunks = [{
-                    "data": base64_audio,
-                    "mime_type": "audio/pcm"
-                }]
-                
-                try:
-                    await session.send(media_chunks)
-                    print(f"Sent {len(buffer)} bytes of audio to Gemini")
-                    buffer = bytearray()  # Clear buffer after sending
-                except Exception as e:
-                    print(f"Error sending audio: {e}")
-        except Exception as e:
-            print(f"Error in audio processing: {e}")
-            await asyncio.sleep(0.1)
+    # Set up LiveConnect configuration with the new API structure
+    config = LiveConnectConfig(
+        response_modalities=[Modality.AUDIO],
+        system_instruction=Content(parts=[Part(text="You are a helpful voice assistant who responds concisely.")]),
+        speech_config=SpeechConfig(
+            voice_config=VoiceConfig(
+                prebuilt_voice_config=PrebuiltVoiceConfig(voice_name="alloy")
+            )
+        ),
+        generation_config=GenerationConfig(
+            temperature=0.7,
+            max_output_tokens=1024,
+        ),
+    )
+
+    # Use the correct model ID for Gemini 2.0
+    model_id = "gemini-2.0-flash-exp"  # Update to the experimental model or another supported model
+    return lambda: client.aio.live.connect(model=model_id, config=config)
 
 @mcp.tool()
 async def gemini_realtime_conversation(
     duration: float = 60.0,
-    sample_rate: int = 24000,
+    sample_rate: int = None,
     channels: int = 1,
-    device_index: int = None
+    device_index: int = None,
+    output_device_index: int = None,
+    output_sample_rate: int = None,
+    block_duration: float = DEFAULT_BLOCK_DURATION,
+    jitter_buffer: float = DEFAULT_JITTER_BUFFER,
+    vad: bool = True,
+    min_upload_latency: float = DEFAULT_MIN_UPLOAD_LATENCY,
+    max_upload_latency: float = DEFAULT_MAX_UPLOAD_LATENCY,
+    session_id: str = DEFAULT_SESSION,
+    wait: bool = True
 ) -> str:
     """
     Start a real-time conversation with Gemini using your microphone and speakers.
-    
+
+    Several conversations can run at once under different session IDs, each
+    with its own devices, upload task and statistics; conversations on the
+    same device share its stream.
+
     Args:
         duration: Maximum conversation duration in seconds (default: 60)
-        sample_rate: Sample rate in Hz (default: 24000)
+        sample_rate: Microphone sample rate in Hz (default: the input device's native rate)
         channels: Number of audio channels (default: 1)
         device_index: Specific input device index to use (default: system default)
-    
+        output_device_index: Specific output device index to use (default: system default)
+        output_sample_rate: Speaker sample rate in Hz (default: the output device's native rate)
+        block_duration: Capture block size in seconds (default: 0.1)
+        jitter_buffer: Seconds of response audio buffered before playback starts (default: 0.2)
+        vad: Only upload audio while someone is speaking (default: True)
+        min_upload_latency: Smallest upload batch in seconds (default: 0.04)
+        max_upload_latency: Largest upload batch and longest audio may wait, in seconds (default: 0.5)
+        session_id: Name of this conversation, for stop/status/stats (default: "default")
+        wait: Wait for the conversation to end (default: True); False returns once it has started
+
     Returns:
         A message indicating the conversation result
     """
-    global conversation_active, audio_stream, session
-    
     if not GENAI_AVAILABLE:
         return ("Google GenAI package is not installed. "
                 "Please install it with: pip install google-genai")
-    
+
     try:
         # Get API key from environment
         api_key = os.environ.get("GOOGLE_API_KEY")
         if not api_key:
             return ("No API key provided. Please set the GOOGLE_API_KEY environment variable.")
-        
-        # Initialize the Gemini client with the new API
-        # Explicitly set API version to beta for access to experimental features
-        client = genai.Client(
-            api_key=api_key,
-            http_options=HttpOptions(api_version="v1beta1")  # Specify beta API version
-        )
-        
-        # Set up LiveConnect configuration with the new API structure
-        config = LiveConnectConfig(
-            response_modalities=[Modality.AUDIO],
-            system_instruction=Content(parts=[Part(text="You are a helpful voice assistant who responds concisely.")]),
-            speech_config=SpeechConfig(
-                voice_config=VoiceConfig(
-                    prebuilt_voice_config=PrebuiltVoiceConfig(voice_name="alloy")
-                )
-            ),
-            generation_config=GenerationConfig(
-                temperature=0.7,
-                max_output_tokens=1024,
-            ),
-        )
-        
-        # Set the conversation flag to active
-        conversation_active = True
-        
-        # Start the audio stream for continuous recording
-        audio_stream = sd.InputStream(
-            samplerate=sample_rate,
-            channels=channels,
-            device=device_index,
-            callback=audio_callback,
-            blocksize=int(0.1 * sample_rate)  # 100ms chunks
-        )
-        
-        # Start the stream
-        audio_stream.start()
-        
-        # Use the correct model ID for Gemini 2.0
-        model_id = "gemini-2.0-flash-exp"  # Update to the experimental model or another supported model
-        
-        # Connect to Gemini's LiveConnect API using the new client structure
-        async with client.aio.live.connect(model=model_id, config=config) as live_session:
-            session = live_session
-            print(f"Connected to Gemini LiveConnect API using model {model_id}")
-            
-            # Create a task to process audio queue
-            audio_processor = asyncio.create_task(process_audio_queue(live_session))
-            
-            # Timeout after specified duration
-            start_time = asyncio.get_event_loop().time()
-            
-            # Send greeting to start the conversation
-            await live_session.send(input="Hello Gemini", end_of_turn=True)
-            
-            # Process responses from Gemini
-            try:
-                while conversation_active and (asyncio.get_event_loop().time() - start_time < duration):
-                    # Receive messages from Gemini
-                    async for message in live_session.receive():
-                        # Process server content (structure may vary slightly from old API)
-                        if hasattr(message, 'server_content') and message.server_content:
-                            # Check if response contains audio data
-                            if (hasattr(message.server_content, 'model_turn') and 
-                                message.server_content.model_turn):
-                                
-                                model_turn = message.server_content.model_turn
-                                
-                                # Process each part in the model's turn
-                                for part in model_turn.parts:
-                                    # Handle text parts
-                                    if hasattr(part, 'text') and part.text:
-                                        print(f"Gemini says: {part.text}")
-                                    
-                                    # Handle audio parts
-                                    if hasattr(part, 'inline_data') and part.inline_data.data:
-                                        print("Received audio response, playing...")
-                                        await play_audio_bytes(part.inline_data.data, sample_rate=sample_rate)
-                            
-                            # Check if turn is complete
-                            if hasattr(message.server_content, 'turn_complete') and message.server_content.turn_complete:
-                                print("Turn complete")
-                        
-                        # Handle setup complete
-                        elif hasattr(message, 'setup_complete') and message.setup_complete:
-                            print("Setup complete")
-                        
-                        # Check for timeout
-                        if asyncio.get_event_loop().time() - start_time >= duration:
-                            print("Conversation timeout reached")
-                            break
-                
-            except Exception as e:
-                print(f"Error in response processing: {e}")
-                pass
-            
-            # Clean up
-            audio_processor.cancel()
-            
-            # Close the connection
-            try:
-                await live_session.close()
-            except:
-                pass
-            
-            # Return result
-            return "Real-time conversation with Gemini completed."
-    
+
+        # Run both devices at their native rates and resample to/from the Live API rates
+        if sample_rate is None:
+            sample_rate = _native_rate(device_index, 'input')
+        if output_sample_rate is None:
+            output_sample_rate = _native_rate(output_device_index, 'output')
+
+        try:
+            session = live_sessions.start(
+                session_id, _live_connect(api_key),
+                sample_rate=sample_rate, output_sample_rate=output_sample_rate, channels=channels,
+                device=device_index, output_device=output_device_index, duration=duration,
+                block_duration=block_duration, jitter_buffer=jitter_buffer, vad=vad,
+                min_upload_latency=min_upload_latency, max_upload_latency=max_upload_latency,
+                engine=audio_engine)
+        except ValueError as e:
+            return f"Error: {e}"
+
+        if not wait:
+            return (f"Started Gemini conversation {session_id}. Use get_gemini_conversation_status "
+                    "or stop_gemini_conversation with this session ID.")
+        return await session.task
+
     except Exception as e:
         return f"Error in Gemini real-time conversation: {str(e)}"
-    
-    finally:
-        # Clean up resources
-        conversation_active = False
-        if audio_stream and audio_stream.active:
-            audio_stream.stop()
-            audio_stream.close()
-        audio_stream = None
-        session = None
 
 @mcp.tool()
-async def stop_gemini_conversation() -> str:
-    """Stop the active Gemini real-time conversation."""
-    global conversation_active, audio_stream, session
+async def stop_gemini_conversation(session_id: str = None) -> str:
+    """
+    Stop a Gemini real-time conversation.
+
+    Args:
+        session_id: Conversation to stop (default: all active conversations)
+
+    Returns:
+        A message listing the conversations stopped
+    """
+    try:
+        if session_id is None:
+            stopped = await live_sessions.stop_all()
+            if not stopped:
+                return "No active conversation to stop."
+            return f"Stopped Gemini conversations: {', '.join(s.id for s in stopped)}."
+
+        session = live_sessions.get(session_id)
+        if session is None:
+            return f"Error: No conversation with session ID {session_id}."
+        if session.state in LIVE_ENDED:
+            return f"Conversation {session_id} has already ended."
+        await live_sessions.stop(session_id)
+        return f"Gemini conversation {session_id} stopped successfully."
+    except Exception as e:
+        return f"Error stopping conversation: {str(e)}"
+
+def _format_session(status):
+    line = (f"{status['id']}: {status['state']}, {status['elapsed']}s, "
+            f"in {status['device'] if status['device'] is not None else 'default'} "
+            f"@ {status['sample_rate']} Hz, out "
+            f"{status['output_device'] if status['output_device'] is not None else 'default'} "
+            f"@ {status['output_sample_rate']} Hz, captured {status['captured_frames']} frames, "
+            f"played {status['played_frames']} frames")
+    if status["error"]:
+        line += f", error: {status['error']}"
+    return line + "\n"
+
+@mcp.tool()
+async def get_gemini_conversation_status(session_id: str = None) -> str:
+    """
+    Show the state of Gemini conversations.
+
+    Args:
+        session_id: Conversation to show (default: all recent conversations)
+
+    Returns:
+        One line per conversation: state, elapsed time, devices and frame counts
+    """
+    if session_id is not None:
+        session = live_sessions.get(session_id)
+        if session is None:
+            return f"Error: No conversation with session ID {session_id}."
+        sessions = [session]
+    else:
+        sessions = live_sessions.list()
+        if not sessions:
+            return "No Gemini conversations. Use gemini_realtime_conversation to start one."
+
+    result = f"Gemini conversations ({len(live_sessions.active())} active):\n"
+    for session in sessions:
+        result += _format_session(session.status())
+    return result
+
+def _format_stats(title, stats):
+    result = f"{title}:\n"
+    for key, value in stats.items():
+        result += f"  {key}: {value:.1f}\n" if isinstance(value, float) else f"  {key}: {value}\n"
+    return result
+
+@mcp.tool()
+async def get_audio_pipeline_stats(session_id: str = None) -> str:
+    """
+    Report capture/playback callback timing, xrun counts and buffer health.
+
+    Args:
+        session_id: Conversation to report on (default: all recent conversations)
+
+    Returns:
+        Statistics by pipeline stage, per conversation
+    """
+    if session_id is not None:
+        session = live_sessions.get(session_id)
+        if session is None:
+            return f"Error: No conversation with session ID {session_id}."
+        sessions = [session]
+    else:
+        sessions = live_sessions.list()
+        if not sessions:
+            return "No Gemini conversations. Use gemini_realtime_conversation to start one."
+
+    reports = []
+    for session in sessions:
+        sections = [f"Session {session.id} ({session.state})"]
+        sections += [_format_stats(title, stats) for title, stats in session.pipeline_stats().items()]
+        if session.metrics.snapshot():
+            sections.append(session.metrics.format_text())
+        reports.append("\n".join(sections))
+    return "\n\n".join(reports)
+
+@mcp.tool()
+async def get_metrics(format: str = "text", path: str = None) -> str:
+    """
+    Show per-stage latency (p50/p95/p99) for the Live pipeline: upload DSP,
+    send time, mic-to-send delay, model response latency and playback start.
     
-    if not conversation_active:
-        return "No active conversation to stop."
+    Args:
+        format: "text" for a summary in milliseconds or "prometheus" for the Prometheus text format
+        path: Also write the Prometheus text to this file (e.g. for a node_exporter textfile collector)
     
+    Returns:
+        The metrics in the requested format
+    """
+    if format not in ("text", "prometheus"):
+        return "Error: format must be 'text' or 'prometheus'"
     try:
-        # Set flag to stop conversation
-        conversation_active = False
-        
-        # Stop audio stream
-        if audio_stream and audio_stream.active:
-            audio_stream.stop()
-            audio_stream.close()
-        
-        # Close session if it exists
-        if session:
-            try:
-                await session.close()
-            except:
-                pass
-        
-        return "Gemini conversation stopped successfully."
+        if path:
+            await run_codec(Path(path).write_text, metrics.prometheus())
+        return metrics.prometheus() if format == "prometheus" else metrics.format_text()
     except Exception as e:
-        return f"Error stopping conversation: {str(e)}"
+        return f"Error getting metrics: {str(e)}"
+
+@mcp.resource("metrics://latency")
+def latency_metrics() -> str:
+    """Per-stage latency histograms in the Prometheus text format."""
+    return metrics.prometheus()
 
 if __name__ == "__main__":
     # Initialize and run the server
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""In-memory store for recorded PCM, keyed by recording ID.
+
+Recordings are kept as raw NumPy arrays so they can be replayed without any
+decoding. When the total size exceeds the byte budget, the least recently
+used recordings are spilled to `.npy` files and memory-mapped on access.
+Spilled files are capped by a second budget; beyond it the least recently
+used spilled recordings are dropped.
+"""
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+import weakref
+from collections import OrderedDict
+from datetime import datetime
+from audio_lazy import lazy_import
+
+np = lazy_import("numpy")
+
+DEFAULT_BYTE_BUDGET = int(os.environ.get("AUDIO_RECORDING_STORE_BYTES", 256 * 1024 * 1024))
+DEFAULT_SPILL_BUDGET = int(os.environ.get("AUDIO_RECORDING_SPILL_BYTES", 2 * 1024 * 1024 * 1024))
+
+
+def _unlink(path):
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+
+class RecordingStore:
+    """LRU store of PCM recordings under a byte budget, spilling to disk.
+
+    `put` may write spilled recordings to disk, so call it off the event loop
+    (e.g. with `run_codec`). Spilled files are written without holding the
+    lock, so other threads can keep reading recordings meanwhile.
+    """
+
+    def __init__(self, byte_budget: int = DEFAULT_BYTE_BUDGET, spill_dir: str = None,
+                 spill_budget: int = DEFAULT_SPILL_BUDGET):
+        self.byte_budget = byte_budget
+        self.spill_budget = spill_budget
+        self._spill_dir = spill_dir
+        self._owns_spill_dir = spill_dir is None
+        self._cleanup = None
+        self._entries = OrderedDict()  # recording_id -> entry dict, least recently used first
+        self._lock = threading.Lock()
+        self.memory_bytes = 0
+        self.spilled_bytes = 0
+        self._spilling_bytes = 0  # in memory, but already being written out
+        self.latest_id = None
+        self._seq = 0
+
+    def _spill_path(self, recording_id):
+        if self._spill_dir is None:
+            self._spill_dir = tempfile.mkdtemp(prefix="audio-mcp-recordings-")
+            # Remove the temporary directory when the store goes away, even without close()
+            self._cleanup = weakref.finalize(self, shutil.rmtree, self._spill_dir, ignore_errors=True)
+        os.makedirs(self._spill_dir, exist_ok=True)
+        return os.path.join(self._spill_dir, f"{recording_id}.npy")
+
+    def _pick_spills_locked(self) -> list:
+        """Mark least recently used recordings for spilling until back under budget."""
+        spills = []
+        for recording_id, entry in self._entries.items():
+            if self.memory_bytes - self._spilling_bytes <= self.byte_budget:
+                break
+            if entry["data"] is not None and not entry["spilling"]:
+                entry["spilling"] = True
+                self._spilling_bytes += entry["nbytes"]
+                spills.append((recording_id, entry, self._spill_path(recording_id)))
+        return spills
+
+    def _spill(self, recording_id, entry, path):
+        """Write one recording out (without the lock) and swap it for its file."""
+        try:
+            np.save(path, entry["data"])
+        except Exception:
+            _unlink(path)
+            with self._lock:
+                entry["spilling"] = False
+                self._spilling_bytes -= entry["nbytes"]
+            raise
+        with self._lock:
+            entry["spilling"] = False
+            self._spilling_bytes -= entry["nbytes"]
+            if self._entries.get(recording_id) is not entry:
+                # Deleted while it was being written
+                stale = [path]
+            else:
+                self.memory_bytes -= entry["nbytes"]
+                self.spilled_bytes += entry["nbytes"]
+                entry["data"] = None
+                entry["path"] = path
+                stale = self._trim_spilled_locked()
+        for stale_path in stale:
+            _unlink(stale_path)
+
+    def _trim_spilled_locked(self) -> list:
+        """Drop least recently used spilled recordings over the spill budget; returns their files."""
+        stale = []
+        for recording_id, entry in list(self._entries.items()):
+            if self.spilled_bytes <= self.spill_budget:
+                break
+            if entry["data"] is None:
+                stale.append(self._remove_locked(recording_id))
+        return stale
+
+    def put(self, data, samplerate: int, **metadata) -> str:
+        """Store a `(frames, channels)` PCM array and return its recording ID. May block on disk."""
+        data = np.ascontiguousarray(data)
+        if data.ndim == 1:
+            data = data.reshape(-1, 1)
+        recording_id = uuid.uuid4().hex[:12]
+        entry = {
+            "data": data,
+            "path": None,
+            "seq": 0,
+            "spilling": False,
+            "samplerate": samplerate,
+            "channels": data.shape[1],
+            "frames": data.shape[0],
+            "dtype": str(data.dtype),
+            "nbytes": data.nbytes,
+            "created": datetime.now().isoformat(timespec="seconds"),
+            **metadata,
+        }
+        with self._lock:
+            self._seq += 1
+            entry["seq"] = self._seq
+            self._entries[recording_id] = entry
+            self.memory_bytes += data.nbytes
+            self.latest_id = recording_id
+            spills = self._pick_spills_locked()
+        for spill in spills:
+            self._spill(*spill)
+        return recording_id
+
+    def get(self, recording_id: str):
+        """Return `(data, samplerate)` for a recording, or None if unknown."""
+        with self._lock:
+            entry = self._entries.get(recording_id)
+            if entry is None:
+                return None
+            self._entries.move_to_end(recording_id)
+            data = entry["data"]
+            if data is None:
+                # Spilled recordings are memory-mapped, not read back into RAM
+                data = np.load(entry["path"], mmap_mode="r")
+            return data, entry["samplerate"]
+
+    def info(self, recording_id: str) -> dict:
+        """Metadata for one recording (without the samples)."""
+        with self._lock:
+            entry = self._entries.get(recording_id)
+            if entry is None:
+                return None
+            return self._describe(recording_id, entry)
+
+    def list(self) -> list:
+        """Metadata for all recordings, oldest first by creation."""
+        with self._lock:
+            items = [(e["seq"], self._describe(rid, e)) for rid, e in self._entries.items()]
+        return [item for _, item in sorted(items, key=lambda pair: pair[0])]
+
+    @staticmethod
+    def _describe(recording_id, entry):
+        info = {k: v for k, v in entry.items() if k not in ("data", "path", "seq", "spilling")}
+        info["id"] = recording_id
+        info["duration"] = entry["frames"] / entry["samplerate"]
+        info["in_memory"] = entry["data"] is not None
+        return info
+
+    def _remove_locked(self, recording_id):
+        """Forget a recording; returns its spilled file (to unlink outside the lock), if any."""
+        entry = self._entries.pop(recording_id)
+        if entry["data"] is not None:
+            self.memory_bytes -= entry["nbytes"]
+        else:
+            self.spilled_bytes -= entry["nbytes"]
+        if self.latest_id == recording_id:
+            newest = max(self._entries.items(), key=lambda item: item[1]["seq"], default=None)
+            self.latest_id = newest[0] if newest else None
+        return entry["path"]
+
+    def delete(self, recording_id: str) -> bool:
+        with self._lock:
+            if recording_id not in self._entries:
+                return False
+            path = self._remove_locked(recording_id)
+        if path:
+            _unlink(path)
+        return True
+
+    def close(self):
+        """Drop everything and remove spilled files."""
+        with self._lock:
+            paths = [e["path"] for e in self._entries.values() if e["path"]]
+            self._entries.clear()
+            self.memory_bytes = self.spilled_bytes = 0
+            self.latest_id = None
+            spill_dir, cleanup = self._spill_dir, self._cleanup
+            if self._owns_spill_dir:
+                self._spill_dir = self._cleanup = None
+        if cleanup is not None:
+            cleanup()
+        elif spill_dir is not None:
+            for path in paths:
+                _unlink(path)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
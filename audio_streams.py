@@ -0,0 +1,720 @@
+#!/usr/bin/env python3
+"""Streaming audio I/O helpers built on PortAudio streams.
+
+These classes run blocking work and are meant to be driven from one of the
+executors in `audio_executors`, never directly on the event loop. Each one
+reports how long the device took to open (`*.device_open`) and how long until
+the first block reached the callback (`*.first_block`) to `audio_metrics`.
+Given an `audio_engine.AudioEngine`, they attach to its shared device streams
+instead of opening a stream of their own.
+"""
+import functools
+import hashlib
+import queue
+import threading
+import time
+from contextlib import ExitStack, closing
+from audio_buffers import HistoryBuffer
+from audio_dsp import MAX_CLOCK_DRIFT, ClockDriftEstimator, DriftCorrector
+from audio_lazy import lazy_import
+from audio_metrics import metrics
+
+np = lazy_import("numpy")
+sd = lazy_import("sounddevice")
+sf = lazy_import("soundfile")
+
+# Frames per PortAudio callback and number of blocks read ahead of playback.
+DEFAULT_BLOCKSIZE = 2048
+DEFAULT_PREFETCH_BLOCKS = 8
+# Blocks allowed to queue between the capture callback and the disk writer.
+DEFAULT_WRITE_QUEUE_BLOCKS = 32
+# libsndfile subtype whose files store exactly the samples `pcm16` returns
+CAPTURE_PCM16 = "PCM_16"
+
+
+def pcm16(block):
+    """`block` as the 16-bit samples a PCM_16 file stores; float input is clipped and rounded.
+
+    Recordings are catalogued with the SHA-256 of these samples, so the hash
+    matches what a PCM_16 WAV or FLAC file reads back as int16.
+    """
+    if block.dtype == np.int16:
+        return block
+    return np.rint(np.clip(block, -1.0, 1.0) * 32767).astype(np.int16)
+# Seconds over which a multi-device recording steers a track back onto its fitted timeline
+ALIGNMENT_SERVO_SECONDS = 1.0
+
+
+class StreamingPlayer:
+    """Play an audio file block by block through a single OutputStream.
+
+    The file is decoded incrementally into a small bounded queue, so memory use
+    is `prefetch_blocks * blocksize * channels` samples regardless of file
+    length and playback starts as soon as the first blocks are decoded.
+    Through an engine, `gain` and `ducking` are applied by its mixer (see
+    `audio_engine.PlaybackVoice`); on a stream of its own only `gain` applies.
+    """
+
+    def __init__(self, file_path, device=None, blocksize: int = DEFAULT_BLOCKSIZE,
+                 prefetch_blocks: int = DEFAULT_PREFETCH_BLOCKS, engine=None,
+                 gain: float = 1.0, ducking: float = None):
+        self.file_path = file_path
+        self.device = device
+        self.engine = engine
+        self.gain = gain
+        self.ducking = ducking
+        self.blocksize = blocksize
+        self._queue = queue.Queue(maxsize=max(1, prefetch_blocks))
+        self._finished = threading.Event()
+        self._stopped = threading.Event()
+        self.underruns = 0
+        self.frames_played = 0
+        self.frames_total = None
+        self._opened_at = None
+        self.start_latency = None
+
+    def _callback(self, outdata, frames, time_info, status):
+        if self.start_latency is None:
+            self.start_latency = time.perf_counter() - self._opened_at
+        if status.output_underflow:
+            self.underruns += 1
+        try:
+            block = self._queue.get_nowait()
+        except queue.Empty:
+            # Decoder fell behind; emit silence rather than blocking the audio thread
+            outdata.fill(0)
+            self.underruns += 1
+            return
+        if block is None:
+            outdata.fill(0)
+            raise sd.CallbackStop
+        if self.gain == 1.0 or self.engine:
+            outdata[:] = block
+        else:
+            np.multiply(block, self.gain, out=outdata)
+        self.frames_played += frames
+
+    def _put(self, item) -> bool:
+        """Enqueue a block, giving up if playback was stopped."""
+        while not self._stopped.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def play(self):
+        """Decode and play the whole file, blocking until playback finishes."""
+        with sf.SoundFile(self.file_path) as f:
+            self.frames_total = f.frames
+            blocks = f.blocks(blocksize=self.blocksize, dtype='float32',
+                              always_2d=True, fill_value=0)
+
+            # Prime the prefetch buffer so the first callbacks have data
+            eof = True
+            for block in blocks:
+                self._queue.put(block)
+                if self._queue.full():
+                    eof = False
+                    break
+            if eof:
+                self._queue.put(None)
+
+            self._opened_at = time.perf_counter()
+            if self.engine:
+                open_stream = functools.partial(self.engine.output_stream, gain=self.gain,
+                                                ducking=self.ducking)
+            else:
+                open_stream = sd.OutputStream
+            stream = open_stream(
+                samplerate=f.samplerate,
+                channels=f.channels,
+                dtype='float32',
+                blocksize=self.blocksize,
+                device=self.device,
+                callback=self._callback,
+                finished_callback=self._finished.set
+            )
+            with stream:
+                metrics.observe("output.device_open", time.perf_counter() - self._opened_at)
+                if not eof:
+                    for block in blocks:
+                        if not self._put(block):
+                            break
+                    else:
+                        self._put(None)
+                while not self._finished.wait(0.1):
+                    if self._stopped.is_set():
+                        stream.abort()
+                        break
+        if self.start_latency is not None:
+            metrics.observe("output.first_block", self.start_latency)
+
+    def stop(self):
+        """Stop playback early; safe to call from any thread."""
+        self._stopped.set()
+
+
+class StreamingRecorder:
+    """Record from an InputStream straight into an open SoundFile.
+
+    The PortAudio callback only copies each block into a bounded queue; a
+    writer thread appends the blocks to the file as they arrive. Memory use is
+    bounded by `max_queued_blocks` and the file is complete as soon as capture
+    stops. Blocks that arrive while the queue is full are dropped and counted.
+    The writer also keeps the peak, RMS and a SHA-256 of the samples as stored
+    (see `pcm16`); PCM_16 files are written from those same samples.
+    """
+
+    def __init__(self, file_path, samplerate: int, channels: int, device=None,
+                 blocksize: int = DEFAULT_BLOCKSIZE,
+                 max_queued_blocks: int = DEFAULT_WRITE_QUEUE_BLOCKS,
+                 subtype: str = None, engine=None):
+        self.file_path = file_path
+        self.samplerate = samplerate
+        self.channels = channels
+        self.device = device
+        self.engine = engine
+        self.blocksize = blocksize
+        self.subtype = subtype
+        self._queue = queue.Queue(maxsize=max(1, max_queued_blocks))
+        self._finished = threading.Event()
+        self._stopped = threading.Event()
+        self._remaining = None
+        self._error = None
+        self.frames_written = 0
+        self.dropped_blocks = 0
+        self.overflows = 0
+        self.peak = 0.0
+        self._sum_squares = 0.0
+        self._hash = hashlib.sha256()
+        self._opened_at = None
+        self.start_latency = None
+
+    def _callback(self, indata, frames, time_info, status):
+        if self.start_latency is None:
+            self.start_latency = time.perf_counter() - self._opened_at
+        if status.input_overflow:
+            self.overflows += 1
+        if self._remaining is not None:
+            frames = min(frames, self._remaining)
+            self._remaining -= frames
+        try:
+            self._queue.put_nowait(indata[:frames].copy())
+        except queue.Full:
+            self.dropped_blocks += 1
+        if self._remaining == 0 or self._stopped.is_set():
+            raise sd.CallbackStop
+
+    def _write_loop(self, f):
+        while True:
+            block = self._queue.get()
+            if block is None:
+                return
+            if self._error is not None:
+                # Keep draining so the capture side never blocks
+                continue
+            try:
+                pcm = pcm16(block)
+                start = time.perf_counter()
+                f.write(pcm if f.subtype == CAPTURE_PCM16 else block)
+                metrics.observe("input.disk_write", time.perf_counter() - start)
+                self.frames_written += len(block)
+            except Exception as e:
+                self._error = e
+                continue
+            if block.size:
+                self.peak = max(self.peak, float(np.max(np.abs(block))))
+                self._sum_squares += float(np.dot(block.ravel(), block.ravel()))
+                self._hash.update(pcm.tobytes())
+
+    @property
+    def rms(self) -> float:
+        """RMS level of everything written so far (full scale = 1.0)."""
+        samples = self.frames_written * self.channels
+        return (self._sum_squares / samples) ** 0.5 if samples else 0.0
+
+    @property
+    def sha256(self) -> str:
+        """Hex digest of the captured samples as 16-bit PCM."""
+        return self._hash.hexdigest()
+
+    def record(self, duration: float = None) -> int:
+        """Record for `duration` seconds (or until stop()); returns frames written."""
+        self._remaining = None if duration is None else int(duration * self.samplerate)
+
+        with sf.SoundFile(self.file_path, mode='w', samplerate=self.samplerate,
+                          channels=self.channels, subtype=self.subtype) as f:
+            writer = threading.Thread(target=self._write_loop, args=(f,),
+                                      name="audio-recorder-writer", daemon=True)
+            writer.start()
+            try:
+                if self._remaining != 0:
+                    self._opened_at = time.perf_counter()
+                    open_stream = self.engine.input_stream if self.engine else sd.InputStream
+                    stream = open_stream(
+                        samplerate=self.samplerate,
+                        channels=self.channels,
+                        dtype='float32',
+                        blocksize=self.blocksize,
+                        device=self.device,
+                        callback=self._callback,
+                        finished_callback=self._finished.set
+                    )
+                    with stream:
+                        metrics.observe("input.device_open", time.perf_counter() - self._opened_at)
+                        while not self._finished.wait(0.1):
+                            if self._stopped.is_set():
+                                break
+            finally:
+                self._queue.put(None)
+                writer.join()
+
+        if self.start_latency is not None:
+            metrics.observe("input.first_block", self.start_latency)
+
+        if self._error is not None:
+            raise self._error
+        return self.frames_written
+
+    def stop(self):
+        """Stop recording early; everything captured so far is kept."""
+        self._stopped.set()
+
+
+class MemoryRecorder:
+    """Record a fixed duration from an InputStream into a preallocated array.
+
+    Used when the audio is consumed in memory (e.g. sent to a model) rather
+    than saved, so nothing is written to disk. The callback copies each block
+    straight into place; `record()` returns the `(frames, channels)` buffer
+    trimmed to what was captured.
+    """
+
+    def __init__(self, samplerate: int, channels: int, device=None,
+                 blocksize: int = DEFAULT_BLOCKSIZE, dtype: str = 'int16', engine=None):
+        self.samplerate = samplerate
+        self.channels = channels
+        self.device = device
+        self.engine = engine
+        self.blocksize = blocksize
+        self.dtype = dtype
+        self._buffer = None
+        self._finished = threading.Event()
+        self._stopped = threading.Event()
+        self.frames_captured = 0
+        self.overflows = 0
+        self._opened_at = None
+        self.start_latency = None
+
+    def _callback(self, indata, frames, time_info, status):
+        if self.start_latency is None:
+            self.start_latency = time.perf_counter() - self._opened_at
+        if status.input_overflow:
+            self.overflows += 1
+        start = self.frames_captured
+        frames = min(frames, len(self._buffer) - start)
+        self._buffer[start:start + frames] = indata[:frames]
+        self.frames_captured = start + frames
+        if self.frames_captured >= len(self._buffer) or self._stopped.is_set():
+            raise sd.CallbackStop
+
+    def record(self, duration: float):
+        """Record for `duration` seconds (or until stop()); returns the captured samples."""
+        self._buffer = np.zeros((int(duration * self.samplerate), self.channels), dtype=self.dtype)
+        if len(self._buffer):
+            self._opened_at = time.perf_counter()
+            open_stream = self.engine.input_stream if self.engine else sd.InputStream
+            stream = open_stream(
+                samplerate=self.samplerate,
+                channels=self.channels,
+                dtype=self.dtype,
+                blocksize=self.blocksize,
+                device=self.device,
+                callback=self._callback,
+                finished_callback=self._finished.set
+            )
+            with stream:
+                metrics.observe("input.device_open", time.perf_counter() - self._opened_at)
+                while not self._finished.wait(0.1):
+                    if self._stopped.is_set():
+                        break
+        if self.start_latency is not None:
+            metrics.observe("input.first_block", self.start_latency)
+        return self._buffer[:self.frames_captured]
+
+    def stop(self):
+        """Stop recording early; everything captured so far is kept."""
+        self._stopped.set()
+
+
+class HistoryRecorder:
+    """Keep the last `seconds` of input in a preallocated int16 ring.
+
+    The capture runs until stop(), so any recent window can be saved after the
+    fact with `snapshot()` instead of being captured again. The callback only
+    copies (and scales) each block into the ring; memory use is fixed at
+    `seconds * samplerate * channels` int16 samples.
+    """
+
+    def __init__(self, samplerate: int, channels: int, seconds: float, device=None,
+                 blocksize: int = None, engine=None):
+        self.samplerate = samplerate
+        self.channels = channels
+        self.seconds = seconds
+        self.device = device
+        # None takes the stream's own block size, so the newest audio reaches the ring soonest
+        self.blocksize = blocksize
+        self.engine = engine
+        self.ring = HistoryBuffer(int(seconds * samplerate), channels)
+        self.overflows = 0
+        self.started_at = None
+        self._stream = None
+        # (frames written, wall-clock time) as of the last block, to map times to frames
+        self._clock = (0, None)
+
+    def _callback(self, indata, frames, time_info, status):
+        if status.input_overflow:
+            self.overflows += 1
+        self.ring.write(indata)
+        self._clock = (self._clock[0] + frames, time.time())
+
+    @property
+    def active(self) -> bool:
+        return self._stream is not None and self._stream.active
+
+    def start(self):
+        """Open the input and start filling the ring. Blocking."""
+        open_stream = self.engine.input_stream if self.engine else sd.InputStream
+        start = time.perf_counter()
+        stream = open_stream(
+            samplerate=self.samplerate,
+            channels=self.channels,
+            dtype='float32',
+            blocksize=self.blocksize,
+            device=self.device,
+            callback=self._callback
+        )
+        stream.start()
+        metrics.observe("input.device_open", time.perf_counter() - start)
+        self._stream = stream
+        self.started_at = time.time()
+
+    def stop(self):
+        stream, self._stream = self._stream, None
+        if stream is not None:
+            stream.close()
+
+    def retained_seconds(self) -> float:
+        first, end = self.ring.window()
+        return (end - first) / self.samplerate
+
+    def snapshot(self, seconds: float, seconds_ago: float = 0.0):
+        """Copy the `seconds` of audio that ended `seconds_ago` seconds ago.
+
+        Returns `(started, data)`: the wall-clock time of the first frame and an
+        int16 `(frames, channels)` array, trimmed to what the ring still holds.
+        """
+        written, at = self._clock
+        if at is None:
+            return None, np.zeros((0, self.channels), dtype=np.int16)
+        # How far the requested end lies before the last captured frame
+        behind = max(0.0, at - (time.time() - seconds_ago))
+        end = written - int(round(behind * self.samplerate))
+        start = end - int(round(seconds * self.samplerate))
+        first, data = self.ring.snapshot(start, end)
+        return at - (written - first) / self.samplerate, data
+
+
+class _DeviceTrack:
+    """Per-device state of a MultiDeviceRecorder: timing, alignment and corrected frames."""
+
+    def __init__(self, device, channels: int, samplerate: int):
+        self.device = device
+        self.channels = channels
+        self.estimator = ClockDriftEstimator(samplerate)
+        self.corrector = DriftCorrector(channels)
+        self.pending = []  # (adc_time, arrival_time, block) until every device has started
+        self.started = None  # time of the first captured frame
+        self.frames_in = 0  # frames captured, including dropped ones
+        self.skip = 0  # leading frames still to discard for alignment
+        self.offset = 0  # frames discarded at the start for alignment
+        self.trimmed = 0  # frames discarded in total (start and late frames after padding)
+        self.missing = 0  # frames dropped since the last queued block (callback side)
+        self.out = []  # corrected frames waiting to be written
+        self.buffered = 0
+        self.padded_frames = 0
+
+    def take(self, frames: int):
+        """Remove and return the first `frames` corrected frames, zero-padded if short."""
+        chunks, needed = [], frames
+        while needed and self.out:
+            head = self.out[0]
+            if len(head) <= needed:
+                chunks.append(self.out.pop(0))
+                needed -= len(head)
+            else:
+                chunks.append(head[:needed])
+                self.out[0] = head[needed:]
+                needed = 0
+        if needed:
+            chunks.append(np.zeros((needed, self.channels), dtype=np.float32))
+            self.padded_frames += needed
+            # If the device catches up, its frames for the padded stretch are late: drop them
+            self.skip += needed
+        self.buffered -= frames - needed
+        return chunks[0] if len(chunks) == 1 else np.concatenate(chunks)
+
+
+class MultiDeviceRecorder:
+    """Record from several input devices at once, aligned to a common timeline.
+
+    One stream is opened per device. Every block is timestamped (with the
+    PortAudio ADC time when all devices report one, otherwise with its
+    arrival time) and queued for a writer thread, which:
+
+    - drops the leading frames of the devices that started first, so all
+      devices begin at the same instant;
+    - estimates each device's true sample rate from its timestamps and
+      resamples it onto the clock of the first device, so the tracks stay
+      aligned however long the recording;
+    - writes one file per device, or with a single path one interleaved
+      file holding every device's channels in order.
+
+    Memory is bounded by `max_queued_blocks` per device; a device that falls
+    that far behind is padded with silence (`padded_frames`) rather than
+    holding the others back.
+    """
+
+    def __init__(self, file_paths, samplerate: int, devices, channels=1,
+                 blocksize: int = DEFAULT_BLOCKSIZE,
+                 max_queued_blocks: int = DEFAULT_WRITE_QUEUE_BLOCKS,
+                 subtype: str = None, engine=None, start_timeout: float = 5.0):
+        self.devices = list(devices)
+        if isinstance(channels, int):
+            channels = [channels] * len(self.devices)
+        self.file_paths = list(file_paths)
+        if len(self.file_paths) not in (1, len(self.devices)):
+            raise ValueError("Give one file path per device, or one path for an interleaved file")
+        self.interleaved = len(self.file_paths) == 1 and len(self.devices) > 1
+        self.samplerate = samplerate
+        self.blocksize = blocksize
+        self.subtype = subtype
+        self.engine = engine
+        self.start_timeout = start_timeout
+        self.max_buffered = max(1, max_queued_blocks) * blocksize
+        self.tracks = [_DeviceTrack(device, count, samplerate) for device, count in zip(self.devices, channels)]
+        self._queue = queue.Queue(maxsize=max(1, max_queued_blocks) * len(self.devices))
+        self._aligned = threading.Event()
+        self._done = threading.Event()
+        self._stopped = threading.Event()
+        self._target = None
+        self._error = None
+        self.clock = None
+        self.frames_written = 0
+        self.dropped_blocks = 0
+        self.overflows = 0
+        outputs = [sum(channels)] if self.interleaved else channels
+        self.peak = [0.0] * len(outputs)
+        self._sum_squares = [0.0] * len(outputs)
+        self._hashes = [hashlib.sha256() for _ in outputs]
+
+    @property
+    def output_channels(self) -> list:
+        """Channel count of each output file."""
+        if self.interleaved:
+            return [sum(track.channels for track in self.tracks)]
+        return [track.channels for track in self.tracks]
+
+    def _callback(self, index, indata, frames, time_info, status):
+        track = self.tracks[index]
+        if status.input_overflow:
+            self.overflows += 1
+        adc = getattr(time_info, 'inputBufferAdcTime', 0.0) if time_info is not None else 0.0
+        try:
+            self._queue.put_nowait((index, adc, time.perf_counter(), track.missing, indata.copy()))
+            track.missing = 0
+        except queue.Full:
+            # Remember the gap so the writer keeps this device's timeline intact
+            track.missing += frames
+            self.dropped_blocks += 1
+        if self._done.is_set() or self._stopped.is_set():
+            raise sd.CallbackStop
+
+    def _align(self):
+        """Pick the clock, trim every device to the latest start and replay the early blocks."""
+        self.clock = "adc" if all(t.pending[0][0] > 0 for t in self.tracks) else "arrival"
+        for track in self.tracks:
+            adc, arrival, block = track.pending[0]
+            # An arrival time stamps the end of its block
+            track.started = adc if self.clock == "adc" else arrival - len(block) / self.samplerate
+        start = max(track.started for track in self.tracks)
+        for track in self.tracks:
+            track.skip = track.offset = int(round((start - track.started) * self.samplerate))
+            pending, track.pending = track.pending, []
+            for adc, arrival, block in pending:
+                self._feed(track, adc, arrival, block)
+        self._aligned.set()
+
+    def _feed(self, track, adc, arrival, block):
+        timestamp = adc if self.clock == "adc" else arrival - len(block) / self.samplerate
+        track.estimator.add(timestamp, track.frames_in)
+        track.frames_in += len(block)
+        if track.skip:
+            cut = min(track.skip, len(block))
+            track.skip -= cut
+            track.trimmed += cut
+            block = block[cut:]
+        # Input frames per output frame: the ratio of this device's clock to the
+        # reference (first) device's, nudged towards where the clock fits put it
+        reference = self.tracks[0]
+        ratio = track.estimator.rate / reference.estimator.rate
+        if track is not reference:
+            ratio += self._position_error(track) / (ALIGNMENT_SERVO_SECONDS * self.samplerate)
+            ratio = min(max(ratio, 1 - MAX_CLOCK_DRIFT), 1 + MAX_CLOCK_DRIFT)
+        out = track.corrector.process(block, ratio)
+        if len(out):
+            track.out.append(out)
+            track.buffered += len(out)
+
+    def _position_error(self, track) -> float:
+        """Frames by which `track` reads behind the position its clock fit predicts (0 until fitted)."""
+        reference = self.tracks[0]
+        # The reference passes through unresampled, so output frame n is its input frame n
+        when = reference.estimator.time_at(reference.trimmed + track.corrector.frames_out)
+        ideal = track.estimator.frame_at(when) if when is not None else None
+        if ideal is None:
+            return 0.0
+        return ideal - (track.trimmed + track.corrector.position)
+
+    def _drain(self, files, final=False):
+        """Write the frames every device has produced (or, past the memory bound, pad the laggards)."""
+        ready = min(track.buffered for track in self.tracks)
+        if not final and max(track.buffered for track in self.tracks) > self.max_buffered:
+            ready = max(track.buffered for track in self.tracks) - self.max_buffered // 2
+        if self._target is not None:
+            ready = min(ready, self._target - self.frames_written)
+        if ready <= 0:
+            return
+        chunks = [track.take(ready) for track in self.tracks]
+        outputs = [np.concatenate(chunks, axis=1)] if self.interleaved else chunks
+        start = time.perf_counter()
+        for i, (f, data) in enumerate(zip(files, outputs)):
+            pcm = pcm16(data)
+            f.write(pcm if f.subtype == CAPTURE_PCM16 else data)
+            self.peak[i] = max(self.peak[i], float(np.max(np.abs(data))))
+            self._sum_squares[i] += float(np.dot(data.ravel(), data.ravel()))
+            self._hashes[i].update(pcm.tobytes())
+        metrics.observe("input.disk_write", time.perf_counter() - start)
+        self.frames_written += ready
+        if self._target is not None and self.frames_written >= self._target:
+            self._done.set()
+
+    def _write_loop(self, files):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            if self._error is not None:
+                # Keep draining so the capture side never blocks
+                continue
+            index, adc, arrival, gap, block = item
+            track = self.tracks[index]
+            try:
+                if gap:
+                    # Frames lost to a full queue are kept as silence, just before this block
+                    silence = np.zeros((gap, track.channels), dtype=np.float32)
+                    gap_arrival = arrival - len(block) / self.samplerate
+                    gap_adc = adc - gap / self.samplerate if adc else adc
+                    self._route(track, gap_adc, gap_arrival, silence)
+                self._route(track, adc, arrival, block)
+                if self._aligned.is_set():
+                    self._drain(files)
+            except Exception as e:
+                self._error = e
+        if self._error is None and self._aligned.is_set():
+            try:
+                self._drain(files, final=True)
+            except Exception as e:
+                self._error = e
+
+    def _route(self, track, adc, arrival, block):
+        if self._aligned.is_set():
+            self._feed(track, adc, arrival, block)
+            return
+        track.pending.append((adc, arrival, block))
+        if all(t.pending for t in self.tracks):
+            self._align()
+
+    def rms(self, output: int = 0) -> float:
+        """RMS level of an output file so far (full scale = 1.0)."""
+        samples = self.frames_written * self.output_channels[output]
+        return (self._sum_squares[output] / samples) ** 0.5 if samples else 0.0
+
+    def sha256(self, output: int = 0) -> str:
+        """Hex digest of the samples written to an output file, as 16-bit PCM."""
+        return self._hashes[output].hexdigest()
+
+    def stats(self) -> dict:
+        """Alignment and drift of each device: offset trimmed at the start, drift in ppm, padding."""
+        reference = self.tracks[0].estimator.rate
+        return {
+            "clock": self.clock,
+            "frames_written": self.frames_written,
+            "dropped_blocks": self.dropped_blocks,
+            "devices": [{"device": track.device,
+                         "offset_frames": track.offset,
+                         "drift_ppm": round((track.estimator.rate / reference - 1) * 1e6, 1),
+                         "padded_frames": track.padded_frames} for track in self.tracks],
+        }
+
+    def record(self, duration: float = None) -> int:
+        """Record for `duration` seconds (or until stop()); returns frames written per file."""
+        self._target = None if duration is None else int(duration * self.samplerate)
+        with ExitStack() as files_stack:
+            files = [files_stack.enter_context(sf.SoundFile(
+                path, mode='w', samplerate=self.samplerate, channels=count, subtype=self.subtype))
+                for path, count in zip(self.file_paths, self.output_channels)]
+            writer = threading.Thread(target=self._write_loop, args=(files,),
+                                      name="audio-multi-recorder-writer", daemon=True)
+            writer.start()
+            try:
+                if self._target != 0:
+                    self._capture()
+            finally:
+                self._queue.put(None)
+                writer.join()
+
+        if self._error is not None:
+            raise self._error
+        return self.frames_written
+
+    def _capture(self):
+        open_stream = self.engine.input_stream if self.engine else sd.InputStream
+        with ExitStack() as streams:
+            opened_at = time.perf_counter()
+            # Open every stream first and start them together, so their start times are close
+            opened = [streams.enter_context(closing(open_stream(
+                samplerate=self.samplerate,
+                channels=track.channels,
+                dtype='float32',
+                blocksize=self.blocksize,
+                device=track.device,
+                callback=functools.partial(self._callback, index),
+                finished_callback=self._done.set
+            ))) for index, track in enumerate(self.tracks)]
+            metrics.observe("input.device_open", time.perf_counter() - opened_at)
+            for stream in opened:
+                stream.start()
+            if not self._aligned.wait(self.start_timeout):
+                silent = [str(t.device) for t in self.tracks if not t.pending]
+                raise RuntimeError(f"No audio from device(s) {', '.join(silent)} "
+                                   f"within {self.start_timeout} seconds")
+            while not self._done.wait(0.1):
+                if self._stopped.is_set() or self._error is not None:
+                    break
+
+    def stop(self):
+        """Stop recording early; everything captured so far is kept."""
+        self._stopped.set()
@@ -0,0 +1,417 @@
+#!/usr/bin/env python3
+"""Throughput and latency benchmarks for the audio pipeline.
+
+Runs against the virtual backend in `virtual_backend.py`, so no audio
+hardware or network access is needed:
+
+    python benchmarks/bench_audio.py --output results.json
+    python benchmarks/bench_audio.py --compare results.json
+
+Results are written as JSON; `--compare` reports the change of every metric
+against an earlier run and exits non-zero if any got worse by more than
+`--threshold`.
+"""
+import argparse
+import asyncio
+import base64
+import contextlib
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import types
+from datetime import datetime
+from pathlib import Path
+from unittest.mock import patch
+import numpy as np
+import soundfile as sf
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).parent))
+import virtual_backend
+from audio_buffers import JitterBuffer, PcmRingBuffer, DROP_OLDEST
+from audio_devices import OUTPUT
+from audio_encoder import FORMATS, encode_bytes, encode_file
+from audio_engine import AudioEngine, _DeviceStream
+from audio_streams import StreamingPlayer, StreamingRecorder
+
+RATE = 48000
+BLOCKSIZE = 1024
+CALLBACK_BLOCKS = 2000
+MIXER_VOICES = (1, 4, 16)
+
+# Metric name suffixes where a larger value is an improvement; everything else is a cost
+HIGHER_IS_BETTER = ("mb_per_s", "x_realtime")
+
+
+def _test_signal(seconds, channels=2):
+    t = np.arange(int(seconds * RATE)) / RATE
+    mono = 0.3 * np.sin(2 * np.pi * 220 * t) + 0.01 * np.random.default_rng(0).standard_normal(len(t))
+    return np.repeat(mono[:, None], channels, axis=1).astype(np.float32)
+
+
+def _stop_after(callback, blocks):
+    """Wrap a stream callback so the stream stops after `blocks` calls."""
+    import sounddevice as sd
+    calls = [0]
+
+    def wrapped(*args):
+        callback(*args)
+        calls[0] += 1
+        if calls[0] >= blocks:
+            raise sd.CallbackStop
+    return wrapped
+
+
+def _run_callback(stream_cls, callback, dtype, channels, blocks=CALLBACK_BLOCKS):
+    """Drive `callback` for `blocks` blocks as fast as possible; returns its CPU stats."""
+    stream = stream_cls(samplerate=RATE, blocksize=BLOCKSIZE, channels=channels, dtype=dtype,
+                        callback=_stop_after(callback, blocks), speed=0)
+    stream.start()
+    stream._thread.join()
+    return stream.timer.stats(BLOCKSIZE, RATE)
+
+
+def bench_callbacks(seconds, workdir):
+    """CPU time per block of each real-time callback."""
+    results = {}
+
+    recorder = StreamingRecorder(os.path.join(workdir, "cb.wav"), RATE, 2, max_queued_blocks=CALLBACK_BLOCKS)
+    recorder._opened_at = time.perf_counter()
+    recorder._remaining = None
+    results["streaming_recorder"] = _run_callback(virtual_backend.VirtualInputStream, recorder._callback,
+                                                  'float32', 2)
+
+    player = StreamingPlayer(os.path.join(workdir, "unused.wav"), prefetch_blocks=CALLBACK_BLOCKS)
+    player._opened_at = time.perf_counter()
+    block = np.zeros((BLOCKSIZE, 2), dtype=np.float32)
+    for _ in range(CALLBACK_BLOCKS):
+        player._queue.put(block)
+    results["streaming_player"] = _run_callback(virtual_backend.VirtualOutputStream, player._callback,
+                                                'float32', 2)
+
+    ring = PcmRingBuffer(RATE * 2, 2, policy=DROP_OLDEST)
+    results["live_capture_ring"] = _run_callback(
+        virtual_backend.VirtualInputStream, lambda indata, frames, t, status: ring.write(indata), 'int16', 2)
+
+    jitter = JitterBuffer(CALLBACK_BLOCKS * BLOCKSIZE, 1, target_frames=BLOCKSIZE)
+    jitter.write(np.zeros((CALLBACK_BLOCKS * BLOCKSIZE, 1), dtype=np.int16))
+    results["live_jitter_fill"] = _run_callback(
+        virtual_backend.VirtualOutputStream, lambda outdata, frames, t, status: jitter.fill(outdata), 'int16', 1)
+
+    # Engine output mixing several voices (mono and stereo, half with non-unity gain)
+    for voices in MIXER_VOICES:
+        engine = AudioEngine(blocksize=BLOCKSIZE)
+        device_stream = _DeviceStream(engine, OUTPUT, None, RATE)
+        clients = []
+        for i in range(voices):
+            voice = engine.output_stream(samplerate=RATE, channels=1 + i % 2, blocksize=BLOCKSIZE // 2,
+                                         callback=lambda outdata, *args: outdata.fill(0.01),
+                                         gain=0.5 if i % 2 else 1.0)
+            voice._reserve(BLOCKSIZE)
+            clients.append(voice)
+        device_stream.clients = tuple(clients)
+        results[f"mixer_{voices}_voices"] = _run_callback(virtual_backend.VirtualOutputStream,
+                                                          device_stream._callback, 'float32', 2)
+
+    return {name: {k: v for k, v in stats.items() if k != "blocks"} for name, stats in results.items()}
+
+
+def bench_recorder(seconds, workdir):
+    """StreamingRecorder throughput to disk with an unpaced virtual microphone."""
+    results = {}
+    for subtype in ("PCM_16", "FLOAT"):
+        path = os.path.join(workdir, f"record_{subtype}.wav")
+        blocks = int(seconds * RATE / BLOCKSIZE) + 1
+        with virtual_backend.install(speed=0):
+            recorder = StreamingRecorder(path, RATE, 2, blocksize=BLOCKSIZE,
+                                         max_queued_blocks=blocks, subtype=subtype)
+            start = time.perf_counter()
+            recorder.record(seconds)
+            elapsed = time.perf_counter() - start
+        size = os.path.getsize(path)
+        results[subtype.lower()] = {
+            "mb_per_s": size / elapsed / 1e6,
+            "x_realtime": seconds / elapsed,
+            "dropped_blocks": recorder.dropped_blocks,
+        }
+    return results
+
+
+def bench_playback(seconds, workdir):
+    """StreamingPlayer decode throughput into a null sink, per file format."""
+    data = _test_signal(seconds)
+    results = {}
+    for fmt, (ext, sf_format, subtype) in FORMATS.items():
+        path = os.path.join(workdir, f"play{ext}")
+        sf.write(path, data, RATE, format=sf_format, subtype=subtype)
+        with virtual_backend.install(speed=0):
+            player = StreamingPlayer(path, blocksize=BLOCKSIZE)
+            start = time.perf_counter()
+            player.play()
+            elapsed = time.perf_counter() - start
+        # The sink is unpaced, so underruns only mean the decoder was busy; time to EOF is what counts
+        results[fmt] = {"x_realtime": seconds / elapsed}
+    return results
+
+
+def bench_encode(seconds, workdir):
+    """Encode cost per format, in milliseconds per second of audio."""
+    data = _test_signal(seconds)
+    source = os.path.join(workdir, "source.wav")
+    sf.write(source, data, RATE, subtype="PCM_16")
+    results = {}
+    for fmt, (ext, _, _) in FORMATS.items():
+        start = time.perf_counter()
+        encode_file(source, os.path.join(workdir, f"encoded{ext}"), fmt, remove_source=False)
+        elapsed = time.perf_counter() - start
+        results[f"file_{fmt}"] = {"ms_per_audio_s": elapsed * 1000 / seconds}
+
+    pcm = (data * 32767).astype(np.int16)
+    start = time.perf_counter()
+    encode_bytes(pcm, RATE, "flac")
+    results["memory_flac"] = {"ms_per_audio_s": (time.perf_counter() - start) * 1000 / seconds}
+    return results
+
+
+class FakeLiveServer:
+    """Stands in for the Gemini Live service at the SDK session boundary.
+
+    Replies with `reply_seconds` of 24 kHz audio `model_delay` seconds after
+    the first uploaded audio that contains speech-level energy.
+    """
+
+    def __init__(self, model_delay=0.2, reply_seconds=0.5, chunk_seconds=0.1):
+        self.model_delay = model_delay
+        self.reply_seconds = reply_seconds
+        self.chunk_seconds = chunk_seconds
+        self.first_speech_at = None
+        self.uploaded_bytes = 0
+        self.stream_ends = 0
+        self._replied = False
+        self._queue = None
+
+    def client(self, **kwargs):
+        server = self
+
+        class Connection:
+            async def __aenter__(self):
+                server._queue = asyncio.Queue()
+                return server
+
+            async def __aexit__(self, *exc):
+                pass
+
+        return types.SimpleNamespace(aio=types.SimpleNamespace(
+            live=types.SimpleNamespace(connect=lambda **kw: Connection())))
+
+    async def send(self, media_chunks=None, input=None, end_of_turn=False):
+        for chunk in media_chunks or []:
+            pcm = np.frombuffer(base64.b64decode(chunk["data"]), dtype=np.int16)
+            self.uploaded_bytes += pcm.nbytes
+            if not self._replied and len(pcm) and np.sqrt(np.mean((pcm / 32768.0) ** 2)) > 0.05:
+                self._replied = True
+                self.first_speech_at = time.perf_counter()
+                asyncio.get_running_loop().create_task(self._reply())
+
+    async def send_realtime_input(self, audio_stream_end=None, **kwargs):
+        if audio_stream_end:
+            self.stream_ends += 1
+
+    async def _reply(self):
+        await asyncio.sleep(self.model_delay)
+        frames = int(self.chunk_seconds * 24000)
+        t = np.arange(frames) / 24000
+        chunk = (0.3 * 32767 * np.sin(2 * np.pi * 330 * t)).astype(np.int16).tobytes()
+        for _ in range(int(round(self.reply_seconds / self.chunk_seconds))):
+            part = types.SimpleNamespace(text=None, inline_data=types.SimpleNamespace(data=chunk))
+            await self._queue.put(self._message(model_turn=types.SimpleNamespace(parts=[part])))
+        await self._queue.put(self._message(turn_complete=True))
+
+    @staticmethod
+    def _message(model_turn=None, turn_complete=False):
+        return types.SimpleNamespace(
+            server_content=types.SimpleNamespace(model_turn=model_turn, turn_complete=turn_complete,
+                                                 interrupted=False),
+            setup_complete=None)
+
+    async def receive(self):
+        while True:
+            try:
+                message = await asyncio.wait_for(self._queue.get(), 0.1)
+            except asyncio.TimeoutError:
+                return
+            yield message
+            if message.server_content.turn_complete:
+                return
+
+    async def close(self):
+        pass
+
+
+def bench_live(seconds, workdir, onset=1.0, model_delay=0.2):
+    """End-to-end Live latency: speech onset at the mic to reply audio at the speaker."""
+    import audio_server_exp2 as live
+    from audio_metrics import metrics
+
+    server = FakeLiveServer(model_delay=model_delay)
+    first_output = []
+
+    def on_output(outdata, now):
+        if not first_output and np.any(outdata):
+            first_output.append(now)
+
+    async def converse():
+        return await live.gemini_realtime_conversation(duration=max(seconds, onset + 2.0))
+
+    metrics.reset()
+    with virtual_backend.install(speed=1.0, signal=virtual_backend.burst(onset, 1.0), on_output=on_output) as streams, \
+         patch.object(live.genai, 'Client', server.client), \
+         patch.object(live, 'audio_engine', AudioEngine(idle_timeout=0)), \
+         patch.dict(os.environ, {"GOOGLE_API_KEY": "benchmark"}), \
+         contextlib.redirect_stdout(sys.stderr):
+        asyncio.run(converse())
+
+    mic = next(s for s in streams if isinstance(s, virtual_backend.VirtualInputStream))
+    if not first_output or server.first_speech_at is None:
+        return {"error": "no reply audio reached the output"}
+    spoken_at = mic._started_at + onset
+    snapshot = metrics.snapshot()
+    total_ms = (first_output[0] - spoken_at) * 1000
+    return {
+        "end_to_end_ms": total_ms,
+        "pipeline_ms": total_ms - model_delay * 1000,
+        "mic_to_server_ms": (server.first_speech_at - spoken_at) * 1000,
+        "upload_bytes": server.uploaded_bytes,
+        **{f"{stage.split('.', 1)[1]}_p50_ms": stats["p50"] * 1000
+           for stage, stats in snapshot.items() if stage.startswith("live.") and stats["p50"] is not None},
+    }
+
+
+SERVER_SCRIPT = Path(__file__).parent.parent / "audio_server.py"
+STARTUP_RUNS = 5
+
+
+async def _time_startup(env, workdir):
+    """Spawn the stdio server once; returns ms to initialize, first list_tools and first device listing."""
+    from mcp import ClientSession, StdioServerParameters
+    from mcp.client.stdio import stdio_client
+
+    params = StdioServerParameters(command=sys.executable, args=[str(SERVER_SCRIPT)], env=env, cwd=workdir)
+    timings = {}
+    start = time.perf_counter()
+    async with stdio_client(params) as (read, write):
+        async with ClientSession(read, write) as session:
+            await session.initialize()
+            timings["initialize_ms"] = (time.perf_counter() - start) * 1000
+            await session.list_tools()
+            timings["list_tools_ms"] = (time.perf_counter() - start) * 1000
+            # Time since list_tools, i.e. what the first real tool call pays for lazy loading
+            mark = time.perf_counter()
+            await session.call_tool("list_audio_devices", {})
+            timings["first_device_query_ms"] = (time.perf_counter() - mark) * 1000
+    return timings
+
+
+def bench_startup(seconds, workdir):
+    """Cold start of the stdio server: spawn to initialize and to the first list_tools response."""
+    results = {}
+    for variant, extra in (("cold", {"AUDIO_WARMUP": "0"}), ("warmup", {"AUDIO_WARMUP": "1"})):
+        env = dict(os.environ, **extra)
+        runs = [asyncio.run(_time_startup(env, workdir)) for _ in range(STARTUP_RUNS)]
+        results[variant] = {key: float(np.median([r[key] for r in runs])) for key in runs[0]}
+    return results
+
+
+BENCHMARKS = {
+    "callbacks": bench_callbacks,
+    "recorder": bench_recorder,
+    "playback": bench_playback,
+    "encode": bench_encode,
+    "live": bench_live,
+    "startup": bench_startup,
+}
+
+
+def run(names, seconds):
+    workdir = tempfile.mkdtemp(prefix="audio-bench-")
+    results = {}
+    try:
+        for name in names:
+            print(f"Running {name}...", file=sys.stderr)
+            try:
+                results[name] = BENCHMARKS[name](seconds, workdir)
+            except ImportError as e:
+                results[name] = {"skipped": str(e)}
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "seconds": seconds,
+        "results": results,
+    }
+
+
+def _flatten(results, prefix=""):
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(_flatten(value, name + "."))
+        elif isinstance(value, (int, float)):
+            flat[name] = value
+    return flat
+
+
+def compare(current, baseline, threshold):
+    """Print per-metric changes; returns the names of metrics that regressed."""
+    now = _flatten(current["results"])
+    before = _flatten(baseline["results"])
+    regressions = []
+    for name in sorted(now.keys() & before.keys()):
+        old, new = before[name], now[name]
+        if old == 0:
+            continue
+        change = (new - old) / abs(old)
+        worse = -change if name.endswith(HIGHER_IS_BETTER) else change
+        flag = ""
+        if worse > threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(f"{name}: {old:.4g} -> {new:.4g} ({change:+.1%}){flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS), default=list(BENCHMARKS),
+                        help="benchmarks to run (default: all)")
+    parser.add_argument("--seconds", type=float, default=10.0,
+                        help="audio length used by the throughput benchmarks (default: 10)")
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--compare", help="baseline JSON file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="relative change counted as a regression (default: 0.2)")
+    args = parser.parse_args(argv)
+
+    report = run(args.only, args.seconds)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n")
+    else:
+        print(text)
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        if compare(report, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""Virtual PortAudio-like streams for benchmarking without audio hardware.
+
+`VirtualInputStream` feeds a synthetic signal to the stream callback and
+`VirtualOutputStream` drains the callback into a null sink. Both run the
+callback on their own thread, either paced to the stream's sample clock
+(`speed=1.0`), accelerated (`speed>1`) or as fast as possible (`speed=0`),
+and record the CPU time each callback invocation took.
+
+`install()` swaps them in for `sounddevice.InputStream`/`OutputStream` (and
+gives the server a virtual input and output device, plus optional extra
+inputs with drifting clocks) for the duration of a `with` block.
+"""
+import threading
+import time
+from types import SimpleNamespace
+from contextlib import contextmanager
+from unittest.mock import patch
+import numpy as np
+import sounddevice as sd
+
+DEFAULT_RATE = 48000
+DEFAULT_BLOCKSIZE = 1024
+
+
+def tone(frequency: float = 220.0, level: float = 0.1):
+    """Signal generator for a sine tone; returns `f(start_frame, frames, rate) -> float32 array`."""
+    def generate(start, frames, rate):
+        t = np.arange(start, start + frames) / rate
+        return (level * np.sin(2 * np.pi * frequency * t)).astype(np.float32)
+    return generate
+
+
+def burst(onset: float, length: float, frequency: float = 220.0, level: float = 0.3):
+    """Silence with one tone burst starting `onset` seconds into the stream."""
+    carrier = tone(frequency, level)
+
+    def generate(start, frames, rate):
+        out = np.zeros(frames, dtype=np.float32)
+        first = max(start, int(onset * rate))
+        last = min(start + frames, int((onset + length) * rate))
+        if last > first:
+            out[first - start:last - start] = carrier(first, last - first, rate)
+        return out
+    return generate
+
+
+class CallbackTimer:
+    """Per-invocation CPU time of a stream callback, in nanoseconds."""
+
+    def __init__(self):
+        self.samples = []
+
+    def stats(self, blocksize: int, samplerate: float) -> dict:
+        if not self.samples:
+            return {"blocks": 0}
+        cpu = np.array(self.samples, dtype=float) / 1000.0  # microseconds
+        budget = blocksize / samplerate * 1e6
+        return {
+            "blocks": len(cpu),
+            "mean_us": float(cpu.mean()),
+            "p99_us": float(np.percentile(cpu, 99)),
+            "max_us": float(cpu.max()),
+            "budget_us": budget,
+            "mean_load": float(cpu.mean() / budget),
+        }
+
+
+class _VirtualStream:
+    """Shared start/stop/context-manager behaviour of the virtual streams."""
+
+    def __init__(self, samplerate=None, blocksize=None, device=None, channels=None,
+                 dtype='float32', callback=None, finished_callback=None, latency=None,
+                 speed: float = 1.0, drift_ppm: float = 0.0, epoch: float = None, **kwargs):
+        self.samplerate = float(samplerate or DEFAULT_RATE)
+        # The device clock runs this much fast (or slow, if negative) against the nominal rate
+        self.clock_rate = self.samplerate * (1 + drift_ppm * 1e-6)
+        # Stream times are seconds of virtual time (scaled by speed) since the epoch
+        self.epoch = time.perf_counter() if epoch is None else epoch
+        self.blocksize = blocksize or DEFAULT_BLOCKSIZE
+        self.device = device
+        self.channels = channels or 1
+        self.dtype = dtype
+        self.callback = callback
+        self.finished_callback = finished_callback
+        self.speed = speed
+        self.latency = 0.0
+        self.timer = CallbackTimer()
+        self.frames = 0
+        self.active = False
+        self.closed = False
+        self._stop = threading.Event()
+        self._thread = None
+        self._started_at = None
+
+    @property
+    def time(self):
+        return time.perf_counter() - (self._started_at or time.perf_counter())
+
+    def _stream_time(self, frames):
+        """Virtual time at which frame `frames` of this stream is sampled."""
+        start = (self._started_at - self.epoch) * max(self.speed, 1)
+        return start + frames / self.clock_rate
+
+    def start(self):
+        self._stop.clear()
+        self.active = True
+        self._started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="virtual-audio", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        period = self.blocksize / self.clock_rate
+        deadline = time.perf_counter()
+        status = sd.CallbackFlags()
+        try:
+            while not self._stop.is_set():
+                if self.speed > 0:
+                    deadline += period / self.speed
+                    delay = deadline - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                try:
+                    self._process(status)
+                except sd.CallbackStop:
+                    break
+                self.frames += self.blocksize
+        finally:
+            self.active = False
+            if self.finished_callback is not None:
+                self.finished_callback()
+
+    def _invoke(self, *args):
+        start = time.thread_time_ns()
+        try:
+            self.callback(*args)
+        finally:
+            self.timer.samples.append(time.thread_time_ns() - start)
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    abort = stop
+
+    def close(self):
+        self.stop()
+        self.closed = True
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class VirtualInputStream(_VirtualStream):
+    """Input stream delivering `signal` to the callback block by block.
+
+    The callback gets a `time_info` with `inputBufferAdcTime`. With
+    `shared_timeline`, the signal is generated from the virtual time since
+    the epoch, as if every virtual microphone heard the same source.
+    """
+
+    signal = staticmethod(tone())
+    shared_timeline = False
+
+    def _process(self, status):
+        adc_time = self._stream_time(self.frames)
+        if self.shared_timeline:
+            samples = self.signal(int(round(adc_time * self.samplerate)), self.blocksize, self.samplerate)
+        else:
+            samples = self.signal(self.frames, self.blocksize, self.samplerate)
+        block = np.repeat(samples[:, None], self.channels, axis=1)
+        if np.dtype(self.dtype).kind != 'f':
+            block = np.clip(block * 32768, -32768, 32767).astype(self.dtype)
+        time_info = SimpleNamespace(inputBufferAdcTime=adc_time, currentTime=adc_time)
+        self._invoke(block, self.blocksize, time_info, status)
+
+
+class VirtualOutputStream(_VirtualStream):
+    """Output stream that pulls blocks from the callback and discards them.
+
+    `on_output(outdata, stream_time)` is called with every block, e.g. to
+    timestamp the first non-silent output.
+    """
+
+    on_output = None
+
+    def _process(self, status):
+        outdata = np.zeros((self.blocksize, self.channels), dtype=self.dtype)
+        self._invoke(outdata, self.blocksize, None, status)
+        if self.on_output is not None:
+            self.on_output(outdata, time.perf_counter())
+
+
+_DEVICES = [
+    {'name': 'Virtual Input', 'index': 0, 'hostapi': 0, 'max_input_channels': 2,
+     'max_output_channels': 0, 'default_samplerate': float(DEFAULT_RATE)},
+    {'name': 'Virtual Output', 'index': 1, 'hostapi': 0, 'max_input_channels': 0,
+     'max_output_channels': 2, 'default_samplerate': float(DEFAULT_RATE)},
+]
+
+
+def _device_table(inputs):
+    """The two standard devices plus `inputs - 1` extra virtual inputs (indices 2, 3, ...)."""
+    devices = [dict(d) for d in _DEVICES]
+    for n in range(2, inputs + 1):
+        devices.append(dict(_DEVICES[0], name=f'Virtual Input {n}', index=len(devices)))
+    return devices
+
+
+@contextmanager
+def install(speed: float = 1.0, signal=None, on_output=None, inputs: int = 1,
+            drift_ppm: dict = None, shared_timeline: bool = False):
+    """Route sounddevice streams and device queries to the virtual backend.
+
+    `inputs` adds extra virtual input devices, and `drift_ppm` maps device
+    indices to a clock error in ppm. Yields a list that collects every stream
+    opened inside the block, so callers can read their callback timings
+    afterwards.
+    """
+    streams = []
+    devices = _device_table(inputs)
+    epoch = time.perf_counter()
+
+    def query_devices(device=None, kind=None):
+        if device is None and kind is not None:
+            device = 0 if kind == 'input' else 1
+        if device is not None:
+            return dict(devices[device])
+        return [dict(d) for d in devices]
+
+    def make(cls):
+        class Stream(cls):
+            pass
+        if signal is not None:
+            Stream.signal = staticmethod(signal)
+        if on_output is not None:
+            Stream.on_output = staticmethod(on_output)
+        Stream.shared_timeline = shared_timeline
+
+        def factory(*args, **kwargs):
+            device = kwargs.get('device')
+            stream = Stream(*args, speed=speed, epoch=epoch,
+                            drift_ppm=(drift_ppm or {}).get(device, 0.0), **kwargs)
+            streams.append(stream)
+            return stream
+        return factory
+
+    with patch.object(sd, 'InputStream', make(VirtualInputStream)), \
+         patch.object(sd, 'OutputStream', make(VirtualOutputStream)), \
+         patch.object(sd, 'query_devices', query_devices), \
+         patch.object(sd, 'query_hostapis', lambda index=None: [{'name': 'Virtual'}]), \
+         patch.object(sd, 'check_input_settings', lambda **kwargs: None), \
+         patch.object(sd, 'check_output_settings', lambda **kwargs: None):
+        yield streams
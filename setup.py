@@ -16,7 +16,7 @@ setup(
     ],
     entry_points={
         'console_scripts': [
-            'audio-mcp-server=audio_server:mcp.run',
+            'audio-mcp-server=audio_server:main',
         ],
     },
     author='Your Name', # Replace with your name
@@ -0,0 +1,12 @@
+import pytest
+from pathlib import Path
+
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from audio_executors import shutdown_executors
+
+@pytest.fixture(scope="session", autouse=True)
+def executors():
+    """Stop the shared thread pools and encoder processes once the test session ends."""
+    yield
+    shutdown_executors()
@@ -0,0 +1,167 @@
+import asyncio
+import threading
+import pytest
+from pathlib import Path
+import numpy as np
+
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from audio_buffers import (AdaptiveBatcher, CallbackStats, HistoryBuffer, JitterBuffer,
+                           PcmRingBuffer, DROP_NEWEST, DROP_OLDEST)
+
+# --- Test Cases ---
+
+def test_ring_buffer_wraps_and_preserves_order():
+    ring = PcmRingBuffer(capacity_frames=8, channels=1)
+    for i in range(5):
+        ring.write(np.full((3, 1), i, dtype='int16'))
+        np.testing.assert_array_equal(ring.read(), np.full((3, 1), i, dtype='int16'))
+
+    assert ring.stats()["dropped_frames"] == 0
+
+def test_ring_buffer_scales_float_input_in_place():
+    ring = PcmRingBuffer(capacity_frames=4, channels=2)
+    ring.write(np.array([[0.5, -0.5], [1.0, -1.0]], dtype='float32'))
+
+    np.testing.assert_array_equal(ring.read(), [[16383, -16383], [32767, -32767]])
+
+def test_ring_buffer_clips_float_overs():
+    ring = PcmRingBuffer(capacity_frames=4, channels=1)
+    ring.write(np.array([[1.5], [-2.0], [0.25]], dtype='float32'))
+    scratch = ring._scratch
+    ring.write(np.array([[3.0]], dtype='float32'))
+
+    np.testing.assert_array_equal(ring.read(), [[32767], [-32767], [8191], [32767]])
+    assert ring._scratch is scratch
+
+def test_ring_buffer_overflow_policies():
+    oldest = PcmRingBuffer(capacity_frames=4, policy=DROP_OLDEST)
+    oldest.write(np.arange(6, dtype='int16').reshape(-1, 1))
+    np.testing.assert_array_equal(oldest.read().ravel(), [2, 3, 4, 5])
+    assert oldest.stats()["dropped_frames"] == 2
+
+    newest = PcmRingBuffer(capacity_frames=4, policy=DROP_NEWEST)
+    newest.write(np.arange(3, dtype='int16').reshape(-1, 1))
+    assert newest.write(np.arange(3, 6, dtype='int16').reshape(-1, 1)) == 1
+    np.testing.assert_array_equal(newest.read().ravel(), [0, 1, 2, 3])
+    assert newest.stats()["dropped_frames"] == 2
+
+@pytest.mark.asyncio
+async def test_ring_buffer_read_async_wakes_on_write_and_close():
+    ring = PcmRingBuffer(capacity_frames=16)
+    ring.bind()
+    reader = asyncio.create_task(ring.read_async())
+    await asyncio.sleep(0)
+    threading.Thread(target=ring.write, args=(np.ones((4, 1), dtype='int16'),)).start()
+
+    assert len(await asyncio.wait_for(reader, timeout=2)) == 4
+
+    ring.close()
+    assert await asyncio.wait_for(ring.read_async(), timeout=2) is None
+
+def test_callback_stats_counts_xruns():
+    class Status:
+        input_overflow = True
+        input_underflow = False
+        output_overflow = False
+        output_underflow = False
+
+    stats = CallbackStats()
+    stats.record(Status(), 2000)
+    stats.record(None, 4000)
+
+    result = stats.stats()
+    assert result["callbacks"] == 2
+    assert result["input_overflows"] == 1
+    assert result["mean_callback_us"] == 3.0
+    assert result["max_callback_us"] == 4.0
+
+def test_jitter_buffer_waits_for_target_depth():
+    jitter = JitterBuffer(capacity_frames=100, target_frames=10)
+    out = np.empty((4, 1), dtype='int16')
+
+    jitter.write(np.arange(1, 7, dtype='int16').reshape(-1, 1))
+    jitter.fill(out)
+    assert not out.any()
+
+    jitter.write(np.arange(7, 13, dtype='int16').reshape(-1, 1))
+    jitter.fill(out)
+    np.testing.assert_array_equal(out.ravel(), [1, 2, 3, 4])
+    assert jitter.stats()["underruns"] == 0
+
+def test_jitter_buffer_counts_underruns_but_not_flushed_tails():
+    jitter = JitterBuffer(capacity_frames=100, target_frames=2)
+    out = np.empty((4, 1), dtype='int16')
+
+    jitter.write(np.ones((3, 1), dtype='int16'))
+    jitter.fill(out)
+    np.testing.assert_array_equal(out.ravel(), [1, 1, 1, 0])
+    assert jitter.underruns == 1
+
+    # A flushed tail shorter than the target still plays and is not an underrun
+    jitter.write(np.full((1, 1), 5, dtype='int16'))
+    jitter.flush()
+    jitter.fill(out)
+    np.testing.assert_array_equal(out.ravel(), [5, 0, 0, 0])
+    assert jitter.underruns == 1
+    assert jitter.played_frames == 4
+
+def test_jitter_buffer_clear_drops_pending_audio():
+    jitter = JitterBuffer(capacity_frames=100, target_frames=1)
+    jitter.write(np.ones((8, 1), dtype='int16'))
+    jitter.clear()
+    out = np.empty((4, 1), dtype='int16')
+    jitter.fill(out)
+
+    assert not out.any()
+    assert jitter.available == 0
+
+def test_batcher_grows_with_send_rtt_within_bounds():
+    batcher = AdaptiveBatcher(32000, min_latency=0.04, max_latency=0.5, initial_latency=0.16)
+    assert batcher.target_bytes == 5120
+
+    batcher.record_send(5120, rtt=0.01, oldest=0.0, done=0.2)
+    assert batcher.target_latency == pytest.approx(0.04)
+
+    for _ in range(50):
+        batcher.record_send(5120, rtt=0.15, oldest=0.0, done=0.2)
+    assert batcher.target_latency == pytest.approx(0.3, abs=0.01)
+
+    batcher.record_send(5120, rtt=0.15, oldest=0.0, done=0.2, backlog=2.0)
+    assert batcher.target_latency == 0.5
+
+def test_batcher_releases_old_audio_before_target_size():
+    batcher = AdaptiveBatcher(32000, min_latency=0.1, max_latency=0.3)
+    batcher.add(b"\x00" * 100, captured_at=10.0)
+    batcher.add(b"\x00" * 100, captured_at=10.1)
+
+    assert not batcher.ready(now=10.2)
+    assert batcher.ready(now=10.3)
+    data, oldest = batcher.take()
+    assert len(data) == 200
+    assert oldest == 10.0
+    assert len(batcher) == 0
+
+def test_batcher_reports_mic_to_send_latency():
+    batcher = AdaptiveBatcher(32000, min_latency=0.04, max_latency=0.5)
+    batcher.record_send(1000, rtt=0.02, oldest=1.0, done=1.2)
+    batcher.record_send(1000, rtt=0.02, oldest=2.0, done=2.4)
+
+    stats = batcher.stats()
+    assert stats["batches"] == 2
+    assert stats["bytes_sent"] == 2000
+    assert stats["mean_mic_to_send_ms"] == pytest.approx(300)
+    assert stats["max_mic_to_send_ms"] == pytest.approx(400)
+
+def test_history_buffer_keeps_latest_window():
+    history = HistoryBuffer(100, channels=1)
+    for start in range(0, 250, 25):
+        history.write(np.arange(start, start + 25, dtype=np.int16).reshape(-1, 1))
+
+    assert history.window() == (150, 250)
+    first, data = history.snapshot(120, 180)
+    assert first == 150
+    assert data[:, 0].tolist() == list(range(150, 180))
+    # Snapshots do not consume anything
+    assert history.snapshot(240, 300)[1][:, 0].tolist() == list(range(240, 250))
+    assert history.stats()["aged_out_frames"] == 150
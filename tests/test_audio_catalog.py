@@ -0,0 +1,59 @@
+import pytest
+from datetime import datetime
+from pathlib import Path
+
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from audio_catalog import RecordingCatalog
+
+@pytest.fixture
+def catalog(tmp_path):
+    catalog = RecordingCatalog(str(tmp_path / "audio" / "recordings.db"))
+    yield catalog
+    catalog.close()
+
+def _add(catalog, name, created, seconds, rms_db, **fields):
+    return catalog.add(f"/audio/{name}", 16000, 1, int(seconds * 16000),
+                       created=created, rms_db=rms_db, peak_db=rms_db + 3, **fields)
+
+# --- Test Cases ---
+
+def test_catalog_add_and_get(catalog, tmp_path):
+    audio_file = tmp_path / "take.wav"
+    audio_file.write_bytes(b"\0" * 100)
+
+    catalog.add(audio_file, 48000, 2, 96000, device="ALSA:Mic", sha256="abc")
+
+    row = catalog.get(audio_file)
+    assert row["duration"] == 2.0
+    assert row["size"] == 100
+    assert row["device"] == "ALSA:Mic"
+    assert catalog.count() == 1
+
+def test_catalog_find_filters(catalog):
+    _add(catalog, "a.ogg", "2025-01-01T10:00:00", 1.0, -60.0)
+    _add(catalog, "b.ogg", "2025-01-02T10:00:00", 5.0, -20.0)
+    _add(catalog, "c.ogg", "2025-01-03T10:00:00", 30.0, -25.0)
+
+    assert [r["path"] for r in catalog.find()] == ["/audio/c.ogg", "/audio/b.ogg", "/audio/a.ogg"]
+    assert [r["path"] for r in catalog.find(since="2025-01-02")] == ["/audio/c.ogg", "/audio/b.ogg"]
+    assert [r["path"] for r in catalog.find(until=datetime(2025, 1, 1, 12))] == ["/audio/a.ogg"]
+    assert [r["path"] for r in catalog.find(min_duration=2, max_duration=10)] == ["/audio/b.ogg"]
+    assert [r["path"] for r in catalog.find(min_rms_db=-40)] == ["/audio/c.ogg", "/audio/b.ogg"]
+    assert [r["path"] for r in catalog.find(limit=1, offset=1)] == ["/audio/b.ogg"]
+
+def test_catalog_move_after_encoding(catalog, tmp_path):
+    encoded = tmp_path / "take.ogg"
+    encoded.write_bytes(b"\0" * 10)
+    _add(catalog, "take.wav", "2025-01-01T10:00:00", 1.0, -30.0, format="wav")
+
+    catalog.move("/audio/take.wav", encoded, format="ogg")
+
+    assert catalog.get("/audio/take.wav") is None
+    row = catalog.get(encoded)
+    assert row["format"] == "ogg"
+    assert row["size"] == 10
+
+def test_catalog_rejects_unknown_fields(catalog):
+    with pytest.raises(ValueError):
+        catalog.add("/audio/x.wav", 16000, 1, 16000, colour="blue")
@@ -0,0 +1,131 @@
+import asyncio
+import gc
+import pytest
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from mcp import types
+from audio_clients import ClientBusy, ClientLimiter
+
+class Session:
+    """Stand-in for an MCP ServerSession (only identity matters)."""
+
+class FakeServer:
+    """Just enough of the low-level MCP server for ClientLimiter.install."""
+
+    def __init__(self, handler):
+        self.request_handlers = {types.CallToolRequest: handler}
+        self.session = None
+
+    @property
+    def request_context(self):
+        if self.session is None:
+            raise LookupError("no request")
+        return SimpleNamespace(session=self.session)
+
+@pytest.fixture
+def limiter():
+    return ClientLimiter(max_calls=2)
+
+# --- Test Cases ---
+
+def test_slots_are_counted_per_client(limiter):
+    first, second = Session(), Session()
+
+    with limiter.slot(first), limiter.slot(first):
+        with pytest.raises(ClientBusy):
+            with limiter.slot(first):
+                pass
+        # Another client is not affected by the first one's load
+        with limiter.slot(second):
+            assert limiter.clients() == {"client-1": 2, "client-2": 1}
+
+    assert limiter.clients() == {"client-1": 0, "client-2": 0}
+    assert limiter.rejected == 1
+
+def test_clients_forgotten_with_their_session(limiter):
+    session = Session()
+    assert limiter.name(session) == "client-1"
+    assert limiter.name(session) == "client-1"
+
+    del session
+    gc.collect()
+    assert limiter.clients() == {}
+
+@pytest.mark.asyncio
+async def test_installed_handler_rejects_calls_over_the_limit(limiter):
+    release = asyncio.Event()
+
+    async def handler(request):
+        await release.wait()
+        return "done"
+
+    server = FakeServer(handler)
+    limiter.install(server)
+    limited = server.request_handlers[types.CallToolRequest]
+
+    async def call(session):
+        # Each call runs in its own task, as the server does, with its own request context
+        server.session = session
+        return await limited(None)
+
+    client = Session()
+    running = [asyncio.create_task(call(client)) for _ in range(2)]
+    await asyncio.sleep(0)
+    rejected = await call(client)
+    release.set()
+
+    assert await asyncio.gather(*running) == ["done", "done"]
+    assert rejected.root.isError
+    assert "client-1 already has 2 tool calls in progress" in rejected.root.content[0].text
+
+def test_conversations_scoped_per_client_in_daemon_mode(limiter):
+    import audio_server
+    server = FakeServer(None)
+    session = Session()
+
+    with patch('audio_server.mcp', SimpleNamespace(_mcp_server=server)):
+        assert audio_server._conversation_key("chat") == "chat"
+        with patch('audio_server.client_limiter', limiter):
+            # Outside a request there is no client to scope by
+            assert audio_server._conversation_key("chat") == "chat"
+            server.session = session
+            assert audio_server._conversation_key("chat") == "client-1/chat"
+
+@pytest.mark.asyncio
+async def test_background_job_keeps_its_slot(limiter):
+    import audio_server
+    from audio_jobs import JobManager
+    server = FakeServer(None)
+    manager = JobManager()
+    manager.owner = lambda: limiter.hold_current(server)
+    step = asyncio.Event()
+
+    @manager.background("device")
+    async def tool() -> str:
+        await step.wait()
+        return "done"
+
+    client, other = Session(), Session()
+    server.session = client
+    with limiter.slot(client):
+        message = await tool(background=True)
+    job_id = message.split("background job ")[1].split(".")[0]
+    # The call has returned, but its job still counts against the client
+    assert limiter.clients() == {"client-1": 1}
+
+    with patch('audio_server.mcp', SimpleNamespace(_mcp_server=server)), \
+            patch('audio_server.client_limiter', limiter), patch('audio_server.job_manager', manager):
+        server.session = other
+        assert (await audio_server.job_cancel(job_id)).startswith("Error: Unknown background job")
+        assert await audio_server.job_status() == "No background jobs."
+        server.session = client
+        assert job_id in await audio_server.job_status()
+
+    step.set()
+    await manager.wait(job_id, timeout=1)
+    await asyncio.sleep(0)
+    assert limiter.clients()["client-1"] == 0
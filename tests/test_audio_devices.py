@@ -0,0 +1,71 @@
+import pytest
+from unittest.mock import patch
+from pathlib import Path
+import sounddevice as sd
+
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from audio_devices import INPUT, OUTPUT, DeviceError, DeviceRegistry
+
+DEVICES = [
+    {'name': 'Speaker 1', 'index': 0, 'hostapi': 0, 'max_input_channels': 0,
+     'max_output_channels': 2, 'default_samplerate': 44100.0},
+    {'name': 'USB Mic', 'index': 1, 'hostapi': 0, 'max_input_channels': 1,
+     'max_output_channels': 0, 'default_samplerate': 48000.0},
+    {'name': 'USB Mic', 'index': 2, 'hostapi': 0, 'max_input_channels': 2,
+     'max_output_channels': 0, 'default_samplerate': 48000.0},
+]
+
+def _check(device=None, samplerate=None, channels=None, **kwargs):
+    if samplerate not in (None, 16000, 44100, 48000):
+        raise sd.PortAudioError("Invalid sample rate")
+
+@pytest.fixture
+def registry():
+    with patch('audio_devices.sd.query_devices', return_value=DEVICES) as mock_query_devices, \
+         patch('audio_devices.sd.query_hostapis', return_value=[{'name': 'ALSA'}]), \
+         patch('audio_devices.sd.check_input_settings', side_effect=_check), \
+         patch('audio_devices.sd.check_output_settings', side_effect=_check):
+        registry = DeviceRegistry()
+        registry.scan()
+        yield registry, mock_query_devices
+
+# --- Test Cases ---
+
+def test_registry_assigns_stable_ids(registry):
+    registry, _ = registry
+
+    assert [d['id'] for d in registry.devices()] == ['ALSA:Speaker 1', 'ALSA:USB Mic', 'ALSA:USB Mic#2']
+    assert registry.get('ALSA:USB Mic#2')['index'] == 2
+    assert [d['index'] for d in registry.devices(INPUT)] == [1, 2]
+    assert [d['index'] for d in registry.devices(OUTPUT)] == [0]
+
+def test_registry_precomputes_capabilities(registry):
+    registry, _ = registry
+
+    mic = registry.get(2)
+    assert mic['input_samplerates'] == [16000, 44100, 48000]
+    assert mic['input_channels'] == [1, 2]
+    assert mic['output_samplerates'] == []
+    assert registry.native_rate(2, INPUT) == 48000
+
+def test_registry_resolve_uses_portaudio_index(registry):
+    registry, mock_query_devices = registry
+
+    assert registry.resolve(2, INPUT) == 2
+    assert registry.resolve('ALSA:USB Mic', INPUT, samplerate=16000, channels=1) == 1
+    assert registry.resolve(None, INPUT) is None
+    # Lookups never go back to PortAudio
+    mock_query_devices.assert_called_once()
+
+def test_registry_resolve_rejects_bad_requests(registry):
+    registry, _ = registry
+
+    with pytest.raises(DeviceError, match="Invalid device index 0"):
+        registry.resolve(0, INPUT)
+    with pytest.raises(DeviceError, match="Invalid device ID nope"):
+        registry.resolve('nope', OUTPUT)
+    with pytest.raises(DeviceError, match="does not support 22050 Hz"):
+        registry.resolve(1, INPUT, samplerate=22050)
+    with pytest.raises(DeviceError, match="at most 1 input channels"):
+        registry.resolve(1, INPUT, channels=2)
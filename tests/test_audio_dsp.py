@@ -0,0 +1,126 @@
+import pytest
+from pathlib import Path
+import numpy as np
+
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from audio_dsp import ClockDriftEstimator, DriftCorrector, StreamingResampler, VoiceActivityGate
+
+def _tone(freq, rate, seconds=1.0):
+    return np.sin(2 * np.pi * freq * np.arange(int(rate * seconds)) / rate).astype(np.float32)
+
+def _speech_between_silence(rate=16000):
+    rng = np.random.default_rng(0)
+    hiss = lambda n: (rng.standard_normal(n) * 30).astype(np.int16)
+    voice = (np.sin(2 * np.pi * 220 * np.arange(rate) / rate) * 8000).astype(np.int16)
+    return np.concatenate((hiss(rate), voice, hiss(rate)))
+
+def _gate(gate, signal, block=1600):
+    return np.concatenate([gate.process(signal[i:i + block]) for i in range(0, len(signal), block)])
+
+# --- Test Cases ---
+
+@pytest.mark.parametrize("in_rate,out_rate", [(48000, 16000), (44100, 16000), (24000, 48000), (24000, 44100)])
+def test_resampler_blockwise_matches_one_shot(in_rate, out_rate):
+    signal = _tone(440, in_rate)
+
+    whole = StreamingResampler(in_rate, out_rate).process(signal)
+    streaming = StreamingResampler(in_rate, out_rate)
+    blocks = [streaming.process(signal[i:i + 937]) for i in range(0, len(signal), 937)]
+
+    assert len(whole) == out_rate
+    np.testing.assert_allclose(np.concatenate(blocks), whole, atol=1e-6)
+
+@pytest.mark.parametrize("in_rate,out_rate", [(48000, 16000), (24000, 44100)])
+def test_resampler_preserves_passband_tone(in_rate, out_rate):
+    resampler = StreamingResampler(in_rate, out_rate)
+    output = resampler.process(_tone(440, in_rate))
+
+    # The filter is linear phase, so the output is the tone delayed by half its length
+    delay = (resampler.up * resampler.taps - 1) / 2 / resampler.down
+    t = np.arange(len(output)) - delay
+    expected = np.sin(2 * np.pi * 440 * t / out_rate)
+    np.testing.assert_allclose(output[500:], expected[500:], atol=1e-3)
+
+def test_resampler_rejects_aliases_when_decimating():
+    # 9.6 kHz is above the 8 kHz Nyquist limit of the 16 kHz output
+    output = StreamingResampler(48000, 16000).process(_tone(9600, 48000))
+
+    assert np.sqrt(np.mean(output[500:] ** 2)) < 1e-3
+
+def test_resampler_keeps_int16_and_channels():
+    block = (np.random.default_rng(0).standard_normal((4800, 2)) * 3000).astype(np.int16)
+    output = StreamingResampler(48000, 16000, channels=2).process(block)
+
+    assert output.dtype == np.int16
+    assert output.shape == (1600, 2)
+
+def test_resampler_passthrough_for_equal_rates():
+    block = np.arange(10, dtype=np.int16)
+    assert StreamingResampler(16000, 16000).process(block) is block
+
+def test_drift_estimator_fits_rate_through_jitter():
+    estimator = ClockDriftEstimator(48000)
+    rng = np.random.default_rng(0)
+    true_rate = 48000 * (1 + 200e-6)
+    for block in range(500):
+        frame = block * 1024
+        estimator.add(frame / true_rate + rng.uniform(0, 0.002), frame)
+        if block == 10:
+            # Too short a span to trust yet
+            assert estimator.rate == 48000 and estimator.time_at(0) is None
+
+    assert estimator.rate == pytest.approx(true_rate, rel=20e-6)
+    assert estimator.frame_at(estimator.time_at(96000)) == pytest.approx(96000)
+
+@pytest.mark.parametrize("ratio", [1.0, 1.002, 0.997])
+def test_drift_corrector_blockwise_interpolation(ratio):
+    ramp = np.arange(20000, dtype=np.float32)
+    corrector = DriftCorrector()
+    output = np.concatenate([corrector.process(ramp[i:i + 731], ratio) for i in range(0, len(ramp), 731)])
+
+    assert len(output) == pytest.approx(len(ramp) / ratio, abs=1)
+    np.testing.assert_allclose(output.ravel(), np.arange(len(output)) * ratio, atol=0.01)
+    assert corrector.frames_out == len(output)
+
+def test_voice_gate_drops_silence_and_counts_savings():
+    gate = VoiceActivityGate(16000, hangover=0.2, preroll=0.1)
+    sent = _gate(gate, _speech_between_silence())
+
+    # One second of speech plus 0.2 s hangover and 0.1 s pre-roll
+    assert len(sent) == int(16000 * 1.3)
+    stats = gate.stats()
+    assert stats["speech_frames"] == 50
+    assert stats["bytes_saved"] == (48000 - len(sent)) * 2
+
+def test_voice_gate_reports_end_of_utterance():
+    gate = VoiceActivityGate(16000, hangover=0.2, preroll=0.1)
+    ended = []
+    for block in np.array_split(_speech_between_silence(), 30):
+        gate.process(block)
+        ended.append(gate.ended)
+
+    # Once, in the block where the hangover after the speech runs out
+    assert sum(ended) == 1 and gate.utterances == 1
+    assert not gate.active
+
+def test_voice_gate_preroll_keeps_onset():
+    signal = _speech_between_silence()
+    gate = VoiceActivityGate(16000, hangover=0.0, preroll=0.1)
+    sent = _gate(gate, signal)
+
+    # The first sent samples are the 100 ms of hiss right before the voice starts
+    np.testing.assert_array_equal(sent[:1600], signal[16000 - 1600:16000])
+    np.testing.assert_array_equal(sent[1600:1600 + 16000], signal[16000:32000])
+
+def test_voice_gate_thins_silence_when_requested():
+    gate = VoiceActivityGate(16000, preroll=0.0, keep_silence_every=10)
+    sent = _gate(gate, np.zeros(16000, dtype=np.int16))
+
+    assert len(sent) == 5 * gate.frame_len
+
+def test_voice_gate_spectral_check_rejects_loud_noise():
+    noise = (np.random.default_rng(1).uniform(-1, 1, 16000) * 8000).astype(np.int16)
+    gate = VoiceActivityGate(16000, max_zcr=1.0, spectral=True)
+
+    assert len(_gate(gate, noise)) == 0
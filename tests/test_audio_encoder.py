@@ -0,0 +1,73 @@
+import asyncio
+import pytest
+from unittest.mock import patch
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import numpy as np
+import soundfile as sf
+
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from audio_encoder import DONE, FAILED, EncodingJobs, encode_file
+
+@pytest.fixture
+def capture(tmp_path):
+    """A one second 16-bit WAV capture, as record_audio leaves it."""
+    path = tmp_path / "capture.wav"
+    t = np.arange(8000) / 8000
+    sf.write(path, 0.5 * np.sin(2 * np.pi * 440 * t), 8000, subtype='PCM_16')
+    return path
+
+@pytest.fixture
+def jobs():
+    executor = ThreadPoolExecutor(max_workers=2)
+    yield EncodingJobs(executor)
+    executor.shutdown()
+
+# --- Test Cases ---
+
+@pytest.mark.parametrize("fmt, ext", [("ogg", ".ogg"), ("flac", ".flac"), ("wav", ".wav")])
+def test_encode_file_formats(capture, tmp_path, fmt, ext):
+    target = tmp_path / f"out{ext}"
+    encode_file(str(capture), str(target), fmt)
+
+    data, rate = sf.read(target)
+    assert rate == 8000
+    assert abs(len(data) - 8000) < 100
+    assert not capture.exists()
+
+@pytest.mark.asyncio
+async def test_encoding_job_completes(capture, tmp_path, jobs):
+    target = tmp_path / "out.flac"
+    job_id = jobs.submit(capture, target, "flac")
+
+    status = await jobs.wait(job_id, timeout=10)
+
+    assert status["state"] == DONE
+    assert status["target"] == str(target)
+    assert target.exists()
+    assert [job["id"] for job in jobs.list()] == [job_id]
+
+@pytest.mark.asyncio
+async def test_encoding_job_failure_is_reported(tmp_path, jobs):
+    job_id = jobs.submit(tmp_path / "missing.wav", tmp_path / "out.ogg", "ogg")
+
+    status = await jobs.wait(job_id, timeout=10)
+
+    assert status["state"] == FAILED
+    assert status["error"]
+
+def test_unknown_format_rejected(capture, tmp_path, jobs):
+    with pytest.raises(ValueError):
+        jobs.submit(capture, tmp_path / "out.mp3", "mp3")
+
+@pytest.mark.asyncio
+async def test_finished_jobs_are_pruned(tmp_path, jobs):
+    with patch("audio_encoder.MAX_FINISHED_JOBS", 2):
+        job_ids = []
+        for n in range(4):
+            job_ids.append(jobs.submit(tmp_path / f"missing{n}.wav", tmp_path / f"out{n}.ogg", "ogg"))
+            await jobs.wait(job_ids[-1], timeout=10)
+
+    # Pruning runs on submit and keeps the two most recent finished jobs besides the new one
+    assert [job["id"] for job in jobs.list()] == job_ids[1:]
@@ -0,0 +1,183 @@
+import threading
+import time
+import pytest
+from pathlib import Path
+import numpy as np
+import soundfile as sf
+
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).parent.parent / "benchmarks"))
+import virtual_backend
+from audio_engine import AudioEngine
+from audio_streams import MemoryRecorder, StreamingPlayer, StreamingRecorder
+
+@pytest.fixture
+def backend():
+    """Virtual sound devices running 20x faster than real time."""
+    with virtual_backend.install(speed=20, signal=virtual_backend.tone(level=0.5)) as streams:
+        yield streams
+
+@pytest.fixture
+def engine():
+    engine = AudioEngine(blocksize=256, idle_timeout=60)
+    yield engine
+    engine.close()
+
+# --- Test Cases ---
+
+def test_recordings_reuse_one_device_stream(backend, engine, tmp_path):
+    for name in ("first.wav", "second.wav"):
+        recorder = StreamingRecorder(tmp_path / name, 8000, 1, engine=engine)
+        assert recorder.record(0.5) == 4000
+
+    assert len(backend) == 1
+    assert engine.status() == [{"kind": "input", "device": None, "samplerate": 8000, "channels": 2,
+                                "open": True, "clients": 0, "opens": 1}]
+    assert sf.info(str(tmp_path / "second.wav")).frames == 4000
+
+def test_concurrent_taps_share_the_input(backend, engine):
+    recorders = [MemoryRecorder(8000, 2, engine=engine), MemoryRecorder(8000, 1, engine=engine)]
+    results = [None, None]
+
+    def record(i):
+        results[i] = recorders[i].record(0.5)
+
+    threads = [threading.Thread(target=record, args=(i,)) for i in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+
+    assert len(backend) == 1
+    assert results[0].shape == (4000, 2) and results[1].shape == (4000, 1)
+    assert results[0].dtype == np.int16
+    assert np.abs(results[1]).max() > 10000
+
+def test_int16_tap_rechunked_to_its_blocksize(backend, engine):
+    blocks = []
+
+    def callback(indata, frames, time_info, status):
+        blocks.append((frames, indata.dtype, int(np.abs(indata).max()), time_info.inputBufferAdcTime))
+        if len(blocks) == 6:
+            raise virtual_backend.sd.CallbackStop
+
+    done = threading.Event()
+    tap = engine.input_stream(samplerate=8000, channels=1, dtype='int16', blocksize=100,
+                              callback=callback, finished_callback=done.set)
+    tap.start()
+    assert done.wait(5)
+    tap.close()
+
+    assert [frames for frames, *_ in blocks] == [100] * 6
+    assert all(dtype == np.int16 for _, dtype, _, _ in blocks)
+    # Full-scale float maps to 32767, as in PortAudio's own conversion
+    assert max(peak for _, _, peak, _ in blocks) == pytest.approx(0.5 * 32767, abs=2)
+    # Each block is stamped with the ADC time of its own first frame
+    assert np.diff([adc for *_, adc in blocks]) == pytest.approx([100 / 8000] * 5, abs=1e-6)
+
+def test_voices_are_mixed(engine):
+    mixed = []
+    with virtual_backend.install(speed=20, on_output=lambda out, t: mixed.append(out.copy())):
+        done = [threading.Event(), threading.Event()]
+
+        def voice(level, blocks):
+            remaining = [blocks]
+
+            def callback(outdata, frames, time_info, status):
+                outdata.fill(level)
+                remaining[0] -= 1
+                if remaining[0] == 0:
+                    raise virtual_backend.sd.CallbackStop
+            return callback
+
+        streams = [engine.output_stream(samplerate=48000, channels=1, blocksize=100,
+                                        callback=voice(0.25, 20), finished_callback=done[0].set),
+                   engine.output_stream(samplerate=48000, channels=2, blocksize=300,
+                                        callback=voice(0.5, 4), finished_callback=done[1].set)]
+        for stream in streams:
+            stream.start()
+        assert done[0].wait(5) and done[1].wait(5)
+        for stream in streams:
+            stream.close()
+
+    output = np.concatenate(mixed)
+    assert output.shape[1] == 2
+    # Both voices overlap at the start, and the mono one plays on both channels
+    assert output[:, 0].max() == pytest.approx(0.75)
+    assert output[:, 1].max() == pytest.approx(0.75)
+    assert engine.status()[0]["opens"] == 1
+
+def test_voice_gain_and_ducking(engine):
+    mixed = []
+    with virtual_backend.install(speed=20, on_output=lambda out, t: mixed.append(out.copy())):
+        def constant(level):
+            def callback(outdata, frames, time_info, status):
+                outdata.fill(level)
+            return callback
+
+        music = engine.output_stream(samplerate=48000, channels=1, callback=constant(0.4), gain=0.5)
+        music.start()
+        while len(mixed) < 3:
+            time.sleep(0.01)
+        speech = engine.output_stream(samplerate=48000, channels=1, dtype='int16',
+                                      callback=constant(8192), ducking=0.25)
+        speech.start()
+        count = len(mixed)
+        while len(mixed) < count + 3:
+            time.sleep(0.01)
+        ducked = mixed[-1]
+        speech.close()
+        music.close()
+
+    # Music alone at half gain, then ducked to a quarter of that under the (int16) speech voice
+    assert mixed[1][:, 0].max() == pytest.approx(0.2)
+    assert ducked[:, 0].min() == pytest.approx(0.05 + 0.25)
+
+def test_voices_at_other_rates_are_resampled(engine):
+    mixed = []
+    with virtual_backend.install(speed=20, on_output=lambda out, t: mixed.append(out.copy())) as streams:
+        def sine(rate, frequency):
+            position = [0]
+
+            def callback(outdata, frames, time_info, status):
+                t = (position[0] + np.arange(frames)) / rate
+                outdata[:, 0] = 0.25 * np.sin(2 * np.pi * frequency * t)
+                position[0] += frames
+            return callback
+
+        voices = [engine.output_stream(samplerate=44100, channels=1, callback=sine(44100, 1000)),
+                  engine.output_stream(samplerate=16000, channels=1, dtype='int16',
+                                       callback=lambda outdata, *args: outdata.fill(0))]
+        for voice in voices:
+            voice.start()
+        while len(mixed) < 20:
+            time.sleep(0.01)
+        for voice in voices:
+            voice.close()
+
+    # One output stream at the device's native rate, with the tone still at 1 kHz
+    assert len(streams) == 1
+    assert engine.status()[0]["samplerate"] == 48000
+    output = np.concatenate(mixed[2:18])[:, 0]
+    crossings = np.count_nonzero(np.diff(np.signbit(output)))
+    assert crossings / 2 / (len(output) / 48000) == pytest.approx(1000, rel=0.01)
+    assert np.abs(output).max() == pytest.approx(0.25, rel=0.02)
+
+def test_player_through_engine(backend, engine, tmp_path):
+    path = tmp_path / "tone.wav"
+    sf.write(str(path), np.full((4000, 1), 0.1, dtype=np.float32), 8000)
+
+    for _ in range(2):
+        player = StreamingPlayer(str(path), blocksize=512, engine=engine)
+        player.play()
+        assert player.frames_played >= 4000
+
+    assert len(backend) == 1
+
+def test_idle_stream_closed(backend, tmp_path):
+    engine = AudioEngine(blocksize=256, idle_timeout=0)
+    StreamingRecorder(tmp_path / "take.wav", 8000, 1, engine=engine).record(0.1)
+
+    assert engine.status()[0]["open"] is False
+    assert backend[0].closed
@@ -0,0 +1,184 @@
+import base64
+import io
+import json
+import threading
+import pytest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from unittest.mock import patch
+import numpy as np
+import sounddevice as sd
+import soundfile as sf
+
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent))
+pytest.importorskip("google.generativeai")
+from audio_gemini import GeminiClientManager, GeminiUnavailable
+import audio_server
+
+class StubGeminiHandler(BaseHTTPRequestHandler):
+    """Answers generateContent with the number of turns it was sent."""
+
+    protocol_version = "HTTP/1.1"
+    requests = []
+    finish_reason = "STOP"
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        self.requests.append((self.path, body))
+        reply = {"candidates": [{
+            "content": {"role": "model", "parts": [{"text": f"turns: {len(body['contents'])}"}]},
+            "finishReason": "STOP",
+        }]}
+        if self.finish_reason != "STOP":
+            reply = {"candidates": [{"finishReason": self.finish_reason}]}
+        # Streaming responses arrive as a JSON array of chunks over REST
+        reply = json.dumps([reply] if ":streamGenerateContent" in self.path else reply).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(reply)))
+        self.end_headers()
+        self.wfile.write(reply)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def stub_endpoint():
+    StubGeminiHandler.requests = []
+    StubGeminiHandler.finish_reason = "STOP"
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubGeminiHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class RampInputStream:
+    """Input stream that delivers an int16 ramp synchronously."""
+
+    def __init__(self, samplerate, channels, dtype, blocksize, device, callback, finished_callback):
+        self.channels = channels
+        self.dtype = dtype
+        self.blocksize = blocksize
+        self.callback = callback
+        self.finished_callback = finished_callback
+
+    def __enter__(self):
+        status = sd.CallbackFlags()
+        start = 0
+        while True:
+            block = (np.arange(start, start + self.blocksize) % 1000).astype(self.dtype)
+            start += self.blocksize
+            try:
+                self.callback(np.repeat(block[:, None], self.channels, axis=1), self.blocksize, None, status)
+            except sd.CallbackStop:
+                break
+        self.finished_callback()
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+# --- Test Cases ---
+
+def test_client_configured_once_and_history_kept(stub_endpoint):
+    manager = GeminiClientManager(api_key="test-key", endpoint=stub_endpoint)
+
+    assert manager.send("chat-1", "Hello") == "turns: 1"
+    assert manager.send("chat-1", "And again") == "turns: 3"
+    assert manager.send("chat-2", "Hi") == "turns: 1"
+
+    assert manager.configure_count == 1
+    assert manager.history_length("chat-1") == 4
+    assert all("GenerateContent" in path for path, _ in StubGeminiHandler.requests)
+
+def test_idle_sessions_evicted(stub_endpoint):
+    clock = FakeClock()
+    manager = GeminiClientManager(api_key="test-key", endpoint=stub_endpoint,
+                                  idle_timeout=60, clock=clock)
+    manager.send("old", "Hello")
+    clock.now = 50
+    manager.send("recent", "Hello")
+
+    clock.now = 100
+    assert manager.evict_idle() == 1
+    assert manager.conversations() == ["recent"]
+    # An evicted conversation starts over
+    assert manager.send("old", "Hello") == "turns: 1"
+
+def test_session_pool_is_bounded(stub_endpoint):
+    clock = FakeClock()
+    manager = GeminiClientManager(api_key="test-key", endpoint=stub_endpoint,
+                                  max_sessions=2, clock=clock)
+    for step, conversation_id in enumerate(["a", "b", "c"]):
+        clock.now = step
+        manager.send(conversation_id, "Hello")
+
+    assert sorted(manager.conversations()) == ["b", "c"]
+
+def test_blocked_turn_leaves_conversation_usable(stub_endpoint):
+    manager = GeminiClientManager(api_key="test-key", endpoint=stub_endpoint)
+    manager.send("chat", "Hello")
+
+    StubGeminiHandler.finish_reason = "SAFETY"
+    with pytest.raises(Exception):
+        manager.send("chat", "Something blocked")
+
+    StubGeminiHandler.finish_reason = "STOP"
+    assert manager.send("chat", "And again") == "turns: 3"
+    assert manager.history_length("chat") == 4
+
+def test_missing_api_key(monkeypatch):
+    monkeypatch.delenv("GOOGLE_API_KEY", raising=False)
+    manager = GeminiClientManager()
+
+    with pytest.raises(GeminiUnavailable):
+        manager.send("chat", "Hello")
+
+@pytest.mark.asyncio
+async def test_conversation_sends_captured_audio_inline(stub_endpoint, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    manager = GeminiClientManager(api_key="test-key", endpoint=stub_endpoint)
+    # RampInputStream delivers synchronously on open, so capture opens it directly, not via the engine
+    with patch('audio_server.gemini_client', manager), \
+         patch('audio_server.audio_engine', None), \
+         patch('audio_streams.sd.InputStream', RampInputStream):
+        result = await audio_server.gemini_conversation(duration=0.5, sample_rate=8000, prompt="Transcribe")
+
+    assert "turns: 1" in result
+    parts = StubGeminiHandler.requests[0][1]["contents"][0]["parts"]
+    assert parts[0]["text"] == "Transcribe"
+    assert parts[1]["inlineData"]["mimeType"] == "audio/flac"
+    data, rate = sf.read(io.BytesIO(base64.b64decode(parts[1]["inlineData"]["data"])), dtype='int16')
+    assert rate == 8000
+    np.testing.assert_array_equal(data, np.arange(4000) % 1000)
+    # Nothing is written unless save_recording is set
+    assert not (tmp_path / "audio").exists()
+
+@pytest.mark.asyncio
+async def test_conversation_reports_whether_the_recording_was_saved(stub_endpoint, tmp_path, monkeypatch):
+    from audio_catalog import RecordingCatalog
+    monkeypatch.chdir(tmp_path)
+    manager = GeminiClientManager(api_key="test-key", endpoint=stub_endpoint)
+    catalog = RecordingCatalog(str(tmp_path / "recordings.db"))
+    with patch('audio_server.gemini_client', manager), \
+         patch('audio_server.audio_engine', None), \
+         patch('audio_server.recording_catalog', catalog), \
+         patch('audio_streams.sd.InputStream', RampInputStream):
+        result = await audio_server.gemini_conversation(duration=0.5, sample_rate=8000, save_recording=True)
+        assert "Audio saved to:" in result
+        assert catalog.count() == 1
+
+        with patch.object(catalog, 'add', side_effect=OSError("disk full")):
+            result = await audio_server.gemini_conversation(duration=0.5, sample_rate=8000,
+                                                            save_recording=True)
+    assert "turns: 3" in result
+    assert "Error saving audio to" in result and "disk full" in result
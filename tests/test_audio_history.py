@@ -0,0 +1,58 @@
+import asyncio
+import pytest
+from pathlib import Path
+from unittest.mock import patch
+import soundfile as sf
+
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).parent.parent / "benchmarks"))
+import virtual_backend
+import audio_server
+from audio_catalog import RecordingCatalog
+from audio_devices import DeviceRegistry
+from audio_engine import AudioEngine
+
+@pytest.fixture
+def history_server(tmp_path, monkeypatch):
+    """Server state on a virtual microphone that plays a tone burst 0.2 s in."""
+    monkeypatch.chdir(tmp_path)
+    engine = AudioEngine(blocksize=256, idle_timeout=0)
+    with virtual_backend.install(speed=4, signal=virtual_backend.burst(0.2, 0.3, level=0.5)), \
+         patch('audio_server.device_registry', DeviceRegistry()), \
+         patch('audio_server.audio_engine', engine), \
+         patch('audio_server.recording_catalog', RecordingCatalog(str(tmp_path / 'recordings.db'))):
+        yield audio_server
+    engine.close()
+
+# --- Test Cases ---
+
+@pytest.mark.asyncio
+async def test_save_window_from_history(history_server):
+    result = await history_server.start_history_capture(minutes=0.1, sample_rate=8000)
+    assert "History capture started" in result
+    try:
+        # 0.25 s wall clock is ~1 s of audio at 4x speed
+        await asyncio.sleep(0.25)
+        recorder = history_server.history_recorder
+        assert recorder.retained_seconds() > 0.8
+
+        result = await history_server.save_recent_audio(seconds=60, format="wav")
+    finally:
+        assert await history_server.stop_history_capture() == "History capture stopped."
+
+    assert "of the requested 60 seconds were buffered" in result
+    path = result.split(" to: ")[1].split(" (")[0]
+    data, rate = sf.read(path, dtype='int16')
+    assert rate == 8000
+    # Everything buffered at the time of the save (the ring kept filling until stop)
+    assert 0.8 * rate < len(data) <= recorder.retained_seconds() * rate
+    # The burst that played before the save is in the file
+    assert abs(data).max() > 10000
+    assert history_server.recording_catalog.get(path)["format"] == "wav"
+
+@pytest.mark.asyncio
+async def test_history_tools_report_state(history_server):
+    assert "not running" in await history_server.save_recent_audio(5)
+    assert "Error" in await history_server.start_history_capture(minutes=120)
+    assert "not running" in await history_server.stop_history_capture()
@@ -0,0 +1,148 @@
+import asyncio
+import inspect
+import pytest
+from pathlib import Path
+
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from audio_jobs import CANCELLED, DONE, FAILED, PENDING, RUNNING, JobManager, report_progress
+
+@pytest.fixture
+def manager():
+    return JobManager(limits={"device": 1})
+
+# --- Test Cases ---
+
+@pytest.mark.asyncio
+async def test_jobs_over_the_cap_wait(manager):
+    release = asyncio.Event()
+
+    async def work(n):
+        await release.wait()
+        return f"done {n}"
+
+    first = manager.submit("work", "device", lambda: work(1))
+    second = manager.submit("work", "device", lambda: work(2))
+    await asyncio.sleep(0.01)
+    assert manager.status(first)["state"] == RUNNING
+    assert manager.status(second)["state"] == PENDING
+
+    release.set()
+    status = await manager.wait(second, timeout=1)
+    assert status["state"] == DONE
+    assert status["result"] == "done 2"
+    assert status["progress"] == 1.0
+
+@pytest.mark.asyncio
+async def test_progress_and_error_results(manager):
+    step = asyncio.Event()
+    counter = [0]
+
+    async def work():
+        report_progress(message="counting", source=lambda: counter[0] / 4)
+        await step.wait()
+        return "Error: device unplugged"
+
+    job_id = manager.submit("work", "device", work)
+    await asyncio.sleep(0.01)
+    counter[0] = 1
+    status = manager.status(job_id)
+    assert status["progress"] == 0.25 and status["message"] == "counting"
+
+    step.set()
+    status = await manager.wait(job_id, timeout=1)
+    assert status["state"] == FAILED
+    assert status["error"] == "Error: device unplugged"
+
+@pytest.mark.asyncio
+async def test_cancel_stops_the_task(manager):
+    cleaned_up = asyncio.Event()
+
+    async def work():
+        try:
+            await asyncio.sleep(60)
+        finally:
+            cleaned_up.set()
+
+    job_id = manager.submit("work", "device", work)
+    await asyncio.sleep(0.01)
+    status = await manager.cancel(job_id)
+
+    assert status["state"] == CANCELLED
+    assert cleaned_up.is_set()
+    assert await manager.cancel("missing") is None
+
+@pytest.mark.asyncio
+async def test_background_decorator(manager):
+    @manager.background("device")
+    async def tool(duration: float = 1.0) -> str:
+        await asyncio.sleep(0)
+        return f"recorded {duration}"
+
+    assert "background" in inspect.signature(tool).parameters
+    assert await tool(2.0) == "recorded 2.0"
+
+    message = await tool(duration=3.0, background=True)
+    job_id = message.split("background job ")[1].split(".")[0]
+    status = await manager.wait(job_id, timeout=1)
+    assert status["name"] == "tool"
+    assert status["arguments"] == {"duration": 3.0}
+    assert status["result"] == "recorded 3.0"
+
+@pytest.mark.asyncio
+async def test_jobs_scoped_to_their_client(manager):
+    released = []
+    owners = iter([("client-1", lambda: released.append("client-1"))])
+    manager.owner = lambda: next(owners)
+    step = asyncio.Event()
+
+    @manager.background("device")
+    async def tool() -> str:
+        await step.wait()
+        return "done"
+
+    job_id = (await tool(background=True)).split("background job ")[1].split(".")[0]
+    await asyncio.sleep(0.01)
+
+    # Other clients can neither see nor cancel the job
+    assert manager.status(job_id, "client-2") is None
+    assert manager.list("client-2") == []
+    assert await manager.wait(job_id, 0, client="client-2") is None
+    assert await manager.cancel(job_id, client="client-2") is None
+    assert manager.status(job_id, "client-1")["state"] == RUNNING
+    assert [job["client"] for job in manager.list("client-1")] == ["client-1"]
+    assert released == []
+
+    step.set()
+    assert (await manager.wait(job_id, 1, client="client-1"))["state"] == DONE
+    await asyncio.sleep(0)
+    assert released == ["client-1"]
+
+@pytest.mark.asyncio
+async def test_server_tools_accept_background():
+    import audio_server
+    tools = {tool.name: tool for tool in await audio_server.mcp.list_tools()}
+
+    for name in ("record_audio", "play_audio_file", "gemini_conversation", "save_recent_audio"):
+        assert "background" in tools[name].inputSchema["properties"]
+    assert "background" not in tools["list_audio_devices"].inputSchema["properties"]
+    assert (await audio_server.job_status("missing")).startswith("Error")
+
+@pytest.mark.asyncio
+async def test_gemini_setup_failure_fails_the_job():
+    import audio_server
+    from unittest.mock import patch
+    from audio_gemini import GeminiUnavailable
+
+    class Unconfigured:
+        @property
+        def model(self):
+            raise GeminiUnavailable("No API key provided.")
+
+    with patch('audio_server.gemini_client', Unconfigured()):
+        message = await audio_server.gemini_conversation(background=True)
+        job_id = message.split("background job ")[1].split(".")[0]
+        status = await audio_server.job_manager.wait(job_id, timeout=1)
+
+    assert status["state"] == FAILED
+    assert status["error"] == "Error: No API key provided."
@@ -0,0 +1,76 @@
+import asyncio
+import os
+import subprocess
+import pytest
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from audio_lazy import is_loaded, lazy_import
+
+@pytest.fixture
+def slow_module(tmp_path, monkeypatch):
+    """A throwaway module that records when it is executed."""
+    (tmp_path / "lazy_probe.py").write_text(
+        "import time\nloads = []\ntime.sleep(0.05)\nloads.append(1)\n"
+        "def answer():\n    return 42\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    yield "lazy_probe"
+    sys.modules.pop("lazy_probe", None)
+
+# --- Test Cases ---
+
+def test_import_deferred_until_attribute_use(slow_module):
+    module = lazy_import(slow_module)
+    assert not is_loaded(slow_module)
+
+    assert module.answer() == 42
+    assert is_loaded(slow_module)
+    assert lazy_import(slow_module) is sys.modules[slow_module]
+
+def test_missing_module_raises_immediately():
+    with pytest.raises(ImportError):
+        lazy_import("no_such_audio_module")
+
+def test_concurrent_first_use_sees_complete_module(slow_module):
+    from concurrent.futures import ThreadPoolExecutor
+    module = lazy_import(slow_module)
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        results = list(pool.map(lambda _: module.answer(), range(8)))
+
+    assert results == [42] * 8
+    assert sys.modules[slow_module].loads == [1]
+
+def test_patches_on_real_module_are_visible(slow_module):
+    module = lazy_import(slow_module)
+    with patch(f"{slow_module}.answer", return_value=7):
+        assert module.answer() == 7
+    assert module.answer() == 42
+
+def test_server_import_leaves_heavy_modules_unloaded():
+    heavy = ("numpy", "sounddevice", "soundfile", "google.generativeai")
+    code = (f"import sys, audio_server; "
+            f"print(','.join(m for m in {heavy!r} if m in sys.modules))")
+    result = subprocess.run([sys.executable, "-c", code], cwd=Path(__file__).parent.parent,
+                            capture_output=True, text=True, env=dict(os.environ), timeout=60)
+
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == ""
+
+@pytest.mark.asyncio
+async def test_warm_up_scans_devices_and_records_metrics():
+    import audio_server
+    from audio_metrics import metrics
+    registry = MagicMock()
+    preload = MagicMock()
+    metrics.reset()
+
+    with patch('audio_server.device_registry', registry), \
+         patch('audio_server.preload_gemini', preload):
+        await audio_server.warm_up()
+
+    registry.scan.assert_called_once()
+    preload.assert_called_once()
+    assert {"warmup.devices", "warmup.codecs", "warmup.gemini", "warmup.total"} <= set(metrics.snapshot())
@@ -0,0 +1,84 @@
+import asyncio
+import pytest
+from pathlib import Path
+
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).parent.parent / "benchmarks"))
+import virtual_backend
+from bench_audio import FakeLiveServer
+from audio_engine import AudioEngine
+from audio_live import FINISHED, RUNNING, LiveSessionManager
+
+@pytest.fixture
+def backend():
+    """Real-time virtual devices; speech starts 0.2 s in."""
+    with virtual_backend.install(speed=1.0, signal=virtual_backend.burst(0.2, 1.0)) as streams:
+        yield streams
+
+@pytest.fixture
+def engine():
+    engine = AudioEngine(blocksize=256, idle_timeout=0)
+    yield engine
+    engine.close()
+
+def _connect(server):
+    return lambda: server.client().aio.live.connect()
+
+def _start(manager, session_id, server, engine):
+    return manager.start(session_id, _connect(server), sample_rate=16000, output_sample_rate=24000,
+                         duration=30, engine=engine)
+
+# --- Test Cases ---
+
+@pytest.mark.asyncio
+async def test_sessions_run_and_stop_independently(backend, engine, capsys):
+    manager = LiveSessionManager()
+    servers = {"a": FakeLiveServer(model_delay=0.05), "b": FakeLiveServer(model_delay=0.05)}
+    sessions = {name: _start(manager, name, server, engine) for name, server in servers.items()}
+
+    for _ in range(100):
+        if all(s.status()["played_frames"] for s in sessions.values()):
+            break
+        await asyncio.sleep(0.05)
+
+    # Both sessions heard the speech through one shared input and replied through one output
+    assert all(server.uploaded_bytes for server in servers.values())
+    assert all(s.status()["played_frames"] > 0 for s in sessions.values())
+    assert len(backend) == 2
+
+    # The end of the speech burst is signalled, since the silence after it is not uploaded
+    for _ in range(100):
+        if all(server.stream_ends for server in servers.values()):
+            break
+        await asyncio.sleep(0.05)
+    assert all(server.stream_ends == 1 for server in servers.values())
+
+    await manager.stop("a")
+    assert sessions["a"].state == FINISHED
+    assert sessions["b"].state == RUNNING
+    assert "session a" in sessions["a"].task.result()
+    assert sessions["a"].metrics.snapshot()["live.upload_send"]["count"] > 0
+
+    assert [s.id for s in await manager.stop_all()] == ["b"]
+    assert sessions["b"].state == FINISHED
+    assert manager.active() == []
+    # stdout is the MCP transport; progress goes to stderr
+    output = capsys.readouterr()
+    assert output.out == "" and "[a] Sent" in output.err
+
+@pytest.mark.asyncio
+async def test_duplicate_id_and_session_cap(backend, engine):
+    manager = LiveSessionManager(max_sessions=1)
+    _start(manager, "a", FakeLiveServer(), engine)
+
+    with pytest.raises(ValueError, match="already running"):
+        _start(manager, "a", FakeLiveServer(), engine)
+    with pytest.raises(ValueError, match="1 Live sessions"):
+        _start(manager, "b", FakeLiveServer(), engine)
+
+    await manager.stop_all()
+    # A finished ID can be reused
+    _start(manager, "a", FakeLiveServer(), engine)
+    await manager.stop("a")
+    assert await manager.stop("missing") is None
@@ -0,0 +1,60 @@
+import asyncio
+import inspect
+import pytest
+from pathlib import Path
+
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from audio_metrics import MetricsRegistry
+
+@pytest.fixture
+def registry():
+    return MetricsRegistry()
+
+# --- Test Cases ---
+
+def test_percentiles_per_stage(registry):
+    for ms in range(1, 101):
+        registry.observe("capture", ms / 1000)
+    registry.observe("encode", 0.5)
+
+    snapshot = registry.snapshot()
+    assert snapshot["capture"]["count"] == 100
+    assert snapshot["capture"]["p50"] == pytest.approx(0.0505)
+    assert snapshot["capture"]["p99"] == pytest.approx(0.09901)
+    assert snapshot["capture"]["max"] == pytest.approx(0.1)
+    assert snapshot["encode"]["p95"] == pytest.approx(0.5)
+
+def test_span_records_on_error(registry):
+    with pytest.raises(RuntimeError):
+        with registry.span("request"):
+            raise RuntimeError("boom")
+
+    assert registry.snapshot()["request"]["count"] == 1
+
+@pytest.mark.asyncio
+async def test_timed_keeps_signature(registry):
+    @registry.timed("tool.total")
+    async def tool(duration: float = 5, device_id: str = None) -> str:
+        await asyncio.sleep(0.01)
+        return "done"
+
+    assert await tool() == "done"
+    assert list(inspect.signature(tool).parameters) == ["duration", "device_id"]
+    assert registry.snapshot()["tool.total"]["p50"] >= 0.01
+
+def test_prometheus_buckets_are_cumulative(registry):
+    registry.observe("play", 0.002)
+    registry.observe("play", 0.2)
+
+    text = registry.prometheus()
+
+    assert '# TYPE audio_mcp_stage_seconds histogram' in text
+    assert 'audio_mcp_stage_seconds_bucket{stage="play",le="0.0025"} 1' in text
+    assert 'audio_mcp_stage_seconds_bucket{stage="play",le="0.25"} 2' in text
+    assert 'audio_mcp_stage_seconds_bucket{stage="play",le="+Inf"} 2' in text
+    assert 'audio_mcp_stage_seconds_count{stage="play"} 2' in text
+    assert 'audio_mcp_stage_seconds_recent{stage="play",quantile="0.5"}' in text
+
+def test_empty_registry_text(registry):
+    assert registry.format_text() == "No metrics recorded yet."
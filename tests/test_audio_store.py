@@ -0,0 +1,80 @@
+import pytest
+from pathlib import Path
+import numpy as np
+
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from audio_store import RecordingStore
+
+@pytest.fixture
+def store(tmp_path):
+    store = RecordingStore(byte_budget=2000, spill_dir=str(tmp_path))
+    yield store
+    store.close()
+
+def _pcm(frames, value=1, channels=1):
+    return np.full((frames, channels), value, dtype='int16')
+
+# --- Test Cases ---
+
+def test_store_returns_same_buffer_without_copy(store):
+    data = _pcm(100)
+    recording_id = store.put(data, 16000)
+
+    stored, rate = store.get(recording_id)
+    assert stored is data
+    assert rate == 16000
+    assert store.latest_id == recording_id
+
+def test_store_keeps_multiple_takes(store):
+    first = store.put(_pcm(10, 1), 16000)
+    second = store.put(_pcm(20, 2, channels=2), 48000)
+
+    assert [info["id"] for info in store.list()] == [first, second]
+    assert store.info(second)["channels"] == 2
+    assert store.info(second)["duration"] == pytest.approx(20 / 48000)
+
+def test_store_spills_least_recently_used_over_budget(store, tmp_path):
+    first = store.put(_pcm(400, 1), 16000)   # 800 bytes
+    second = store.put(_pcm(400, 2), 16000)  # 800 bytes
+    store.get(first)                         # first is now most recently used
+    third = store.put(_pcm(400, 3), 16000)   # over the 2000 byte budget
+
+    assert store.info(second)["in_memory"] is False
+    assert store.info(first)["in_memory"] is True
+    assert store.memory_bytes == 1600
+    assert (tmp_path / f"{second}.npy").exists()
+
+    spilled, _ = store.get(second)
+    assert isinstance(spilled, np.memmap)
+    np.testing.assert_array_equal(spilled, _pcm(400, 2))
+    assert store.get(third) is not None
+
+def test_store_delete_updates_latest(store):
+    first = store.put(_pcm(10), 16000)
+    second = store.put(_pcm(10), 16000)
+
+    assert store.delete(second)
+    assert store.latest_id == first
+    assert store.get(second) is None
+    assert not store.delete(second)
+
+def test_spilled_takes_capped(tmp_path):
+    store = RecordingStore(byte_budget=1000, spill_dir=str(tmp_path), spill_budget=1600)
+    takes = [store.put(_pcm(400, n), 16000) for n in range(4)]  # 800 bytes each
+
+    # Only the newest take fits in memory and two fit on disk; the oldest is dropped
+    assert [info["id"] for info in store.list()] == takes[1:]
+    assert store.memory_bytes == 800 and store.spilled_bytes == 1600
+    assert sorted(p.stem for p in tmp_path.glob("*.npy")) == sorted(takes[1:3])
+    store.close()
+
+def test_store_removes_its_own_spill_dir():
+    store = RecordingStore(byte_budget=100)
+    store.put(_pcm(400), 16000)
+    store.put(_pcm(400), 16000)
+    spill_dir = Path(store._spill_dir)
+    assert any(spill_dir.glob("*.npy"))
+
+    store.close()
+    assert not spill_dir.exists()
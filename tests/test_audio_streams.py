@@ -0,0 +1,185 @@
+import threading
+import pytest
+from unittest.mock import patch
+from pathlib import Path
+import numpy as np
+import sounddevice as sd
+import soundfile as sf
+
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).parent.parent / "benchmarks"))
+import virtual_backend
+from audio_streams import MultiDeviceRecorder, StreamingPlayer, StreamingRecorder, pcm16
+
+class FakeOutputStream:
+    """Drives the callback from a thread and records everything it writes."""
+
+    def __init__(self, samplerate, channels, dtype, blocksize, device, callback, finished_callback):
+        self.samplerate = samplerate
+        self.channels = channels
+        self.blocksize = blocksize
+        self.callback = callback
+        self.finished_callback = finished_callback
+        self.written = []
+        self._thread = None
+
+    def _run(self):
+        status = sd.CallbackFlags()
+        while True:
+            outdata = np.empty((self.blocksize, self.channels), dtype='float32')
+            try:
+                self.callback(outdata, self.blocksize, None, status)
+            except sd.CallbackStop:
+                break
+            self.written.append(outdata.copy())
+        self.finished_callback()
+
+    def abort(self):
+        pass
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._run)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._thread.join()
+
+@pytest.fixture
+def wav_file(tmp_path):
+    data = np.linspace(-0.5, 0.5, 10000, dtype='float32').reshape(-1, 2)
+    path = tmp_path / "tone.wav"
+    sf.write(path, data, 16000, subtype='FLOAT')
+    return path, data
+
+def _noise(start, frames, rate):
+    """Deterministic noise indexed by absolute frame, so every virtual microphone hears the same."""
+    x = np.sin(np.arange(start, start + frames) * 78.233) * 43758.5453
+    return (x - np.floor(x) - 0.5).astype(np.float32)
+
+def _lag(a, b, max_lag=50):
+    """Frames by which `a` runs ahead of `b`."""
+    return max(range(-max_lag, max_lag + 1),
+               key=lambda k: np.dot(a[max_lag + k:len(a) - max_lag + k], b[max_lag:len(b) - max_lag]))
+
+# --- Test Cases ---
+
+def test_streaming_player_plays_whole_file(wav_file):
+    path, data = wav_file
+    streams = []
+
+    def make_stream(**kwargs):
+        streams.append(FakeOutputStream(**kwargs))
+        return streams[-1]
+
+    with patch('audio_streams.sd.OutputStream', side_effect=make_stream):
+        player = StreamingPlayer(path, blocksize=256, prefetch_blocks=4)
+        player.play()
+
+    stream = streams[0]
+    assert stream.samplerate == 16000
+    assert stream.channels == 2
+    # Underruns emit silence, so compare the non-silent output with the source
+    output = np.concatenate(stream.written)
+    nonzero = output[np.any(output != 0, axis=1)]
+    expected = data[np.any(data != 0, axis=1)]
+    np.testing.assert_allclose(nonzero, expected)
+    assert player.frames_played >= len(data)
+
+def test_streaming_player_bounds_prefetch(wav_file):
+    path, _ = wav_file
+    player = StreamingPlayer(path, blocksize=128, prefetch_blocks=3)
+    assert player._queue.maxsize == 3
+
+def test_streaming_recorder_writes_exact_duration(tmp_path):
+    path = tmp_path / "take.wav"
+    blocks = []
+
+    class FakeInputStream(FakeOutputStream):
+        def _run(self):
+            status = sd.CallbackFlags()
+            n = 0
+            while True:
+                indata = np.full((self.blocksize, self.channels), n % 7 / 10, dtype='float32')
+                blocks.append(indata)
+                n += 1
+                try:
+                    self.callback(indata, self.blocksize, None, status)
+                except sd.CallbackStop:
+                    break
+            self.finished_callback()
+
+    with patch('audio_streams.sd.InputStream', FakeInputStream):
+        recorder = StreamingRecorder(path, 8000, 1, blocksize=300, max_queued_blocks=16)
+        frames = recorder.record(duration=0.5)
+
+    assert frames == 4000
+    assert recorder.dropped_blocks == 0
+    data, fs = sf.read(path, dtype='float32', always_2d=True)
+    assert fs == 8000
+    np.testing.assert_allclose(data, np.concatenate(blocks)[:4000], atol=1e-4)
+    expected = np.concatenate(blocks)[:4000]
+    assert recorder.peak == pytest.approx(expected.max())
+    assert recorder.rms == pytest.approx(np.sqrt(np.mean(expected ** 2)), rel=1e-5)
+
+def test_recording_hash_matches_the_stored_samples(tmp_path):
+    import hashlib
+    path = tmp_path / "loud.wav"
+    # Overs and values between 16-bit steps, as a microphone produces them
+    block = np.linspace(-1.5, 1.5, 600, dtype='float32').reshape(-1, 2)
+
+    class FakeInputStream(FakeOutputStream):
+        def _run(self):
+            try:
+                while True:
+                    self.callback(block, len(block), None, sd.CallbackFlags())
+            except sd.CallbackStop:
+                pass
+            self.finished_callback()
+
+    with patch('audio_streams.sd.InputStream', FakeInputStream):
+        recorder = StreamingRecorder(path, 8000, 2, blocksize=300, subtype='PCM_16')
+        recorder.record(duration=0.1)
+
+    stored, _ = sf.read(path, dtype='int16', always_2d=True)
+    assert stored.max() == 32767 and stored.min() == -32767
+    assert recorder.sha256 == hashlib.sha256(stored.tobytes()).hexdigest()
+    # In-memory captures saved by the server are hashed the same way
+    np.testing.assert_array_equal(pcm16(stored), stored)
+
+def test_streaming_recorder_zero_duration(tmp_path):
+    path = tmp_path / "empty.wav"
+    with patch('audio_streams.sd.InputStream') as mock_stream:
+        frames = StreamingRecorder(path, 8000, 1).record(duration=0)
+
+    assert frames == 0
+    mock_stream.assert_not_called()
+    assert path.exists()
+
+def test_multi_device_recorder_aligns_drifting_devices(tmp_path):
+    paths = [tmp_path / "one.wav", tmp_path / "two.wav"]
+    with virtual_backend.install(speed=20, inputs=2, drift_ppm={2: 1000}, shared_timeline=True, signal=_noise):
+        recorder = MultiDeviceRecorder(paths, 8000, [0, 2], blocksize=256)
+        assert recorder.record(duration=6) == 48000
+
+    stats = recorder.stats()
+    assert stats["clock"] == "adc"
+    assert stats["devices"][1]["drift_ppm"] == pytest.approx(1000, abs=50)
+    one, two = (sf.read(path, dtype='float32')[0] for path in paths)
+    assert len(one) == len(two) == 48000
+    # The start is trimmed to the latest device; the drift (1 frame per 1000) builds up
+    # until the clock fit is trusted, then is steered out
+    assert abs(_lag(two[:1000], one[:1000])) <= 1
+    assert abs(_lag(two[-8000:], one[-8000:])) <= 1
+
+def test_multi_device_recorder_interleaved(tmp_path):
+    path = tmp_path / "both.wav"
+    with virtual_backend.install(speed=20, inputs=2):
+        recorder = MultiDeviceRecorder([path], 8000, [0, 2], channels=[1, 2], blocksize=256)
+        recorder.record(duration=0.5)
+
+    info = sf.info(str(path))
+    assert (info.channels, info.frames) == (3, 4000)
+    assert recorder.output_channels == [3]
+    assert recorder.rms() > 0
@@ -0,0 +1,44 @@
+import pytest
+from pathlib import Path
+
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).parent.parent / "benchmarks"))
+import bench_audio
+import virtual_backend
+
+# --- Test Cases ---
+
+def test_virtual_input_stream_delivers_signal():
+    blocks = []
+
+    def callback(indata, frames, time, status):
+        blocks.append(indata.copy())
+        if len(blocks) == 4:
+            raise virtual_backend.sd.CallbackStop
+
+    stream = virtual_backend.VirtualInputStream(samplerate=8000, blocksize=100, channels=2,
+                                                dtype='int16', callback=callback, speed=0)
+    with stream:
+        stream._thread.join()
+
+    assert len(blocks) == 4
+    assert blocks[0].shape == (100, 2)
+    assert blocks[0].dtype == 'int16'
+    assert stream.timer.stats(100, 8000)["blocks"] == 4
+
+def test_quick_benchmarks_produce_metrics():
+    report = bench_audio.run(["recorder", "encode"], seconds=0.5)
+
+    assert report["results"]["recorder"]["pcm_16"]["dropped_blocks"] == 0
+    assert report["results"]["recorder"]["pcm_16"]["mb_per_s"] > 0
+    assert set(report["results"]["encode"]) == {"file_ogg", "file_flac", "file_wav", "memory_flac"}
+
+def test_compare_flags_regressions(capsys):
+    baseline = {"results": {"recorder": {"wav": {"mb_per_s": 100.0}}, "encode": {"ogg": {"ms_per_audio_s": 10.0}}}}
+    current = {"results": {"recorder": {"wav": {"mb_per_s": 50.0}}, "encode": {"ogg": {"ms_per_audio_s": 9.0}}}}
+
+    regressions = bench_audio.compare(current, baseline, threshold=0.2)
+
+    assert regressions == ["recorder.wav.mb_per_s"]
+    assert "REGRESSION" in capsys.readouterr().out
@@ -0,0 +1,124 @@
+import asyncio
+import concurrent.futures
+import threading
+import pytest
+from unittest.mock import patch
+from pathlib import Path
+import numpy as np
+import sounddevice as sd
+
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from audio_catalog import RecordingCatalog
+from audio_devices import DeviceRegistry
+from audio_encoder import EncodingJobs
+from audio_engine import AudioEngine
+from audio_server import list_audio_devices, record_audio
+
+class BlockingInputStream:
+    """Input stream that produces no audio until the test releases it."""
+
+    release = threading.Event()
+    started = threading.Event()
+
+    def __init__(self, samplerate, channels, dtype, blocksize, device, callback, finished_callback):
+        self.samplerate = samplerate
+        self.channels = channels
+        self.callback = callback
+        self.finished_callback = finished_callback
+        self._thread = None
+
+    def _run(self):
+        self.started.set()
+        self.release.wait(5)
+        status = sd.CallbackFlags()
+        block = np.zeros((self.samplerate, self.channels), dtype='float32')
+        while True:
+            try:
+                self.callback(block, len(block), None, status)
+            except sd.CallbackStop:
+                break
+        self.finished_callback()
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._run)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._thread.join()
+
+@pytest.fixture
+def blocking_recorder(tmp_path, monkeypatch):
+    """Make record_audio block like a long recording until the test releases it."""
+    monkeypatch.chdir(tmp_path)
+    BlockingInputStream.release.clear()
+    BlockingInputStream.started.clear()
+    encoding_jobs = EncodingJobs()
+    with patch('sounddevice.query_devices') as mock_query_devices, \
+         patch('sounddevice.query_hostapis', return_value=[{'name': 'ALSA'}]), \
+         patch('sounddevice.check_input_settings'), \
+         patch('sounddevice.check_output_settings'), \
+         patch('audio_server.device_registry', DeviceRegistry()), \
+         patch('audio_server.audio_engine', AudioEngine(idle_timeout=0)), \
+         patch('audio_server.recording_catalog', RecordingCatalog(str(tmp_path / 'recordings.db'))), \
+         patch('audio_server.encoding_jobs', encoding_jobs), \
+         patch('audio_streams.sd.InputStream', BlockingInputStream):
+        mock_query_devices.return_value = [
+            {'name': 'Mic 1', 'index': 0, 'hostapi': 0, 'max_input_channels': 2,
+             'max_output_channels': 0, 'default_samplerate': 8000.0},
+            {'name': 'Speaker 1', 'index': 1, 'hostapi': 0, 'max_input_channels': 0,
+             'max_output_channels': 2, 'default_samplerate': 44100.0},
+        ]
+        yield BlockingInputStream
+        # Encodes report to the patched catalog, so let them finish before it is unpatched
+        concurrent.futures.wait([job["future"] for job in encoding_jobs._jobs.values()])
+
+# --- Test Cases ---
+
+@pytest.mark.asyncio
+async def test_list_audio_devices_while_recording(blocking_recorder):
+    recording = asyncio.create_task(record_audio(duration=60, sample_rate=8000, format="wav"))
+    try:
+        # Give the recording a chance to open its stream on the device executor
+        for _ in range(100):
+            if blocking_recorder.started.is_set():
+                break
+            await asyncio.sleep(0.01)
+        assert blocking_recorder.started.is_set()
+
+        result = await asyncio.wait_for(list_audio_devices(), timeout=2)
+
+        assert "Mic 1" in result
+        assert "Speaker 1" in result
+        assert not recording.done()
+    finally:
+        blocking_recorder.release.set()
+
+    result = await asyncio.wait_for(recording, timeout=10)
+    assert "Audio recorded and saved to:" in result
+
+@pytest.mark.asyncio
+async def test_concurrent_takes_get_their_own_files(blocking_recorder):
+    import audio_server
+    takes = [asyncio.create_task(record_audio(duration=1, sample_rate=8000, format="wav")) for _ in range(2)]
+    blocking_recorder.release.set()
+    results = await asyncio.wait_for(asyncio.gather(*takes), timeout=10)
+
+    paths = {result.split("saved to: ")[1].split()[0] for result in results}
+    assert len(paths) == 2
+    assert audio_server.recording_catalog.count() == 2
+
+def test_server_shuts_down_executors_on_exit():
+    import audio_executors
+    import audio_server
+    pool = audio_executors.get_executor(audio_executors.CODEC)
+
+    with patch.object(audio_server.mcp, 'run', side_effect=KeyboardInterrupt):
+        with pytest.raises(KeyboardInterrupt):
+            audio_server.serve()
+
+    # The pools were shut down; the next call starts fresh ones
+    with pytest.raises(RuntimeError):
+        pool.submit(print)
+    assert audio_executors.get_executor(audio_executors.CODEC) is not pool